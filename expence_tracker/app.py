@@ -1,34 +1,68 @@
 import random 
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from datetime import datetime, timedelta
-import json
-import sqlite3
-import os
+from datetime import datetime
+import io
 import warnings
+from contextlib import nullcontext
+from types import SimpleNamespace
 warnings.filterwarnings('ignore')
 
 # Import our modules
 try:
     from utils.ai_helper import get_financial_analysis
-    from utils.data_handler import (
-        init_db, add_expense, get_expenses,
-        add_goal, get_goals, update_goal,
-        add_saving, get_savings
+    from utils.services import (
+        PERIODS, CHART_TYPES, RESOLUTION_LABELS, sidebar_stats, dashboard_snapshot, insights,
+        analysis_inputs, analysis_metrics
     )
+    from utils.storage import get_storage
+    from utils.importer import import_statement
+    from utils.models import to_columns
+    from utils.instrumentation import start_run, finish_run, section, env_enabled, export_runs
+    from utils.cache import cache_stats
 except ImportError:
     # Create fallback functions
     st.error("Required modules not found. Please check your file structure.")
-    def init_db(): pass
-    def add_expense(x): return True
-    def get_expenses(x=None): return []
-    def add_goal(x): return True
-    def get_goals(): return []
-    def update_goal(x, y): return True
-    def add_saving(x): return True
-    def get_savings(): return []
+    class FallbackStorage:
+        def init_schema(self): pass
+        def add_expense(self, x, user_id=1): return True
+        def get_expenses(self, x=None, user_id=1): return []
+        def export_expenses_csv(self, *args, **kwargs): return None
+        def add_goal(self, x, user_id=1): return True
+        def get_goals(self, user_id=1): return []
+        def update_goal(self, x, y, user_id=1): return True
+        def add_to_goal(self, x, y, user_id=1): return None
+        def add_saving(self, x, user_id=1): return True
+        def get_savings(self, user_id=1): return []
+        def list_expenses(self, limit=20, after_cursor=None, filters=None, user_id=1): return [], None
+        def get_tags(self, user_id=1): return []
+        def sum_by_category(self, start=None, end=None, user_id=1): return {}
+        def totals_by_month(self, n_months=6, user_id=1): return []
+        def total_expenses(self, start=None, end=None, user_id=1): return 0
+        def total_savings(self, start=None, end=None, user_id=1): return 0
+        def add_user(self, name): return None
+        def get_users(self): return [{'id': 1, 'name': 'Default'}]
+    def get_storage(*args, **kwargs): return FallbackStorage()
+    def import_statement(*args, **kwargs): return None
+    def to_columns(records, names=None): return {name: [r[name] for r in records] for name in names or []}
+    
+    PERIODS = ["Last 7 days", "Last 30 days", "Last 3 months", "Last 6 months", "All time"]
+    CHART_TYPES = ["Category Breakdown", "Monthly Trend", "Daily Spending", "Category Comparison"]
+    RESOLUTION_LABELS = {'day': "Daily", 'week': "Weekly", 'month': "Monthly"}
+    def sidebar_stats(*args, **kwargs):
+        return SimpleNamespace(monthly_total=0, daily_average=0, expense_summary={}, quick_insight=None)
+    def dashboard_snapshot(*args, **kwargs):
+        return SimpleNamespace(total_expenses=0, total_savings=0, active_goals=0, completed_goals=0,
+                               recent_expenses=[], categories=[], month_categories={}, monthly_trend=[])
+    def insights(*args, **kwargs): return SimpleNamespace(is_empty=True, start=None)
+    def analysis_inputs(*args, **kwargs):
+        return SimpleNamespace(expense_summary={}, total_expenses=0, total_savings=0, goals=[], savings_rate=0)
+    def analysis_metrics(*args, **kwargs): return None
+    def start_run(*args, **kwargs): pass
+    def finish_run(*args, **kwargs): return None
+    def section(*args, **kwargs): return nullcontext()
+    def env_enabled(): return False
+    def export_runs(): return ""
+    def cache_stats(): return {}
     
     def get_financial_analysis(*args, **kwargs):
         return "## 🧠 Smart Analysis\n\nAdd your financial data to get personalized insights and recommendations!"
@@ -41,6 +75,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Time this rerun's queries, DataFrames and charts when the debug panel is on
+start_run(enabled=st.session_state.get("debug_timings", False) or env_enabled())
+
 # Custom CSS for dark theme
 def load_css():
     st.markdown("""
@@ -231,10 +268,23 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-# Initialize database
-init_db()
+# Storage backend (SQLite or PostgreSQL, see utils/storage.py) and its
+# connection pool, created once per server process
+@st.cache_resource
+def get_storage_backend():
+    return get_storage()
+
+storage = get_storage_backend()
+
+# Apply schema migrations once per server process rather than on every rerun
+@st.cache_resource
+def run_migrations():
+    return storage.init_schema()
 
-# Load CSS
+run_migrations()
+
+# Load CSS. Unlike the storage setup above this runs on every rerun: Streamlit
+# drops any element a rerun doesn't emit again, styles included
 load_css()
 
 # Title with gradient
@@ -245,11 +295,45 @@ st.markdown('<p style="text-align: center; color: #888; margin-bottom: 2rem; fon
 with st.sidebar:
     st.markdown('<div class="sidebar-content">', unsafe_allow_html=True)
     
+    # A local profile switcher, not a login: anyone using this app can pick any
+    # profile. Every page below only reads and writes the selected profile's data
+    st.markdown('<div class="section-header">👤 User</div>', unsafe_allow_html=True)
+    
+    users = storage.get_users() or [{'id': 1, 'name': 'Default'}]
+    user_names = {user['id']: user['name'] for user in users}
+    # A user created on the previous run is selected before the widget exists
+    if "pending_user_id" in st.session_state:
+        st.session_state.user_id = st.session_state.pop("pending_user_id")
+    user_id = st.selectbox(
+        "Active User",
+        list(user_names),
+        format_func=lambda uid: user_names[uid],
+        key="user_id",
+        help="Profiles keep data apart on this device; they have no passwords"
+    )
+    st.caption("🔓 Local profiles, not accounts: anyone with access to this app can switch to any of them")
+    
+    with st.expander("➕ Add User"):
+        new_user = st.text_input("Name", key="new_user_name")
+        if st.button("Create User", use_container_width=True) and new_user.strip():
+            new_id = storage.add_user(new_user)
+            if new_id is None:
+                st.error("❌ That name is already taken")
+            else:
+                st.session_state.pending_user_id = new_id
+                st.rerun()
+    
+    st.markdown("---")
+    
     st.markdown('<div class="section-header">🎯 Navigation</div>', unsafe_allow_html=True)
     
+    # A page picked by a button on the previous run is selected before the widget exists
+    if "pending_menu" in st.session_state:
+        st.session_state.menu = st.session_state.pop("pending_menu")
     menu = st.selectbox(
         "Choose Section",
-        ["📊 Dashboard", "💸 Add Expense", "🎯 Goals & Savings", "🧠 Smart Analysis", "📈 Insights"]
+        ["📊 Dashboard", "💸 Add Expense", "🎯 Goals & Savings", "🧠 Smart Analysis", "📈 Insights"],
+        key="menu"
     )
     
     st.markdown("---")
@@ -257,36 +341,22 @@ with st.sidebar:
     # Quick Stats in Sidebar
     st.markdown('<div class="section-header">📈 Quick Stats</div>', unsafe_allow_html=True)
     
-    # Get current month's data
-    current_month = datetime.now().strftime('%Y-%m')
-    monthly_expenses = get_expenses(month=current_month)
-    monthly_total = sum(exp['amount'] for exp in monthly_expenses) if monthly_expenses else 0
+    # Current month's spend and quick insight, reused until the next write
+    stats = sidebar_stats(storage, user_id=user_id)
     
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Monthly Spend", f"₹{monthly_total:,.0f}")
+        st.metric("Monthly Spend", f"₹{stats.monthly_total:,.0f}")
     with col2:
-        days_in_month = datetime.now().day
-        daily_avg = monthly_total / days_in_month if days_in_month > 0 else 0
-        st.metric("Daily Avg", f"₹{daily_avg:,.0f}")
+        st.metric("Daily Avg", f"₹{stats.daily_average:,.0f}")
     
     st.markdown("---")
     
     # Quick Insights
     st.markdown('<div class="section-header">💡 Quick Insight</div>', unsafe_allow_html=True)
     
-    # Get expense data for insight
-    all_expenses = get_expenses()
-    if all_expenses:
-        expense_summary = {}
-        for expense in all_expenses:
-            category = expense['category']
-            expense_summary[category] = expense_summary.get(category, 0) + expense['amount']
-        
-        if expense_summary:
-            from utils.ai_helper import smart_ai
-            insight = smart_ai.get_quick_insight(expense_summary)
-            st.markdown(f'<div class="insight-box">{insight}</div>', unsafe_allow_html=True)
+    if stats.quick_insight:
+        st.markdown(f'<div class="insight-box">{stats.quick_insight}</div>', unsafe_allow_html=True)
     else:
         st.info("Add expenses to get insights")
     
@@ -299,44 +369,39 @@ with st.sidebar:
         st.rerun()
     
     if st.button("📊 View Charts", use_container_width=True):
-        st.session_state.menu = "📈 Insights"
+        st.session_state.pending_menu = "📈 Insights"
         st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Dashboard
 if menu == "📊 Dashboard":
-    col1, col2, col3 = st.columns(3)
+    # Plotly and pandas are imported by the pages that use them, so a cold
+    # start on a form-only page doesn't pay for them
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
     
-    # Get all data
-    all_expenses = get_expenses()
-    all_savings = get_savings()
-    goals = get_goals()
+    snapshot = dashboard_snapshot(storage, user_id=user_id)
+    
+    col1, col2, col3 = st.columns(3)
     
     # Total Expenses
     with col1:
-        total_expenses = sum(exp['amount'] for exp in all_expenses) if all_expenses else 0
-        st.metric("Total Expenses", f"₹{total_expenses:,.0f}")
+        st.metric("Total Expenses", f"₹{snapshot.total_expenses:,.0f}")
     
     # Total Savings
     with col2:
-        total_savings = sum(saving['amount'] for saving in all_savings) if all_savings else 0
-        st.metric("Total Savings", f"₹{total_savings:,.0f}")
+        st.metric("Total Savings", f"₹{snapshot.total_savings:,.0f}")
     
     # Active Goals
     with col3:
-        active_goals = len([g for g in goals if g['status'] == 'active']) if goals else 0
-        completed_goals = len([g for g in goals if g['status'] == 'achieved']) if goals else 0
-        st.metric("Goals", f"{active_goals} Active", f"{completed_goals} Completed")
+        st.metric("Goals", f"{snapshot.active_goals} Active", f"{snapshot.completed_goals} Completed")
     
     # Recent Transactions
     st.markdown('<div class="section-header">📝 Recent Transactions</div>', unsafe_allow_html=True)
     
-    if all_expenses:
-        # Get last 5 expenses
-        recent_expenses = all_expenses[:5]
-        
-        for exp in recent_expenses:
+    if snapshot.recent_expenses:
+        for exp in snapshot.recent_expenses:
             col1, col2, col3 = st.columns([2, 1, 1])
             with col1:
                 st.write(f"**{exp['category']}**")
@@ -347,6 +412,62 @@ if menu == "📊 Dashboard":
             with col3:
                 st.caption(exp['date'])
             st.divider()
+        
+        # Paginated browser over the full history
+        with st.expander("📜 Browse All Transactions", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                browse_category = st.selectbox(
+                    "Category",
+                    ["All"] + snapshot.categories,
+                    key="browse_category"
+                )
+            with col2:
+                browse_tag = st.selectbox("Tag", ["All"] + storage.get_tags(user_id=user_id), key="browse_tag")
+            with col3:
+                page_size = st.selectbox("Rows per page", [10, 25, 50], key="browse_page_size")
+            
+            # Cursor stack per filter: index i holds the cursor that opens page i
+            browse_key = (user_id, browse_category, browse_tag, page_size)
+            if st.session_state.get("browse_key") != browse_key:
+                st.session_state.browse_key = browse_key
+                st.session_state.browse_cursors = [None]
+            cursors = st.session_state.browse_cursors
+            
+            filters = {}
+            if browse_category != "All":
+                filters["category"] = browse_category
+            if browse_tag != "All":
+                filters["tag"] = browse_tag
+            page, next_cursor = storage.list_expenses(
+                limit=page_size, after_cursor=cursors[-1], filters=filters, user_id=user_id
+            )
+            
+            if page:
+                st.dataframe(
+                    to_columns(page, ("date", "category", "amount", "description", "tags")),
+                    column_config={
+                        "date": "Date",
+                        "category": "Category",
+                        "amount": st.column_config.NumberColumn("Amount", format="₹%.0f"),
+                        "description": "Description",
+                        "tags": "Tags"
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+            
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("⬅️ Newer", disabled=len(cursors) == 1, use_container_width=True):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                st.caption(f"Page {len(cursors)}")
+            with col3:
+                if st.button("Older ➡️", disabled=next_cursor is None, use_container_width=True):
+                    cursors.append(next_cursor)
+                    st.rerun()
     else:
         st.info("No expenses recorded yet. Add your first expense!")
     
@@ -357,82 +478,72 @@ if menu == "📊 Dashboard":
     
     with col1:
         # Category breakdown for current month
-        monthly_categories = {}
-        for exp in monthly_expenses:
-            category = exp['category']
-            monthly_categories[category] = monthly_categories.get(category, 0) + exp['amount']
+        monthly_categories = snapshot.month_categories
         
         if monthly_categories:
-            fig = go.Figure(data=[go.Pie(
-                labels=list(monthly_categories.keys()),
-                values=list(monthly_categories.values()),
-                hole=0.4,
-                marker_colors=px.colors.qualitative.Set3
-            )])
-            fig.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='#fafafa',
-                height=300,
-                showlegend=True,
-                legend=dict(
-                    bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='#fafafa')
+            with section("Dashboard: category pie", kind="chart"):
+                fig = go.Figure(data=[go.Pie(
+                    labels=list(monthly_categories.keys()),
+                    values=list(monthly_categories.values()),
+                    hole=0.4,
+                    marker_colors=qualitative.Set3
+                )])
+                fig.update_layout(
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    font_color='#fafafa',
+                    height=300,
+                    showlegend=True,
+                    legend=dict(
+                        bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='#fafafa')
+                    )
                 )
-            )
             st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        # Monthly trend
-        months = []
-        amounts = []
-        
-        # Get last 6 months
-        for i in range(5, -1, -1):
-            month = (datetime.now() - timedelta(days=30*i)).strftime('%Y-%m')
-            monthly_data = get_expenses(month=month)
-            total = sum(exp['amount'] for exp in monthly_data)
-            months.append(month[-2:])  # Just month number
-            amounts.append(total)
+        # Monthly trend for the last 6 calendar months
+        months = [month[-2:] for month, _ in snapshot.monthly_trend]  # Just month number
+        amounts = [total for _, total in snapshot.monthly_trend]
         
         if sum(amounts) > 0:
-            fig = go.Figure(data=go.Scatter(
-                x=months,
-                y=amounts,
-                mode='lines+markers',
-                line=dict(color='#4cc9f0', width=3),
-                marker=dict(size=8, color='#7209b7'),
-                fill='tozeroy',
-                fillcolor='rgba(76, 201, 240, 0.1)'
-            ))
-            fig.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font_color='#fafafa',
-                height=300,
-                showlegend=False,
-                xaxis_title="Month",
-                yaxis_title="Amount (₹)"
-            )
+            with section("Dashboard: monthly trend", kind="chart"):
+                fig = go.Figure(data=go.Scatter(
+                    x=months,
+                    y=amounts,
+                    mode='lines+markers',
+                    line=dict(color='#4cc9f0', width=3),
+                    marker=dict(size=8, color='#7209b7'),
+                    fill='tozeroy',
+                    fillcolor='rgba(76, 201, 240, 0.1)'
+                ))
+                fig.update_layout(
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    font_color='#fafafa',
+                    height=300,
+                    showlegend=False,
+                    xaxis_title="Month",
+                    yaxis_title="Amount (₹)"
+                )
             st.plotly_chart(fig, use_container_width=True)
 
 # Add Expense
 elif menu == "💸 Add Expense":
     st.markdown('<div class="section-header">💸 Add New Expense</div>', unsafe_allow_html=True)
     
+    expense_categories = [
+        "Food & Dining", "Transportation", "Shopping", "Entertainment",
+        "Bills & Utilities", "Healthcare", "Education", "Housing",
+        "Personal Care", "Travel", "Gifts", "Investments", "Other"
+    ]
+    
     with st.form("expense_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
         
         with col1:
             amount = st.number_input("Amount (₹)", min_value=1.0, value=500.0, step=100.0)
-            category = st.selectbox(
-                "Category",
-                [
-                    "Food & Dining", "Transportation", "Shopping", "Entertainment",
-                    "Bills & Utilities", "Healthcare", "Education", "Housing",
-                    "Personal Care", "Travel", "Gifts", "Investments", "Other"
-                ]
-            )
+            category = st.selectbox("Category", expense_categories)
         
         with col2:
             date = st.date_input("Date", datetime.now())
@@ -459,13 +570,57 @@ elif menu == "💸 Add Expense":
                     "tags": ",".join(tags)
                 }
                 
-                if add_expense(expense_data):
+                if storage.add_expense(expense_data, user_id=user_id):
                     st.success("✅ Expense added successfully!")
                     st.balloons()
                     # Auto-refresh after 2 seconds
                     st.markdown('<meta http-equiv="refresh" content="2">', unsafe_allow_html=True)
                 else:
                     st.error("❌ Failed to add expense")
+    
+    # Bulk import from a bank statement
+    with st.expander("📥 Import Bank Statement", expanded=False):
+        statement = st.file_uploader(
+            "Upload a CSV or OFX statement",
+            type=["csv", "ofx", "qfx"],
+            help="CSV needs date and amount columns; category, description and tags are optional"
+        )
+        import_category = st.selectbox(
+            "Category for rows without one",
+            expense_categories,
+            index=len(expense_categories) - 1
+        )
+        debits_negative = st.checkbox(
+            "Spending is negative in the amount column",
+            value=True,
+            help="For CSVs with one signed amount column. Untick if purchases are positive "
+                 "and refunds or deposits negative. Rows marked Cr are always skipped."
+        )
+        
+        if statement is not None and st.button("📥 Import Statement", use_container_width=True):
+            with st.spinner("Importing transactions..."):
+                report = import_statement(
+                    io.TextIOWrapper(statement, encoding="utf-8-sig", newline=""),
+                    filename=statement.name,
+                    default_category=import_category,
+                    user_id=user_id,
+                    debits_negative=debits_negative,
+                    storage=storage
+                )
+            
+            if report is None:
+                st.error("❌ Import is not available")
+            else:
+                if report.error:
+                    st.error(f"❌ Import failed, nothing was imported: {report.error}")
+                elif report.imported:
+                    st.success(f"✅ Imported {report.imported:,} expenses")
+                elif not report.rejected:
+                    st.warning("⚠️ No transactions found in this file")
+                if report.rejected:
+                    st.warning(f"⚠️ Skipped {report.rejected:,} rows")
+                    for line, reason in report.errors[:10]:
+                        st.caption(f"Line {line}: {reason}")
 
 # Goals & Savings
 elif menu == "🎯 Goals & Savings":
@@ -509,13 +664,13 @@ elif menu == "🎯 Goals & Savings":
                             "status": "active"
                         }
                         
-                        if add_goal(goal_data):
+                        if storage.add_goal(goal_data, user_id=user_id):
                             st.success("✅ Goal added successfully!")
                             st.rerun()
         
         # Display goals
         st.markdown("### Your Goals")
-        goals = get_goals()
+        goals = storage.get_goals(user_id=user_id)
         
         if not goals:
             st.info("No goals set yet. Create your first financial goal!")
@@ -542,10 +697,13 @@ elif menu == "🎯 Goals & Savings":
                         with st.popover("➕ Add"):
                             add_amount = st.number_input("Amount to add", min_value=100.0, key=f"add_{goal['id']}")
                             if st.button("Add", key=f"confirm_{goal['id']}"):
-                                new_amount = goal['current_amount'] + add_amount
-                                if update_goal(goal['id'], new_amount):
-                                    st.success(f"Added ₹{add_amount:,.0f}!")
+                                # Incremented in the database, so a stale render can't overwrite other contributions
+                                updated = storage.add_to_goal(goal['id'], add_amount, user_id=user_id)
+                                if updated:
+                                    st.success(f"Added ₹{add_amount:,.0f}! Now ₹{updated['current_amount']:,.0f}")
                                     st.rerun()
+                                else:
+                                    st.error("❌ Could not update goal")
     
     with tab2:
         st.markdown('<div class="section-header">💰 Track Savings</div>', unsafe_allow_html=True)
@@ -575,16 +733,17 @@ elif menu == "🎯 Goals & Savings":
                     "purpose": savings_purpose
                 }
                 
-                if add_saving(savings_data):
+                if storage.add_saving(savings_data, user_id=user_id):
                     st.success("✅ Savings added successfully!")
                     st.rerun()
         
         # Display savings
         st.markdown("### Savings History")
-        savings = get_savings()
+        savings = storage.get_savings(user_id=user_id)
         
         if savings:
-            df_savings = pd.DataFrame(savings)
+            import pandas as pd
+            df_savings = pd.DataFrame(to_columns(savings))
             st.dataframe(
                 df_savings,
                 column_config={
@@ -609,17 +768,15 @@ elif menu == "🧠 Smart Analysis":
     st.markdown('<div class="section-header">🧠 Smart Financial Analysis</div>', unsafe_allow_html=True)
     
     # Get financial data
-    expenses = get_expenses()
-    savings_data = get_savings()
-    goals = get_goals()
+    inputs = analysis_inputs(storage, user_id=user_id)
     
-    if not expenses:
+    if not inputs.expense_summary:
         st.warning("Add some expenses first to get personalized analysis!")
         
         col1, col2 = st.columns(2)
         with col1:
             if st.button("➕ Add First Expense", use_container_width=True):
-                st.session_state.menu = "💸 Add Expense"
+                st.session_state.pending_menu = "💸 Add Expense"
                 st.rerun()
         with col2:
             if st.button("📊 See Example Analysis", use_container_width=True):
@@ -629,25 +786,15 @@ elif menu == "🧠 Smart Analysis":
                 )
                 st.markdown(f'<div class="ai-response">{example_analysis}</div>', unsafe_allow_html=True)
     else:
-        # Prepare data for analysis
-        expense_summary = {}
-        for expense in expenses:
-            category = expense['category']
-            expense_summary[category] = expense_summary.get(category, 0) + expense['amount']
-        
-        total_expenses = sum(expense['amount'] for expense in expenses)
-        total_savings = sum(saving['amount'] for saving in savings_data) if savings_data else 0
-        
         # Financial snapshot
         st.markdown("### 📊 Your Financial Snapshot")
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Expenses", f"₹{total_expenses:,.0f}")
+            st.metric("Total Expenses", f"₹{inputs.total_expenses:,.0f}")
         with col2:
-            st.metric("Total Savings", f"₹{total_savings:,.0f}")
+            st.metric("Total Savings", f"₹{inputs.total_savings:,.0f}")
         with col3:
-            savings_rate = (total_savings / total_expenses * 100) if total_expenses > 0 else 0
-            st.metric("Savings Rate", f"{savings_rate:.1f}%")
+            st.metric("Savings Rate", f"{inputs.savings_rate:.1f}%")
         
         # Analysis options
         st.markdown("---")
@@ -700,12 +847,13 @@ elif menu == "🧠 Smart Analysis":
                 if quick_btn:
                     # Quick analysis
                     from utils.ai_helper import smart_ai
-                    analysis = smart_ai.get_quick_insight(expense_summary)
+                    analysis = smart_ai.get_quick_insight(inputs.expense_summary)
                     st.markdown(f'<div class="ai-response">{analysis}</div>', unsafe_allow_html=True)
                 else:
-                    # Full analysis
+                    # Full analysis, with monthly trends from the rollup and tag totals
                     analysis = get_financial_analysis(
-                        expense_summary, total_expenses, total_savings, goals, analysis_type
+                        inputs.expense_summary, inputs.total_expenses, inputs.total_savings, inputs.goals,
+                        analysis_type, metrics=analysis_metrics(storage, user_id=user_id)
                     )
                     
                     # Display analysis
@@ -743,83 +891,59 @@ elif menu == "🧠 Smart Analysis":
 elif menu == "📈 Insights":
     st.markdown('<div class="section-header">📈 Detailed Insights</div>', unsafe_allow_html=True)
     
-    # Get all data
-    all_expenses = get_expenses()
-    
-    if not all_expenses:
+    if not stats.expense_summary:
         st.info("Add expenses to see detailed insights and charts")
     else:
-        # Convert to DataFrame
-        df = pd.DataFrame(all_expenses)
-        df['date'] = pd.to_datetime(df['date'])
+        import pandas as pd
+        import plotly.express as px
+        import plotly.graph_objects as go
         
         # Time period selection
         col1, col2 = st.columns(2)
         with col1:
-            period = st.selectbox(
-                "Time Period",
-                ["Last 7 days", "Last 30 days", "Last 3 months", "Last 6 months", "All time"]
-            )
+            period = st.selectbox("Time Period", PERIODS)
         with col2:
-            chart_type = st.selectbox(
-                "Chart Type",
-                ["Category Breakdown", "Monthly Trend", "Daily Spending", "Category Comparison"]
-            )
-        
-        # Filter data based on period
-        now = datetime.now()
-        if period == "Last 7 days":
-            cutoff = now - timedelta(days=7)
-        elif period == "Last 30 days":
-            cutoff = now - timedelta(days=30)
-        elif period == "Last 3 months":
-            cutoff = now - timedelta(days=90)
-        elif period == "Last 6 months":
-            cutoff = now - timedelta(days=180)
-        else:
-            cutoff = df['date'].min() if not df.empty else now
+            chart_type = st.selectbox("Chart Type", CHART_TYPES)
         
-        df_filtered = df[df['date'] >= cutoff] if not df.empty else df
+        # Period totals and the selected chart's series, aggregated in the database
+        result = insights(storage, period, chart_type, user_id=user_id)
         
-        if not df_filtered.empty:
+        if not result.is_empty:
             # Metrics
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total = df_filtered['amount'].sum()
-                st.metric("Total Spend", f"₹{total:,.0f}")
+                st.metric("Total Spend", f"₹{result.total:,.0f}")
             
             with col2:
-                avg_daily = total / max(len(df_filtered['date'].dt.date.unique()), 1)
-                st.metric("Avg Daily", f"₹{avg_daily:,.0f}")
+                st.metric("Avg Daily", f"₹{result.average_daily:,.0f}")
             
             with col3:
-                avg_transaction = df_filtered['amount'].mean()
-                st.metric("Avg Transaction", f"₹{avg_transaction:,.0f}")
+                st.metric("Avg Transaction", f"₹{result.average_transaction:,.0f}")
             
             with col4:
-                transaction_count = len(df_filtered)
-                st.metric("Transactions", transaction_count)
+                st.metric("Transactions", result.transaction_count)
             
             # Charts
             st.markdown("---")
             
             if chart_type == "Category Breakdown":
-                category_data = df_filtered.groupby('category')['amount'].sum().reset_index()
+                with section("Insights: category breakdown", kind="chart"):
+                    category_data = pd.DataFrame(result.category_totals, columns=['category', 'amount'])
                 
-                fig = px.treemap(
-                    category_data,
-                    path=['category'],
-                    values='amount',
-                    title="Expense Distribution by Category",
-                    color='amount',
-                    color_continuous_scale='Viridis'
-                )
-                fig.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font_color='#fafafa',
-                    height=500
-                )
+                    fig = px.treemap(
+                        category_data,
+                        path=['category'],
+                        values='amount',
+                        title="Expense Distribution by Category",
+                        color='amount',
+                        color_continuous_scale='Viridis'
+                    )
+                    fig.update_layout(
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font_color='#fafafa',
+                        height=500
+                    )
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Top categories table
@@ -836,66 +960,151 @@ elif menu == "📈 Insights":
                 )
             
             elif chart_type == "Monthly Trend":
-                monthly_trend = df_filtered.groupby(df_filtered['date'].dt.to_period('M'))['amount'].sum().reset_index()
-                monthly_trend['date'] = monthly_trend['date'].dt.to_timestamp()
+                with section("Insights: monthly trend", kind="chart"):
+                    monthly_trend = pd.DataFrame(result.monthly_totals, columns=['date', 'amount'])
+                    monthly_trend['date'] = pd.to_datetime(monthly_trend['date'])
                 
-                fig = px.bar(
-                    monthly_trend,
-                    x='date',
-                    y='amount',
-                    title="Monthly Spending Trend",
-                    color='amount',
-                    color_continuous_scale='Plasma'
-                )
-                fig.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font_color='#fafafa',
-                    xaxis_title="Month",
-                    yaxis_title="Amount (₹)",
-                    height=400
-                )
+                    fig = px.bar(
+                        monthly_trend,
+                        x='date',
+                        y='amount',
+                        title="Monthly Spending Trend",
+                        color='amount',
+                        color_continuous_scale='Plasma'
+                    )
+                    fig.update_layout(
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font_color='#fafafa',
+                        xaxis_title="Month",
+                        yaxis_title="Amount (₹)",
+                        height=400
+                    )
                 st.plotly_chart(fig, use_container_width=True)
             
             elif chart_type == "Daily Spending":
-                daily_trend = df_filtered.groupby(df_filtered['date'].dt.date)['amount'].sum().reset_index()
+                with section("Insights: daily spending", kind="chart"):
+                    # Per day, week or month depending on the period, with a bounded number of points
+                    daily_trend = pd.DataFrame(result.spending_trend, columns=['date', 'amount'])
                 
-                fig = px.line(
-                    daily_trend,
-                    x='date',
-                    y='amount',
-                    title="Daily Spending Trend",
-                    markers=True
-                )
-                fig.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font_color='#fafafa',
-                    xaxis_title="Date",
-                    yaxis_title="Amount (₹)",
-                    height=400
-                )
-                fig.update_traces(line_color='#4cc9f0', marker_color='#7209b7')
+                    fig = px.line(
+                        daily_trend,
+                        x='date',
+                        y='amount',
+                        title=f"{RESOLUTION_LABELS[result.resolution]} Spending Trend",
+                        markers=True
+                    )
+                    fig.update_layout(
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font_color='#fafafa',
+                        xaxis_title="Date",
+                        yaxis_title="Amount (₹)",
+                        height=400
+                    )
+                    fig.update_traces(line_color='#4cc9f0', marker_color='#7209b7')
                 st.plotly_chart(fig, use_container_width=True)
             
+            elif chart_type == "Category Comparison":
+                if not result.category_comparison:
+                    st.info("Choose a time period other than \"All time\" to compare it with the period before")
+                else:
+                    with section("Insights: category comparison", kind="chart"):
+                        comparison = pd.DataFrame(result.category_comparison)
+                        
+                        fig = go.Figure(data=[
+                            go.Bar(name="Previous period", x=comparison['category'], y=comparison['previous'],
+                                   marker_color='#7209b7'),
+                            go.Bar(name="This period", x=comparison['category'], y=comparison['current'],
+                                   marker_color='#4cc9f0')
+                        ])
+                        fig.update_layout(
+                            barmode='group',
+                            title=f"{period} vs the Period Before",
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            font_color='#fafafa',
+                            xaxis_title="Category",
+                            yaxis_title="Amount (₹)",
+                            height=450
+                        )
+                    st.plotly_chart(fig, use_container_width=True)
+                    
+                    # Per-category deltas
+                    st.markdown("### Changes by Category")
+                    st.dataframe(
+                        comparison,
+                        column_config={
+                            "category": "Category",
+                            "current": st.column_config.NumberColumn("This Period", format="₹%.0f"),
+                            "previous": st.column_config.NumberColumn("Previous Period", format="₹%.0f"),
+                            "change": st.column_config.NumberColumn("Change", format="₹%+.0f"),
+                            "change_pct": st.column_config.NumberColumn("Change %", format="%+.1f%%")
+                        },
+                        hide_index=True,
+                        use_container_width=True
+                    )
+            
             # Export options
             st.markdown("---")
             col1, col2 = st.columns(2)
             
             with col1:
+                compress_export = st.checkbox("Compress export (gzip)", value=False)
                 if st.button("📥 Export to CSV", use_container_width=True):
-                    csv = df.to_csv(index=False)
-                    st.download_button(
-                        label="Download CSV",
-                        data=csv,
-                        file_name="expense_data.csv",
-                        mime="text/csv"
-                    )
+                    # download_button needs the bytes anyway, so write straight into memory
+                    export_file = io.BytesIO()
+                    exported = storage.export_expenses_csv(export_file, start=result.start,
+                                                           compress=compress_export, user_id=user_id)
+                    if exported is None:
+                        st.error("❌ Export failed, please try again")
+                    else:
+                        st.download_button(
+                            label="Download CSV",
+                            data=export_file.getvalue(),
+                            file_name="expense_data.csv.gz" if compress_export else "expense_data.csv",
+                            mime="application/gzip" if compress_export else "text/csv"
+                        )
             
             with col2:
                 if st.button("📊 Generate Report", use_container_width=True):
                     st.info("Report generation coming soon!")
 
+# Debug panel: where this rerun's time went
+with st.sidebar:
+    st.markdown("---")
+    st.checkbox("🐞 Debug timings", key="debug_timings")
+    run = finish_run(label=menu)
+    if run is not None:
+        st.caption(f"{run.seconds * 1000:,.1f} ms • {run.queries} queries • {run.rows} rows")
+        for kind, seconds in sorted(run.by_kind().items(), key=lambda item: item[1], reverse=True):
+            st.caption(f"{kind}: {seconds * 1000:,.1f} ms")
+        reads = cache_stats()
+        if reads:
+            st.caption(
+                f"Read cache: {reads['hits']} hits • {reads['misses']} misses • "
+                f"{reads['size']} reads, {reads['rows']:,} rows held"
+            )
+        st.dataframe(
+            [
+                {
+                    "span": "  " * span.depth + span.name,
+                    "ms": round(span.seconds * 1000, 2),
+                    "queries": span.queries,
+                    "rows": span.rows,
+                }
+                for span in run.spans
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+        st.download_button(
+            "Export timings (JSON lines)",
+            data=export_runs(),
+            file_name="smartspend_timings.jsonl",
+            mime="application/x-ndjson"
+        )
+
 # Footer
 st.markdown("---")
 st.markdown(
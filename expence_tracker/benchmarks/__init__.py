@@ -0,0 +1,7 @@
+"""Headless performance benchmarks for SmartSpend.
+
+Run from the expence_tracker directory, e.g. ``python -m benchmarks.bench_data``
+(data_handler, page and analysis timings) or ``python -m benchmarks.bench_analysis``
+(analysis engine vs. dict loops). ``benchmarks.datagen`` builds the synthetic
+databases they use.
+"""
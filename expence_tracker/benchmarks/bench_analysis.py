@@ -0,0 +1,72 @@
+"""Compare the vectorized analysis engine with the dict-based summing path.
+
+    python -m benchmarks.bench_analysis --rows 100000 1000000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.datagen import make_columns, parse_size
+from utils.analysis_engine import compute_metrics
+
+
+def dict_path(rows):
+    """The pre-engine approach: per-row Python loops over get_expenses() dicts"""
+    expense_summary = {}
+    monthly = {}
+    tag_totals = {}
+    for expense in rows:
+        category = expense['category']
+        expense_summary[category] = expense_summary.get(category, 0) + expense['amount']
+        month = expense['date'][:7]
+        monthly[month] = monthly.get(month, 0) + expense['amount']
+        for tag in (expense['tags'] or '').split(','):
+            if tag:
+                tag_totals[tag] = tag_totals.get(tag, 0) + expense['amount']
+    total = sum(expense['amount'] for expense in rows)
+    ranked = sorted(expense_summary.items(), key=lambda x: x[1], reverse=True)
+    largest = max(expense_summary.values())
+    shares = {category: amount / total * 100 for category, amount in expense_summary.items()}
+    return ranked, largest, shares, monthly, tag_totals
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(row_counts, repeat=3):
+    results = []
+    for n_rows in row_counts:
+        columns = make_columns(n_rows)
+        rows = [
+            {'amount': float(a), 'category': c, 'date': str(d), 'tags': t}
+            for a, c, d, t in zip(columns['amount'], columns['category'], columns['date'], columns['tags'])
+        ]
+        dict_seconds = timed(lambda: dict_path(rows), repeat)
+        engine_seconds = timed(lambda: compute_metrics(
+            columns['amount'], columns['category'], dates=columns['date'], tags=columns['tags']
+        ), repeat)
+        results.append({
+            'rows': n_rows,
+            'dict_path_s': round(dict_seconds, 4),
+            'engine_s': round(engine_seconds, 4),
+            'speedup': round(dict_seconds / engine_seconds, 1) if engine_seconds else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Time data_handler, the app's page data paths and the financial analysis on synthetic data.
+
+    python -m benchmarks.bench_data --rows 10k 100k 1m --output results.json
+    python -m benchmarks.bench_data --rows 10k --compare results.json
+
+Reads are timed cold (read cache and memoized service results cleared before
+every call). Each size uses a generated database from benchmarks.datagen,
+cached between runs. The app paths time the utils.services calls each page
+renders from.
+"""
+import argparse
+import io
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.datagen import cached_database, parse_size
+from utils import data_handler, services
+from utils.ai_helper import get_financial_analysis, smart_ai
+from utils.analysis_engine import compute_metrics, metrics_from_rollup
+from utils.cache import clear_read_cache
+from utils.snapshot import SnapshotStore, load_pyarrow, metrics_inputs
+from utils.storage import SQLiteBackend
+
+# A benchmark is slower than its baseline when it takes this much longer,
+# and by at least MIN_REGRESSION_S (sub-millisecond timings are mostly noise)
+REGRESSION_THRESHOLD = 0.25
+MIN_REGRESSION_S = 0.001
+
+
+def timed(func, repeat):
+    """Best and mean wall time of func over repeat cold runs"""
+    times = []
+    for _ in range(repeat):
+        clear_read_cache()
+        services.clear_results()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.mean(times)
+
+
+def dashboard_path(storage, user_id=1):
+    """The sidebar and the Dashboard page"""
+    services.sidebar_stats(storage, user_id=user_id)
+    services.dashboard_snapshot(storage, user_id=user_id)
+
+
+def insights_path(storage, period="Last 3 months", user_id=1):
+    """The Insights page's metrics and every chart's series for one period"""
+    for chart_type in services.CHART_TYPES:
+        services.insights(storage, period, chart_type, user_id=user_id)
+
+
+def analysis_path(storage, user_id=1):
+    """The Smart Analysis page's full analysis, without the analysis cache"""
+    smart_ai.analysis_cache.clear()
+    inputs = services.analysis_inputs(storage, user_id=user_id)
+    return get_financial_analysis(
+        inputs.expense_summary, inputs.total_expenses, inputs.total_savings, inputs.goals,
+        metrics=services.analysis_metrics(storage, user_id=user_id)
+    )
+
+
+def read_benchmarks(storage):
+    """(name, callable) pairs that leave the database unchanged"""
+    today = date.today()
+    month_start, month_end = data_handler.month_bounds(today.strftime('%Y-%m'))
+    quarter_start = (today - timedelta(days=90)).isoformat()
+    first_page, cursor = data_handler.list_expenses(limit=20)
+    deep_cursor = None
+    if first_page:
+        # A cursor far into the history, to show keyset pages cost the same at any depth
+        with data_handler.db_connection() as conn:
+            row = conn.execute('SELECT date, id FROM expenses ORDER BY date, id LIMIT 1 OFFSET 100').fetchone()
+        deep_cursor = data_handler._encode_cursor(row) if row else cursor
+    tags = data_handler.get_tags()
+    benchmarks = [
+        ('get_expenses(month)', lambda: data_handler.get_expenses(today.strftime('%Y-%m'))),
+        ('get_expenses(all)', lambda: data_handler.get_expenses()),
+        ('expense_columns(all)', lambda: data_handler.expense_columns()),
+        ('expense_columns(all, every column)', lambda: data_handler.expense_columns(columns=data_handler.EXPENSE_FIELDS)),
+        ('list_expenses(first page)', lambda: data_handler.list_expenses(limit=20)),
+        ('list_expenses(deep page)', lambda: data_handler.list_expenses(limit=20, after_cursor=deep_cursor)),
+        ('list_expenses(tag filter)', lambda: data_handler.list_expenses(limit=20, filters={'tag': tags[0]} if tags else None)),
+        ('sum_by_category(all)', lambda: data_handler.sum_by_category()),
+        ('sum_by_category(month)', lambda: data_handler.sum_by_category(month_start, month_end)),
+        ('sum_by_category(90 days)', lambda: data_handler.sum_by_category(quarter_start)),
+        ('total_expenses(all)', lambda: data_handler.total_expenses()),
+        ('total_expenses(90 days)', lambda: data_handler.total_expenses(quarter_start)),
+        ('totals_by_month(6)', lambda: data_handler.totals_by_month(6)),
+        ('totals_by_day(90 days)', lambda: data_handler.totals_by_day(quarter_start)),
+        ('totals_by_tag(all)', lambda: data_handler.totals_by_tag()),
+        ('get_tags', lambda: data_handler.get_tags()),
+        ('get_rollup', lambda: data_handler.get_rollup()),
+        ('get_goals', lambda: data_handler.get_goals()),
+        ('get_savings', lambda: data_handler.get_savings()),
+        ('total_savings', lambda: data_handler.total_savings()),
+        ('savings_by_month', lambda: data_handler.savings_by_month()),
+        ('export_expenses_csv(90 days)', lambda: data_handler.export_expenses_csv(io.BytesIO(), start=quarter_start)),
+        ('app: dashboard', lambda: dashboard_path(storage)),
+        ('app: insights(3 months)', lambda: insights_path(storage)),
+        ('app: insights(all time)', lambda: insights_path(storage, "All time")),
+        ('get_financial_analysis', lambda: analysis_path(storage)),
+        ('analysis metrics(rollup)', lambda: metrics_from_rollup(
+            data_handler.get_rollup(), data_handler.savings_by_month(), data_handler.totals_by_tag()
+        )),
+    ]
+    if load_pyarrow():
+        # Built (or brought up to date) outside the timings, next to the generated database
+        store = SnapshotStore(data_handler.DATABASE_NAME)
+        store.refresh()
+        benchmarks += [
+            ('snapshot: refresh(no new rows)', store.refresh),
+            ('snapshot: load', store.load),
+            ('analysis metrics(snapshot)', lambda: compute_metrics(**metrics_inputs(store.load(1)))),
+        ]
+    return benchmarks
+
+
+def write_benchmarks():
+    """(name, callable) pairs that write; run_writes() undoes them afterwards"""
+    expense = {'amount': 250.0, 'category': 'Food & Dining', 'date': date.today().isoformat(),
+               'description': 'benchmark', 'tags': 'Essential'}
+    goal_id = data_handler.get_goals()[0]['id']
+    return [
+        ('add_expense', lambda: data_handler.add_expense(expense)),
+        ('add_expenses_bulk(1000)', lambda: data_handler.add_expenses_bulk(expense for _ in range(1000))),
+        ('add_saving', lambda: data_handler.add_saving({'amount': 1000.0, 'date': date.today().isoformat()})),
+        ('update_goal', lambda: data_handler.update_goal(goal_id, 1000.0)),
+        ('add_to_goal', lambda: data_handler.add_to_goal(goal_id, 1.0)),
+    ]
+
+
+def run_writes(repeat):
+    """Time the write benchmarks, then delete the rows and restore the goals they touched"""
+    with data_handler.db_connection() as conn:
+        max_expense = conn.execute('SELECT COALESCE(MAX(id), 0) FROM expenses').fetchone()[0]
+        max_saving = conn.execute('SELECT COALESCE(MAX(id), 0) FROM savings').fetchone()[0]
+        goals = [tuple(row) for row in conn.execute('SELECT current_amount, status, id FROM goals')]
+    try:
+        return [(name,) + timed(func, repeat) for name, func in write_benchmarks()]
+    finally:
+        with data_handler.db_connection() as conn:
+            conn.execute('DELETE FROM expenses WHERE id > ?', (max_expense,))
+            conn.execute('DELETE FROM savings WHERE id > ?', (max_saving,))
+            conn.executemany('UPDATE goals SET current_amount = ?, status = ? WHERE id = ?', goals)
+            conn.commit()
+
+
+def run(row_counts, repeat=3, seed=42, data_dir=None, writes=True):
+    results = []
+    for n_rows in row_counts:
+        data_handler.DATABASE_NAME = cached_database(n_rows, seed, data_dir=data_dir)
+        storage = SQLiteBackend()
+        timings = [(name,) + timed(func, repeat) for name, func in read_benchmarks(storage)]
+        if writes:
+            timings += run_writes(repeat)
+        for name, best, mean in timings:
+            results.append({'rows': n_rows, 'name': name, 'best_s': round(best, 6), 'mean_s': round(mean, 6)})
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Benchmarks whose best time grew by more than threshold against the baseline"""
+    before = {(r['rows'], r['name']): r['best_s'] for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        old = before.get((result['rows'], result['name']))
+        if old and result['best_s'] > old * (1 + threshold) and result['best_s'] - old >= MIN_REGRESSION_S:
+            regressions.append({**result, 'baseline_s': old, 'ratio': round(result['best_s'] / old, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, nargs='+', default=[10_000, 100_000],
+                        help="Expense rows per database (e.g. 10k 100k 1m 10m)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', help="Where generated databases are kept between runs")
+    parser.add_argument('--no-writes', action='store_true', help="Skip the write benchmarks")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--compare', help="Baseline JSON report; exit 1 if anything regressed")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat, args.seed, args.data_dir, writes=not args.no_writes)
+    if args.compare:
+        with open(args.compare) as handle:
+            report['regressions'] = compare(report, json.load(handle), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text)
+    else:
+        print(text)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
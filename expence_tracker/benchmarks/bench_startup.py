@@ -0,0 +1,142 @@
+"""Time a cold start of the Streamlit app: module imports and each page's first render.
+
+    python -m benchmarks.bench_startup --rows 10k --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+
+Every measurement runs in a fresh interpreter, the way an autoscaled
+container serves its first request. The app renders against a copy of a
+generated database from benchmarks.datagen.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(PROJECT_DIR, 'app.py')
+
+PAGES = ["📊 Dashboard", "💸 Add Expense", "🎯 Goals & Savings", "🧠 Smart Analysis", "📈 Insights"]
+# Modules whose import cost the app defers to the pages that need them
+HEAVY_MODULES = ['pandas', 'plotly.express', 'pyarrow', 'requests']
+
+# Seconds allowed for one first render
+RENDER_TIMEOUT = 120
+# As in benchmarks.bench_data, which isn't imported until the children have run
+REGRESSION_THRESHOLD = 0.25
+
+
+def measure(page):
+    """Import and first-render times for one page, in this (fresh) interpreter"""
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    streamlit_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from utils import ai_helper, data_handler, importer, instrumentation, services, storage  # noqa: F401
+    app_modules_s = time.perf_counter() - started
+    loaded_at_import = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    at = AppTest.from_file(APP_PATH, default_timeout=RENDER_TIMEOUT)
+    at.session_state['menu'] = page
+    started = time.perf_counter()
+    at.run()
+    render_s = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"{page} failed to render: {at.exception[0].message}")
+
+    return {
+        'import_streamlit_s': streamlit_s,
+        'import_app_modules_s': app_modules_s,
+        'first_render_s': render_s,
+        'loaded_at_import': loaded_at_import,
+        'loaded_after_render': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def cold_start(page, work_dir):
+    """Run measure(page) in a new interpreter inside work_dir"""
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [PROJECT_DIR, os.getenv('PYTHONPATH')]))}
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--child', page],
+        cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    # The last line is the measurement; anything before it is the app's own output
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(n_rows, repeat=3, seed=42, data_dir=None):
+    # Imported here: the child interpreters must start without the app's modules loaded
+    from benchmarks.datagen import cached_database
+    from utils.data_handler import DATABASE_NAME
+
+    database = cached_database(n_rows, seed, data_dir=data_dir)
+    work_dir = tempfile.mkdtemp(prefix='smartspend-startup-')
+    timings = {'import: streamlit': [], 'import: app modules': []}
+    modules = {}
+    try:
+        for page in PAGES:
+            # A fresh copy per page, so one page's writes and WAL don't carry over
+            shutil.copyfile(database, os.path.join(work_dir, DATABASE_NAME))
+            runs = [cold_start(page, work_dir) for _ in range(repeat)]
+            timings['import: streamlit'] += [r['import_streamlit_s'] for r in runs]
+            timings['import: app modules'] += [r['import_app_modules_s'] for r in runs]
+            timings[f'first render: {page}'] = [r['first_render_s'] for r in runs]
+            modules[page] = {'at_import': runs[0]['loaded_at_import'], 'after_render': runs[0]['loaded_after_render']}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': [
+            {'rows': n_rows, 'name': name, 'best_s': round(min(times), 6), 'mean_s': round(statistics.mean(times), 6)}
+            for name, times in timings.items()
+        ],
+        'heavy_modules': modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--child', metavar='PAGE', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', default='10k', help="Expense rows in the database (e.g. 10k, 100k)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', help="Where generated databases are kept between runs")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--compare', help="Baseline JSON report; exit 1 if anything regressed")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        return 0
+
+    from benchmarks.bench_data import compare
+    from benchmarks.datagen import parse_size
+    report = run(parse_size(args.rows), args.repeat, args.seed, args.data_dir)
+    if args.compare:
+        with open(args.compare) as handle:
+            report['regressions'] = compare(report, json.load(handle), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(text)
+    else:
+        print(text)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
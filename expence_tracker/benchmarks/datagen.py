@@ -0,0 +1,172 @@
+"""Deterministic synthetic SmartSpend databases for benchmarking.
+
+    python -m benchmarks.datagen --rows 100000 --output /tmp/smartspend_100k.db
+
+The same rows, seed and end date always produce the same database.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+from utils.data_handler import EXPENSE_INSERT_SQL, SAVING_INSERT_SQL, get_db_connection
+from utils.migrations import migrate
+
+# Named sizes accepted wherever a row count is
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+CATEGORIES = [
+    "Food & Dining", "Transportation", "Shopping", "Entertainment",
+    "Bills & Utilities", "Healthcare", "Education", "Housing",
+    "Personal Care", "Travel", "Gifts", "Investments", "Other"
+]
+# Relative frequency of each category; everyday spending dominates
+CATEGORY_WEIGHTS = [22, 14, 12, 8, 10, 4, 3, 5, 6, 3, 2, 2, 9]
+# Typical amount (₹) per category, scaled by a gamma distribution
+CATEGORY_SCALE = [350, 200, 900, 600, 1800, 1200, 2500, 9000, 400, 6000, 1500, 5000, 500]
+TAGS = ["", "", "Essential", "Discretionary", "Recurring", "Work,Recurring", "Personal,One-time"]
+DESCRIPTIONS = ["", "Card payment", "UPI transfer", "Cash", "Online order", "Subscription"]
+SAVINGS_SOURCES = ["Salary", "Bonus", "Freelance", "Investment Returns", "Gift", "Other"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+# History length and savings density of generated data
+HISTORY_DAYS = 3 * 365
+EXPENSES_PER_SAVING = 20
+
+
+def parse_size(value):
+    """Accept 10000, 10k, 1m, ... as a row count"""
+    return SIZES.get(str(value).lower()) or int(value)
+
+
+def make_columns(n_rows, seed=42, end=None, days=HISTORY_DAYS):
+    """Synthetic expense columns covering the days before end (default today)"""
+    rng = np.random.default_rng(seed)
+    end = np.datetime64(end or date.today().isoformat())
+    weights = np.array(CATEGORY_WEIGHTS, dtype=np.float64)
+    codes = rng.choice(len(CATEGORIES), n_rows, p=weights / weights.sum())
+    return {
+        'amount': np.round(rng.gamma(2.0, 0.5, n_rows) * np.array(CATEGORY_SCALE)[codes], 2) + 1,
+        'category': np.array(CATEGORIES, dtype=object)[codes],
+        'date': end - rng.integers(0, days, n_rows).astype('timedelta64[D]'),
+        'tags': np.array(TAGS, dtype=object)[rng.integers(0, len(TAGS), n_rows)],
+        'description': np.array(DESCRIPTIONS, dtype=object)[rng.integers(0, len(DESCRIPTIONS), n_rows)],
+    }
+
+
+def make_savings(n_rows, seed=42, end=None, days=HISTORY_DAYS):
+    """Synthetic savings columns"""
+    rng = np.random.default_rng(seed + 1)
+    end = np.datetime64(end or date.today().isoformat())
+    return {
+        'amount': np.round(rng.gamma(2.0, 2500.0, n_rows), -2) + 100,
+        'date': end - rng.integers(0, days, n_rows).astype('timedelta64[D]'),
+        'source': np.array(SAVINGS_SOURCES, dtype=object)[rng.integers(0, len(SAVINGS_SOURCES), n_rows)],
+    }
+
+
+def make_goals(n_goals, seed=42, end=None):
+    """Synthetic goal dicts with deadlines up to two years after end"""
+    rng = np.random.default_rng(seed + 2)
+    end = np.datetime64(end or date.today().isoformat())
+    goals = []
+    for i in range(n_goals):
+        target = float(np.round(rng.uniform(10_000, 500_000), -3))
+        goals.append({
+            'name': f"Goal {i + 1}",
+            'target_amount': target,
+            'current_amount': float(np.round(target * rng.uniform(0, 0.9), -2)),
+            'deadline': str(end + np.timedelta64(int(rng.integers(30, 730)), 'D')),
+            'priority': PRIORITIES[int(rng.integers(0, len(PRIORITIES)))],
+        })
+    return goals
+
+
+def build_database(path, n_expenses, seed=42, end=None, n_users=1, chunk_size=100_000):
+    """Create a migrated database at path filled with synthetic data, returning a summary
+
+    Rows are spread round-robin over users 1..n_users and inserted chunk_size
+    at a time through the same SQL and triggers the app uses.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    migrate(path)
+
+    started = time.perf_counter()
+    conn = get_db_connection(path)
+    try:
+        for user_id in range(2, n_users + 1):
+            conn.execute('INSERT INTO users (id, name) VALUES (?, ?)', (user_id, f"User {user_id}"))
+
+        for offset in range(0, n_expenses, chunk_size):
+            count = min(chunk_size, n_expenses - offset)
+            columns = make_columns(count, seed + offset, end)
+            users = (np.arange(offset, offset + count) % n_users + 1).tolist()
+            conn.executemany(EXPENSE_INSERT_SQL, zip(
+                columns['amount'].tolist(), columns['category'].tolist(),
+                columns['date'].astype(str).tolist(), columns['description'].tolist(),
+                columns['tags'].tolist(), users,
+            ))
+            conn.commit()
+
+        n_savings = max(1, n_expenses // EXPENSES_PER_SAVING)
+        savings = make_savings(n_savings, seed, end)
+        conn.executemany(SAVING_INSERT_SQL, zip(
+            savings['amount'].tolist(), savings['date'].astype(str).tolist(),
+            savings['source'].tolist(), [''] * n_savings,
+            (np.arange(n_savings) % n_users + 1).tolist(),
+        ))
+
+        goals = make_goals(8 * n_users, seed, end)
+        conn.executemany('''
+            INSERT INTO goals (name, target_amount, current_amount, deadline, priority, user_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (g['name'], g['target_amount'], g['current_amount'], g['deadline'], g['priority'], i % n_users + 1)
+            for i, g in enumerate(goals)
+        ])
+        conn.commit()
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+    return {
+        'path': path,
+        'expenses': n_expenses,
+        'savings': n_savings,
+        'goals': len(goals),
+        'users': n_users,
+        'seed': seed,
+        'build_s': round(time.perf_counter() - started, 2),
+    }
+
+
+def cached_database(n_expenses, seed=42, end=None, n_users=1, data_dir=None):
+    """Path to a generated database, building it only if it does not exist yet"""
+    end = end or date.today().isoformat()
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'smartspend-bench')
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"smartspend_{n_expenses}_{seed}_{n_users}u_{end}.db")
+    if not os.path.exists(path):
+        build_database(path, n_expenses, seed, end, n_users)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, default=100_000, help="Expense rows (e.g. 10k, 1m)")
+    parser.add_argument('--output', required=True, help="Database file to create (replaced if present)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end', help="Last date of generated history (YYYY-MM-DD, default today)")
+    parser.add_argument('--users', type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(build_database(args.output, args.rows, args.seed, args.end, args.users), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Maintenance commands for the SmartSpend database.
+
+    python manage.py migrate [--status] [--target N]
+    python manage.py rollup verify
+    python manage.py rollup rebuild
+    python manage.py snapshot refresh|rebuild|compact|status
+"""
+import argparse
+import sys
+
+from utils.data_handler import init_db, rebuild_rollup, verify_rollup
+from utils.migrations import BACKFILL_BATCH_SIZE, LATEST_VERSION, migrate as apply_migrations, pending_migrations
+from utils.snapshot import get_snapshot
+
+
+def migrate(args):
+    pending = pending_migrations()
+    if args.status:
+        print(f"Schema version {LATEST_VERSION - len(pending)} of {LATEST_VERSION}")
+        for migration in pending:
+            print(f"  pending {migration.version}: {migration.name}")
+        return 0
+    if not pending:
+        print(f"Schema is up to date (version {LATEST_VERSION})")
+        return 0
+    version = apply_migrations(target=args.target, batch_size=args.batch_size, verbose=True)
+    print(f"Schema is now at version {version}")
+    return 0
+
+
+def rollup(args):
+    init_db()
+    if args.action == 'rebuild':
+        count = rebuild_rollup()
+        print(f"Rebuilt monthly_category_rollup: {count} rows")
+        return 0
+
+    mismatches = verify_rollup()
+    if not mismatches:
+        print("monthly_category_rollup matches the expenses table")
+        return 0
+    print(f"{len(mismatches)} mismatched rollup rows:")
+    for row in mismatches:
+        print(f"  user {row['user_id']} {row['month']} {row['category']}: expected {row['expected_total']} "
+              f"({row['expected_count']} rows), rollup has {row['rollup_total']} ({row['rollup_count']} rows)")
+    return 1
+
+
+def snapshot(args):
+    init_db()
+    try:
+        store = get_snapshot()
+    except RuntimeError as e:
+        print(e)
+        return 1
+
+    if args.action == 'status':
+        manifest = store.manifest()
+        print(f"Snapshot in {store.directory}: {manifest['rows']} rows up to expense id {manifest['max_id']} "
+              f"in {len(manifest['segments'])} segments (updated {manifest.get('updated_at', 'never')})")
+        return 0
+
+    if args.action == 'compact':
+        manifest = store.compact()
+        if manifest is None:
+            return 1
+        print(f"Snapshot has {manifest['rows']} rows in {len(manifest['segments'])} segments")
+        return 0
+
+    # Run from cron, so this is where segments get merged; the app only appends
+    result = store.rebuild() if args.action == 'rebuild' else store.refresh(compact=True)
+    if result is None:
+        return 1
+    action = "Rebuilt" if result['rebuilt'] else "Appended"
+    compacted = " (compacted)" if result['compacted'] else ""
+    print(f"{action} {result['appended']} rows; snapshot has {result['rows']} rows in {result['segments']} segments{compacted}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SmartSpend maintenance commands")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser('migrate', help="Apply pending schema migrations")
+    migrate_parser.add_argument('--status', action='store_true', help="List pending migrations without applying them")
+    migrate_parser.add_argument('--target', type=int, help="Stop after this schema version")
+    migrate_parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help="Rows per backfill transaction")
+    migrate_parser.set_defaults(func=migrate)
+
+    rollup_parser = commands.add_parser('rollup', help="Verify or rebuild the monthly category rollup")
+    rollup_parser.add_argument('action', choices=['verify', 'rebuild'])
+    rollup_parser.set_defaults(func=rollup)
+
+    snapshot_parser = commands.add_parser('snapshot', help="Refresh, rebuild or compact the columnar analytics snapshot")
+    snapshot_parser.add_argument('action', choices=['refresh', 'rebuild', 'compact', 'status'])
+    snapshot_parser.set_defaults(func=snapshot)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The app imports its modules as utils.*, relative to the project directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import data_handler, migrations, services  # noqa: E402
+from utils.cache import clear_read_cache  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A database migrated by migrations.migrate() in a temporary directory, used by data_handler"""
+    path = str(tmp_path / 'expense_tracker.db')
+    monkeypatch.setattr(data_handler, 'DATABASE_NAME', path)
+    migrations.migrate(path)
+    clear_read_cache()
+    services.clear_results()
+    yield path
+    data_handler.get_pool().close()
+    clear_read_cache()
+    services.clear_results()
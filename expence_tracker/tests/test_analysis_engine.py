@@ -0,0 +1,28 @@
+from datetime import date
+
+import numpy as np
+
+from utils.analysis_engine import compute_metrics
+
+
+def test_current_month_change_compares_the_daily_pace():
+    # 300 spent by the 10th of a 30-day month is on pace for 900, 10% under September's 1000
+    metrics = compute_metrics([1000.0, 300.0], ['Travel', 'Travel'], dates=['2026-09-15', '2026-11-05'],
+                              today=date(2026, 11, 10))
+
+    assert metrics.months == ['2026-09', '2026-10', '2026-11']
+    assert metrics.monthly_totals.tolist() == [1000.0, 0.0, 300.0]
+    assert metrics.last_month_elapsed == 10 / 30
+    assert np.isnan(metrics.mom_change[2])
+
+    metrics = compute_metrics([1000.0, 300.0], ['Travel', 'Travel'], dates=['2026-10-15', '2026-11-05'],
+                              today=date(2026, 11, 10))
+    assert round(float(metrics.mom_change[-1]), 6) == -10.0
+
+
+def test_past_months_change_compares_totals():
+    metrics = compute_metrics([1000.0, 300.0], ['Travel', 'Travel'], dates=['2026-09-15', '2026-10-05'],
+                              today=date(2026, 11, 10))
+
+    assert metrics.last_month_elapsed == 1.0
+    assert round(float(metrics.mom_change[-1]), 6) == -70.0
@@ -0,0 +1,54 @@
+import numpy as np
+
+from utils import cache
+from utils.cache import cache_stats, cached_read, clear_read_cache
+
+
+def test_callers_get_their_own_copy(database):
+    calls = []
+
+    @cached_read
+    def read_rows():
+        calls.append(1)
+        return [{'category': 'Travel', 'total': 10.0}], {'amount': np.array([1.0, 2.0])}
+
+    rows, columns = read_rows()
+    rows[0]['total'] = 99.0
+    rows.append({})
+    columns['amount'][0] = 99.0
+
+    rows, columns = read_rows()
+    assert rows == [{'category': 'Travel', 'total': 10.0}]
+    assert columns['amount'].tolist() == [1.0, 2.0]
+    assert len(calls) == 1
+
+
+def test_expenses_are_copied(database):
+    from utils import data_handler
+    data_handler.add_expense({'amount': 5.0, 'category': 'Travel', 'date': '2026-01-02', 'description': ''})
+
+    [expense] = data_handler.get_expenses()
+    expense.amount = 0.0
+    [expense] = data_handler.get_expenses()
+    assert expense.amount == 5.0
+    assert cache_stats()['hits'] == 1
+
+
+def test_results_over_the_row_budget_are_not_cached(database, monkeypatch):
+    monkeypatch.setattr(cache, 'MAX_CACHED_ROWS', 10)
+    clear_read_cache()
+
+    @cached_read
+    def read_many(n):
+        return list(range(n))
+
+    read_many(11)
+    read_many(11)
+    assert cache_stats()['misses'] == 2 and cache_stats()['size'] == 0
+
+    read_many(6)
+    read_many(4)
+    assert cache_stats()['rows'] == 10
+    # Storing another read evicts the least recently used one to stay in budget
+    read_many(3)
+    assert cache_stats()['size'] == 2 and cache_stats()['rows'] == 7
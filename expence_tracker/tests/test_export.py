@@ -0,0 +1,50 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+from utils import data_handler
+
+
+@pytest.fixture
+def expenses(database):
+    data_handler.add_expense({'amount': 12.5, 'category': 'Travel', 'date': '2026-03-01', 'description': 'Bus'})
+    data_handler.add_expense({'amount': 40.0, 'category': 'Food & Dining', 'date': '2026-03-02', 'description': ''})
+    return database
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_export_leaves_the_output_open(expenses, compress):
+    output = io.BytesIO()
+
+    assert data_handler.export_expenses_csv(output, compress=compress) == 2
+    assert not output.closed
+    data = gzip.decompress(output.getvalue()) if compress else output.getvalue()
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8'))))
+    assert rows[0] == list(data_handler.EXPORT_COLUMNS)
+    assert [row[2] for row in rows[1:]] == ['Food & Dining', 'Travel']
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_failed_export_returns_none_and_leaves_the_output_open(expenses, monkeypatch, compress):
+    def broken_connection():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(data_handler, 'db_connection', broken_connection)
+    output = io.BytesIO()
+
+    assert data_handler.export_expenses_csv(output, compress=compress) is None
+    assert not output.closed
+    output.getvalue()
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_export_failing_part_way_leaves_the_output_open(compress):
+    def batches():
+        yield [(1, 5.0, 'Travel', '2026-03-01', '', '', '')]
+        raise RuntimeError("connection reset")
+    output = io.BytesIO()
+
+    with pytest.raises(RuntimeError):
+        data_handler.write_export_csv(output, batches(), compress)
+    assert not output.closed
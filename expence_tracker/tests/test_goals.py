@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from utils import data_handler
+from utils.storage import SQLiteBackend
+from utils.write_queue import WriteBehindQueue
+
+THREADS = 8
+CONTRIBUTIONS = 50
+
+
+@pytest.fixture
+def goal_id(database):
+    assert data_handler.add_goal({'name': 'Trip', 'target_amount': 1000.0, 'current_amount': 0.0,
+                                  'deadline': '2026-12-31'})
+    [goal] = data_handler.get_goals()
+    return goal.id
+
+
+def contribute_concurrently(add_to_goal, goal_id):
+    """Add 1 to the goal THREADS x CONTRIBUTIONS times from THREADS threads at once, returning the results"""
+    results = []
+    start = threading.Barrier(THREADS, timeout=30)
+
+    def contribute():
+        start.wait()
+        for _ in range(CONTRIBUTIONS):
+            results.append(add_to_goal(goal_id, 1.0))
+
+    threads = [threading.Thread(target=contribute) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not any(thread.is_alive() for thread in threads)
+    return results
+
+
+def test_concurrent_contributions_all_apply(goal_id):
+    results = contribute_concurrently(data_handler.add_to_goal, goal_id)
+
+    assert None not in results
+    [goal] = data_handler.get_goals()
+    assert goal.current_amount == THREADS * CONTRIBUTIONS
+    # Every contribution saw a different total, so none read a stale amount
+    assert sorted(result['current_amount'] for result in results) == list(range(1, THREADS * CONTRIBUTIONS + 1))
+
+
+def test_concurrent_contributions_through_the_write_queue_all_apply(goal_id):
+    write_queue = WriteBehindQueue()
+    storage = SQLiteBackend(write_queue=write_queue)
+    try:
+        results = contribute_concurrently(storage.add_to_goal, goal_id)
+        assert storage.add_to_goal(goal_id + 1, 1.0) is None
+    finally:
+        write_queue.close()
+
+    assert None not in results
+    [goal] = data_handler.get_goals()
+    assert goal.current_amount == THREADS * CONTRIBUTIONS
+
+
+def test_reaching_the_target_marks_the_goal_achieved(goal_id):
+    assert data_handler.add_to_goal(goal_id, 999.0)['status'] == 'active'
+    assert data_handler.add_to_goal(goal_id, 1.0)['status'] == 'achieved'
+
+
+def test_unknown_goal_returns_none(goal_id):
+    assert data_handler.add_to_goal(goal_id + 1, 10.0) is None
+    # Another user's goal is unknown to this one
+    assert data_handler.add_to_goal(goal_id, 10.0, user_id=2) is None
+    [goal] = data_handler.get_goals()
+    assert goal.current_amount == 0.0
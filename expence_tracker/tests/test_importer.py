@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from utils import data_handler
+from utils.importer import import_csv, import_statement
+
+STATEMENT = "Date,Description,Amount\n2026-03-01,Coffee,-4.50\n2026-03-02,Salary,3000\n2026-03-03,Groceries,(52.10)\n"
+
+
+def imported(user_id=1):
+    return sorted((expense.description, expense.amount) for expense in data_handler.get_expenses(user_id=user_id))
+
+
+def test_negative_amounts_are_spending_by_default(database):
+    report = import_csv(io.StringIO(STATEMENT))
+
+    assert report.error is None
+    assert report.imported == 2
+    assert report.errors == [(3, "credit transaction, not an expense")]
+    assert imported() == [('Coffee', 4.5), ('Groceries', 52.1)]
+
+
+def test_positive_amounts_are_spending_when_debits_are_not_negative(database):
+    report = import_csv(io.StringIO(STATEMENT), debits_negative=False)
+
+    assert report.imported == 1
+    assert [line for line, _ in report.errors] == [2, 4]
+    assert imported() == [('Salary', 3000.0)]
+
+
+@pytest.mark.parametrize('debits_negative', [True, False])
+def test_cr_and_dr_suffixes_decide_on_their_own(database, debits_negative):
+    statement = "Date,Description,Amount\n2026-03-01,Rent,1200 Dr\n2026-03-02,Refund,15 Cr\n"
+    report = import_csv(io.StringIO(statement), debits_negative=debits_negative)
+
+    assert report.imported == 1 and report.rejected == 1
+    assert imported() == [('Rent', 1200.0)]
+
+
+def test_missing_amounts_are_reported_as_missing(database):
+    report = import_csv(io.StringIO("Date,Amount\n2026-03-01,\n"))
+
+    assert report.errors == [(2, "missing amount")]
+
+
+def test_ofx_ignores_the_csv_sign_option(database):
+    statement = (
+        "<OFX><STMTTRN><TRNAMT>-20.00<DTPOSTED>20260301<NAME>Taxi</STMTTRN>"
+        "<STMTTRN><TRNAMT>500.00<DTPOSTED>20260302<NAME>Deposit</STMTTRN></OFX>\n"
+    )
+    report = import_statement(io.StringIO(statement), filename='march.ofx', debits_negative=False)
+
+    assert report.imported == 1
+    assert imported() == [('Taxi', 20.0)]
@@ -0,0 +1,144 @@
+import sqlite3
+
+import pytest
+
+from utils import data_handler, migrations
+from utils.cache import clear_read_cache
+
+
+def connect(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def tags_of(conn, expense_id):
+    return sorted(row['tag'] for row in conn.execute('SELECT tag FROM expense_tags WHERE expense_id = ?', (expense_id,)))
+
+
+@pytest.mark.parametrize('tags, expected', [
+    ('work, trip', ['trip', 'work']),
+    ('late\nnight,work', ['late\nnight', 'work']),
+    ('say "hi",back\\slash , \ttabbed\r\n', ['back\\slash', 'say "hi"', 'tabbed']),
+    (' , ,', []),
+])
+def test_tag_triggers_keep_every_tag(database, tags, expected):
+    conn = connect(database)
+    expense_id = conn.execute("INSERT INTO expenses (amount, category, date, tags) VALUES (10, 'Travel', '2026-03-01', ?)",
+                              (tags,)).lastrowid
+    assert tags_of(conn, expense_id) == expected
+
+    conn.execute("UPDATE expenses SET tags = 'other,' || tags WHERE id = ?", (expense_id,))
+    assert tags_of(conn, expense_id) == sorted(expected + ['other'])
+
+
+def test_tag_totals_and_filter_agree_with_expense_tags(database):
+    data_handler.add_expense({'amount': 40.0, 'category': 'Travel', 'date': '2026-03-01', 'tags': 'late\nnight,work'})
+    data_handler.add_expense({'amount': 10.0, 'category': 'Travel', 'date': '2026-03-02', 'tags': 'work'})
+
+    assert data_handler.totals_by_tag() == {'work': 50.0, 'late\nnight': 40.0}
+    page, _ = data_handler.list_expenses(filters={'tag': 'late\nnight'})
+    assert [expense.amount for expense in page] == [40.0]
+
+
+def test_tag_split_migration_restores_dropped_tags(tmp_path, monkeypatch):
+    path = str(tmp_path / 'expense_tracker.db')
+    monkeypatch.setattr(data_handler, 'DATABASE_NAME', path)
+    assert migrations.migrate(path, target=5) == 5
+    conn = connect(path)
+    conn.execute("INSERT INTO expenses (amount, category, date, tags) VALUES (10, 'Travel', '2026-03-01', 'a\nb,c')")
+    # What the JSON round trip used to leave behind for such a row
+    conn.execute('DELETE FROM expense_tags')
+
+    assert migrations.migrate(path) == migrations.LATEST_VERSION
+    assert tags_of(conn, 1) == ['a\nb', 'c']
+    conn.close()
+    data_handler.get_pool().close()
+    clear_read_cache()
+
+
+@pytest.fixture
+def old_database(tmp_path, monkeypatch):
+    """A database at schema version 2 (before the rollup) holding 20 expenses"""
+    path = str(tmp_path / 'expense_tracker.db')
+    monkeypatch.setattr(data_handler, 'DATABASE_NAME', path)
+    assert migrations.migrate(path, target=2) == 2
+    conn = connect(path)
+    for i in range(20):
+        conn.execute("INSERT INTO expenses (amount, category, date, tags) VALUES (?, ?, ?, ?)",
+                     (10.0 + i, ('Travel', 'Food & Dining')[i % 2], f"2026-0{1 + i % 3}-{1 + i:02d}", 'work,trip'))
+    conn.close()
+    yield path
+    data_handler.get_pool().close()
+    clear_read_cache()
+
+
+def during_backfill(monkeypatch, hook):
+    """Call hook(conn, done_through, high_water) before each rollup backfill transaction"""
+    transaction = migrations._transaction
+
+    def hooked(conn):
+        row = conn.execute('SELECT done_through, high_water FROM backfill_progress WHERE name = ?',
+                           (migrations.ROLLUP_BACKFILL,)).fetchone() if has_progress_table(conn) else None
+        if row is not None:
+            hook(conn, row['done_through'], row['high_water'])
+        return transaction(conn)
+
+    monkeypatch.setattr(migrations, '_transaction', hooked)
+
+
+def has_progress_table(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'backfill_progress'").fetchone() is not None
+
+
+def test_migrating_an_old_database_fills_the_rollup_and_tags(old_database):
+    assert migrations.migrate(old_database, batch_size=3) == migrations.LATEST_VERSION
+
+    assert migrations.pending_migrations(old_database) == []
+    assert data_handler.verify_rollup() == []
+    conn = connect(old_database)
+    assert conn.execute('SELECT COUNT(*) FROM expense_tags').fetchone()[0] == 40
+    assert conn.execute('SELECT COUNT(*) FROM backfill_progress').fetchone()[0] == 0
+    # Nothing is left to do, so running again changes nothing
+    assert migrations.migrate(old_database) == migrations.LATEST_VERSION
+    assert data_handler.verify_rollup() == []
+
+
+def test_an_interrupted_backfill_completes_when_run_again(old_database, monkeypatch):
+    def interrupt(conn, done_through, high_water):
+        if done_through >= 8:
+            raise KeyboardInterrupt
+    during_backfill(monkeypatch, interrupt)
+
+    with pytest.raises(KeyboardInterrupt):
+        migrations.migrate(old_database, batch_size=4)
+    conn = connect(old_database)
+    assert migrations.schema_version(conn) == 2
+    conn.close()
+
+    monkeypatch.undo()
+    monkeypatch.setattr(data_handler, 'DATABASE_NAME', old_database)
+    assert migrations.migrate(old_database, batch_size=4) == migrations.LATEST_VERSION
+    assert data_handler.verify_rollup() == []
+
+
+def test_writes_during_the_backfill_are_counted_once(old_database, monkeypatch):
+    seen = set()
+
+    def write(conn, done_through, high_water):
+        version = migrations.schema_version(conn)
+        if done_through == 0 or version in seen:
+            return
+        seen.add(version)
+        # A row the backfill has read, two it has not, and a new one
+        conn.execute("UPDATE expenses SET category = 'Shopping', amount = amount + 1 WHERE id = ?", (done_through,))
+        conn.execute("UPDATE expenses SET amount = amount + 100, date = '2026-04-01' WHERE id = ?", (high_water,))
+        conn.execute('DELETE FROM expenses WHERE id = ?', (high_water - 1,))
+        conn.execute("INSERT INTO expenses (amount, category, date) VALUES (5, 'Travel', '2026-01-15')")
+    during_backfill(monkeypatch, write)
+
+    assert migrations.migrate(old_database, batch_size=4) == migrations.LATEST_VERSION
+
+    # Once while adding the rollup (migration 3), once while rebuilding it per user (migration 5)
+    assert seen == {2, 4}
+    assert data_handler.verify_rollup() == []
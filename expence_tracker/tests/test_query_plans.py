@@ -0,0 +1,121 @@
+import random
+import re
+from datetime import date, timedelta
+
+import pytest
+
+from utils import data_handler, services
+from utils.storage import SQLiteBackend
+
+USER_DATE_INDEX = 'idx_expenses_user_date'
+USER_CATEGORY_DATE_INDEX = 'idx_expenses_user_category_date'
+
+
+@pytest.fixture
+def statements(database, monkeypatch):
+    """Every SQL statement run on data_handler's connections, with parameters filled in"""
+    executed = []
+    connect = data_handler.get_db_connection
+
+    def get_db_connection(path=None):
+        conn = connect(path)
+        conn.set_trace_callback(executed.append)
+        return conn
+    monkeypatch.setattr(data_handler, 'get_db_connection', get_db_connection)
+
+    rng = random.Random(7)
+    today = date.today()
+    data_handler.add_expenses_bulk({
+        'amount': rng.randint(50, 5000),
+        'category': rng.choice(["Food & Dining", "Transportation", "Shopping", "Travel"]),
+        'date': (today - timedelta(days=rng.randint(0, 800))).isoformat(),
+        'tags': rng.choice(['', 'Essential', 'Work,Recurring']),
+    } for _ in range(500))
+    executed.clear()
+    return executed
+
+
+def plan(statement):
+    """EXPLAIN QUERY PLAN detail lines for one statement"""
+    conn = data_handler.get_db_connection()
+    try:
+        return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}')]
+    finally:
+        conn.close()
+
+
+def expense_reads(statements):
+    """Distinct SELECTs that read the expenses table"""
+    reads = {}
+    for statement in statements:
+        text = ' '.join(statement.split())
+        if text.upper().startswith('SELECT') and re.search(r'\bFROM expenses\b', text):
+            reads.setdefault(text, statement)
+    return list(reads.values())
+
+
+def indexes_used(details):
+    return {match.group(1) for detail in details
+            for match in [re.search(r'\bexpenses USING (?:COVERING )?INDEX (\w+)', detail)] if match}
+
+
+def scans(details):
+    """Full passes over the table or one of its indexes"""
+    return [detail for detail in details if re.match(r'SCAN (TABLE )?expenses\b', detail)]
+
+
+def temp_btrees(details):
+    return {detail.split(' FOR ', 1)[1] for detail in details if 'USE TEMP B-TREE' in detail}
+
+
+def test_dashboard_and_insights_search_the_user_indexes(statements):
+    storage = SQLiteBackend()
+    services.sidebar_stats(storage)
+    services.dashboard_snapshot(storage)
+    for period in services.PERIODS:
+        for chart_type in services.CHART_TYPES:
+            services.insights(storage, period, chart_type)
+
+    reads = expense_reads(statements)
+    assert reads
+    for statement in reads:
+        details = plan(statement)
+        assert not scans(details), (statement, details)
+        assert indexes_used(details) & {USER_DATE_INDEX, USER_CATEGORY_DATE_INDEX}, (statement, details)
+
+
+# (read, index it must search, orderings it may sort in a temp B-tree)
+# Only grouped aggregates sort: their groups follow category or a computed
+# bucket, not the (user_id, date) index order, and the sort is over the
+# rows in range rather than the table. Row reads and daily series come
+# straight out of the index in order.
+QUERIES = [
+    ('get_expenses(month)', lambda: data_handler.get_expenses(date.today().strftime('%Y-%m')),
+     USER_DATE_INDEX, set()),
+    ('list_expenses', lambda: data_handler.list_expenses(limit=20), USER_DATE_INDEX, set()),
+    ('list_expenses(category)', lambda: data_handler.list_expenses(limit=20, filters={'category': 'Travel'}),
+     USER_CATEGORY_DATE_INDEX, set()),
+    ('total_expenses(30 days)', lambda: data_handler.total_expenses((date.today() - timedelta(days=30)).isoformat()),
+     USER_DATE_INDEX, set()),
+    ('totals_by_bucket(day)', lambda: data_handler.totals_by_bucket('day', (date.today() - timedelta(days=90)).isoformat()),
+     USER_DATE_INDEX, set()),
+    ('expense_stats(90 days)', lambda: data_handler.expense_stats((date.today() - timedelta(days=90)).isoformat()),
+     USER_DATE_INDEX, {'count(DISTINCT)'}),
+    ('sum_by_category(30 days)', lambda: data_handler.sum_by_category((date.today() - timedelta(days=30)).isoformat()),
+     USER_DATE_INDEX, {'GROUP BY', 'ORDER BY'}),
+    ('compare_category_periods(30 days)',
+     lambda: data_handler.compare_category_periods((date.today() - timedelta(days=30)).isoformat()),
+     USER_DATE_INDEX, {'GROUP BY', 'ORDER BY'}),
+]
+
+
+@pytest.mark.parametrize('read, index, allowed_sorts', [query[1:] for query in QUERIES],
+                         ids=[query[0] for query in QUERIES])
+def test_query_plan(statements, read, index, allowed_sorts):
+    read()
+    [statement] = expense_reads(statements)
+    details = plan(statement)
+
+    assert not scans(details), details
+    assert index in indexes_used(details), details
+    assert temp_btrees(details) <= allowed_sorts, details
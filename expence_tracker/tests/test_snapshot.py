@@ -0,0 +1,130 @@
+import os
+import sqlite3
+
+import pytest
+
+from utils import data_handler, snapshot
+
+pytest.importorskip('pyarrow')
+
+
+def add(user_id, *amounts):
+    data_handler.insert_expenses(
+        [{'amount': amount, 'category': 'Travel', 'date': '2026-03-01', 'tags': 'work'} for amount in amounts],
+        user_id=user_id
+    )
+
+
+def expense_ids(database, user_id=None):
+    conn = sqlite3.connect(database)
+    try:
+        if user_id is None:
+            rows = conn.execute('SELECT id FROM expenses ORDER BY id')
+        else:
+            rows = conn.execute('SELECT id FROM expenses WHERE user_id = ? ORDER BY id', (user_id,))
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def store(database, tmp_path):
+    conn = sqlite3.connect(database)
+    conn.execute("INSERT OR IGNORE INTO users (id, name) VALUES (2, 'Second')")
+    conn.commit()
+    conn.close()
+    return snapshot.SnapshotStore(database, str(tmp_path / 'snapshot'))
+
+
+def loaded_ids(store, user_id=None):
+    return sorted(store.load(user_id)['id'].to_pylist())
+
+
+def test_refresh_appends_new_rows_as_a_segment(store, database):
+    add(1, 10.0, 20.0)
+    add(2, 5.0)
+    assert store.refresh()['appended'] == 3
+
+    add(2, 7.0)
+    add(1, 30.0)
+    result = store.refresh()
+
+    assert result['appended'] == 2 and not result['rebuilt']
+    assert result['segments'] == 2 and result['rows'] == 5
+    assert loaded_ids(store) == expense_ids(database)
+    assert store.load(1)['amount'].to_pylist() == [10.0, 20.0, 30.0]
+    assert store.load(2)['amount'].to_pylist() == [5.0, 7.0]
+    assert store.refresh()['appended'] == 0
+
+
+def test_segments_record_each_users_rows(store, database):
+    add(1, 1.0)
+    add(2, 2.0, 3.0)
+    add(1, 4.0)
+    store.refresh()
+
+    segment, = store.manifest()['segments']
+    assert segment['users'] == {'1': [0, 2], '2': [2, 2]}
+    assert loaded_ids(store, 2) == expense_ids(database, 2)
+    assert store.load(3).num_rows == 0
+
+
+def test_refresh_rebuilds_after_a_delete(store, database):
+    add(1, 10.0, 20.0)
+    add(2, 5.0)
+    store.refresh()
+    add(1, 30.0)
+    store.refresh()
+    deleted = expense_ids(database, 1)[0]
+    conn = sqlite3.connect(database)
+    conn.execute('DELETE FROM expenses WHERE id = ?', (deleted,))
+    conn.commit()
+    conn.close()
+
+    result = store.refresh()
+
+    assert result['rebuilt'] and result['segments'] == 1 and result['rows'] == 3
+    assert deleted not in loaded_ids(store)
+    assert loaded_ids(store, 1) == expense_ids(database, 1)
+    assert sorted(os.listdir(store.directory)) == sorted(
+        [segment['file'] for segment in store.manifest()['segments']] + [snapshot.MANIFEST_NAME, snapshot.LOCK_NAME]
+    )
+
+
+def test_compact_merges_segments_by_user(store, database):
+    for amount in (1.0, 2.0, 3.0):
+        add(1, amount)
+        add(2, amount * 10)
+        store.refresh()
+    assert len(store.manifest()['segments']) == 3
+
+    manifest = store.compact()
+
+    segment, = manifest['segments']
+    assert segment['users'] == {'1': [0, 3], '2': [3, 3]}
+    assert manifest['rows'] == 6
+    assert store.load(1)['amount'].to_pylist() == [1.0, 2.0, 3.0]
+    assert store.load(2)['amount'].to_pylist() == [10.0, 20.0, 30.0]
+    assert [name for name in os.listdir(store.directory) if name.endswith('.arrow')] == [segment['file']]
+
+
+def test_refresh_compacts_past_max_segments(store, monkeypatch):
+    monkeypatch.setattr(snapshot, 'MAX_SEGMENTS', 1)
+    add(1, 1.0)
+    store.refresh(compact=True)
+    add(2, 2.0)
+
+    result = store.refresh(compact=True)
+
+    assert result['compacted'] and result['segments'] == 1 and result['rows'] == 2
+    assert store.load(2)['amount'].to_pylist() == [2.0]
+
+
+def test_snapshot_reports_missing_pyarrow(monkeypatch, capsys):
+    monkeypatch.setenv(snapshot.SNAPSHOT_ENV, '1')
+    monkeypatch.setattr(snapshot, 'load_pyarrow', lambda: False)
+    monkeypatch.setattr(snapshot, '_reported_missing', False)
+
+    assert not snapshot.snapshot_enabled()
+    assert not snapshot.snapshot_enabled()
+    assert capsys.readouterr().out.count('pyarrow is not installed') == 1
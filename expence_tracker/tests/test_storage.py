@@ -0,0 +1,260 @@
+import gzip
+import io
+import os
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+from utils import data_handler, services
+from utils.cache import clear_read_cache
+from utils.importer import import_statement
+from utils.models import Expense
+from utils.storage import PostgresBackend
+
+# Point at a disposable PostgreSQL database to run the integration test
+TEST_DATABASE_URL_ENV = 'SMARTSPEND_TEST_DATABASE_URL'
+
+
+class FakeCursor:
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.description = None
+        self.pending = None
+
+    def execute(self, sql, params=()):
+        self.connection.pool.statements.append((' '.join(sql.split()), list(params)))
+        if self.connection.pool.error is not None:
+            raise self.connection.pool.error
+
+    def executemany(self, sql, params_seq):
+        self.connection.pool.batches.append((' '.join(sql.split()), list(params_seq)))
+
+    def fetchall(self):
+        return self.connection.pool.rows.pop(0) if self.connection.pool.rows else []
+
+    def fetchmany(self, size):
+        if self.pending is None:
+            self.pending = self.fetchall()
+        rows, self.pending = self.pending[:size], self.pending[size:]
+        return rows
+
+    def fetchone(self):
+        # expense_stats reads four columns, the totals one
+        return (0.0, 0, 0, None)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.closed = False
+        self.rollbacks = 0
+        self.commits = 0
+        self.cursor_names = []
+
+    def cursor(self, name=None):
+        self.cursor_names.append(name)
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    """Stands in for psycopg2's ThreadedConnectionPool, recording every statement
+
+    rows is a list of fetchall() results, handed out in order.
+    """
+
+    def __init__(self, rows=None, error=None):
+        self.rows = list(rows or [])
+        self.error = error
+        self.statements = []
+        self.batches = []
+        self.borrowed = 0
+        self.returned = []
+
+    def getconn(self):
+        self.borrowed += 1
+        return FakeConnection(self)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def sqlite_reads(monkeypatch):
+    """Record (and refuse) every use of the local SQLite database
+
+    data_handler turns query errors into default results, so tests check
+    the list rather than relying on the error.
+    """
+    reads = []
+    def get_pool():
+        reads.append(1)
+        raise RuntimeError("the SQLite database was used")
+    monkeypatch.setattr(data_handler, 'get_pool', get_pool)
+    clear_read_cache()
+    services.clear_results()
+    return reads
+
+
+def test_postgres_returns_connections_rolled_back():
+    pool = FakePool(rows=[[]])
+    PostgresBackend(pool=pool).get_expenses(user_id=3)
+
+    assert pool.borrowed == 1
+    [(conn, close)] = pool.returned
+    assert conn.rollbacks == 1 and close is False
+    sql, params = pool.statements[0]
+    assert 'WHERE user_id = %s' in sql and params == [3]
+
+
+def test_postgres_records_use_sqlite_text_dates():
+    row = (7, 120.0, 'Travel', date(2026, 3, 4), 'Bus', 'Work', datetime(2026, 3, 4, 9, 30), 1)
+    [expense] = PostgresBackend(pool=FakePool(rows=[[row]])).get_expenses()
+
+    assert isinstance(expense, Expense)
+    assert expense['date'] == '2026-03-04'
+    assert expense.created_at == '2026-03-04 09:30:00'
+
+
+def test_postgres_list_expenses_pages_by_date_and_id():
+    rows = [(i, 10.0, 'Food & Dining', date(2026, 3, 10 - i), None, None, None, 1) for i in (1, 2, 3)]
+    pool = FakePool(rows=[rows])
+    page, cursor = PostgresBackend(pool=pool).list_expenses(
+        limit=2, after_cursor='2026-03-10|9', filters={'category': 'Food & Dining', 'tag': 'Work'}
+    )
+
+    assert [expense.id for expense in page] == [1, 2]
+    assert cursor == '2026-03-08|2'
+    sql, params = pool.statements[0]
+    assert '(date, id) < (%s, %s)' in sql and 'LIMIT %s' in sql
+    assert params == [1, 'Food & Dining', 'Work', '2026-03-10', 9, 3]
+
+
+def test_postgres_errors_return_defaults():
+    pool = FakePool(error=RuntimeError("connection reset"))
+    backend = PostgresBackend(pool=pool)
+
+    assert backend.list_expenses() == ([], None)
+    assert backend.totals_by_tag() == {}
+    assert backend.rollup() == []
+    assert len(pool.returned) == 3
+
+
+def test_postgres_imports_in_batches(sqlite_reads):
+    pool = FakePool()
+    statement = "Date,Description,Amount\n" + "".join(f"2026-03-{day:02d},Shop {day},-{day}.00\n" for day in range(1, 6))
+    report = import_statement(io.StringIO(statement), filename='march.csv', batch_size=2, user_id=4,
+                              storage=PostgresBackend(pool=pool))
+
+    assert report.error is None and report.imported == 5
+    assert [len(params) for _, params in pool.batches] == [2, 2, 1]
+    sql, params = pool.batches[0]
+    assert sql.startswith('INSERT INTO expenses') and '%s' in sql
+    assert params[0] == (1.0, 'Other', '2026-03-01', 'Shop 1', '', 4)
+    [(conn, _)] = pool.returned
+    assert conn.commits == 1
+    assert sqlite_reads == []
+
+
+def test_postgres_import_failure_inserts_nothing():
+    pool = FakePool()
+    backend = PostgresBackend(pool=pool)
+
+    def rows():
+        yield {'amount': 1.0, 'category': 'Other', 'date': '2026-03-01'}
+        raise ValueError("bad file")
+
+    assert backend.add_expenses_bulk(rows()) == 0
+    [(conn, _)] = pool.returned
+    assert conn.commits == 0 and conn.rollbacks == 1
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_postgres_exports_from_a_server_side_cursor(sqlite_reads, compress):
+    rows = [(i, 10.0 * i, 'Travel', date(2026, 3, i), 'Bus', None, datetime(2026, 3, i, 8, 0)) for i in (3, 2, 1)]
+    pool = FakePool(rows=[rows])
+    output = io.BytesIO()
+
+    exported = PostgresBackend(pool=pool).export_expenses_csv(
+        output, start='2026-03-01', categories=['Travel'], compress=compress, chunk_size=2, user_id=5
+    )
+
+    assert exported == 3 and not output.closed
+    data = output.getvalue()
+    lines = (gzip.decompress(data) if compress else data).decode('utf-8').splitlines()
+    assert lines[0] == ','.join(data_handler.EXPORT_COLUMNS)
+    assert lines[1] == '3,30.0,Travel,2026-03-03,Bus,,2026-03-03 08:00:00'
+    [(conn, _)] = pool.returned
+    assert conn.cursor_names == ['export_expenses']
+    sql, params = pool.statements[0]
+    assert 'category = ANY(%s)' in sql and params == [5, '2026-03-01', ['Travel']]
+    assert sqlite_reads == []
+
+
+def test_postgres_export_errors_return_none():
+    output = io.BytesIO()
+
+    assert PostgresBackend(pool=FakePool(error=RuntimeError("connection reset"))).export_expenses_csv(output) is None
+    assert not output.closed
+
+
+def test_services_read_only_through_the_backend(sqlite_reads):
+    pool = FakePool()
+    backend = PostgresBackend(pool=pool)
+
+    services.sidebar_stats(backend)
+    services.dashboard_snapshot(backend)
+    for chart_type in services.CHART_TYPES:
+        services.insights(backend, "Last 30 days", chart_type)
+    services.analysis_inputs(backend)
+    services.analysis_metrics(backend)
+
+    assert sqlite_reads == []
+    assert pool.statements
+    assert pool.borrowed == len(pool.returned)
+
+
+@pytest.mark.skipif(not os.getenv(TEST_DATABASE_URL_ENV), reason=f"{TEST_DATABASE_URL_ENV} is not set")
+def test_postgres_backend_against_a_server():
+    backend = PostgresBackend(os.getenv(TEST_DATABASE_URL_ENV))
+    try:
+        backend.init_schema()
+        # A new user per run keeps the test's rows apart from everything else
+        user_id = backend.add_user(f"test-{uuid.uuid4().hex}")
+        for day, amount, category, tags in (('2026-01-05', 100.0, 'Travel', 'Work, Trip'),
+                                            ('2026-01-20', 50.0, 'Food & Dining', 'Work'),
+                                            ('2026-02-02', 25.0, 'Travel', '')):
+            assert backend.add_expense({'amount': amount, 'category': category, 'date': day,
+                                        'description': '', 'tags': tags}, user_id=user_id)
+        assert backend.add_saving({'amount': 500.0, 'date': '2026-01-31'}, user_id=user_id)
+        assert backend.add_expenses_bulk([{'amount': 5.0, 'category': 'Other', 'date': '2025-12-31'}],
+                                         user_id=user_id) == 1
+
+        page, cursor = backend.list_expenses(limit=2, user_id=user_id)
+        assert [expense.date for expense in page] == ['2026-02-02', '2026-01-20']
+        rest, cursor = backend.list_expenses(limit=3, after_cursor=cursor, user_id=user_id)
+        assert [expense.date for expense in rest] == ['2026-01-05', '2025-12-31'] and cursor is None
+        assert [e.amount for e in backend.list_expenses(filters={'tag': 'Trip'}, user_id=user_id)[0]] == [100.0]
+
+        assert backend.totals_by_tag(user_id=user_id) == {'Work': 150.0, 'Trip': 100.0}
+        assert backend.get_tags(user_id=user_id) == ['Trip', 'Work']
+        assert backend.savings_by_month(user_id=user_id) == [('2026-01', 500.0)]
+        output = io.BytesIO()
+        assert backend.export_expenses_csv(output, start='2026-01-01', categories=['Travel'], user_id=user_id) == 2
+        assert output.getvalue().decode('utf-8').splitlines()[1].split(',')[3] == '2026-02-02'
+        assert [(row['month'], row['category'], row['total']) for row in backend.rollup(user_id=user_id)] == [
+            ('2025-12', 'Other', 5.0), ('2026-01', 'Food & Dining', 50.0),
+            ('2026-01', 'Travel', 100.0), ('2026-02', 'Travel', 25.0)
+        ]
+    finally:
+        backend.close()
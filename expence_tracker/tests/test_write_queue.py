@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from utils.write_queue import WriteBehindQueue
+
+# Seconds any step may take before the test fails instead of hanging
+TIMEOUT = 10
+
+
+def test_close_resolves_every_accepted_write(database):
+    write_queue = WriteBehindQueue()
+    handles = []
+    enough = threading.Event()
+    closed = threading.Event()
+
+    def submit_until_closed():
+        while True:
+            try:
+                handles.append(write_queue.submit(lambda cursor: cursor.execute('SELECT 1')))
+            except RuntimeError:
+                closed.set()
+                return
+            if len(handles) >= 200:
+                enough.set()
+
+    submitters = [threading.Thread(target=submit_until_closed, daemon=True) for _ in range(4)]
+    for thread in submitters:
+        thread.start()
+    assert enough.wait(TIMEOUT)
+    write_queue.close()
+    for thread in submitters:
+        thread.join(TIMEOUT)
+
+    assert not any(thread.is_alive() for thread in submitters)
+    assert closed.is_set()
+    assert all(handle.done() for handle in handles)
+    assert write_queue.stats['writes'] == len(handles)
+
+
+def test_close_with_a_full_queue_still_commits_it(database):
+    started, release = threading.Event(), threading.Event()
+
+    def hold(cursor):
+        started.set()
+        release.wait(TIMEOUT)
+
+    write_queue = WriteBehindQueue(max_pending=1)
+    blocked = write_queue.submit(hold)
+    # Once the writer holds the first write, this one fills the queue
+    assert started.wait(TIMEOUT)
+    queued = write_queue.submit(lambda cursor: cursor.execute('SELECT 1'), timeout=TIMEOUT)
+
+    write_queue.close(timeout=0.1)
+    release.set()
+
+    assert blocked.wait(TIMEOUT) and queued.wait(TIMEOUT)
+    write_queue._thread.join(TIMEOUT)
+    assert not write_queue._thread.is_alive()
+    with pytest.raises(RuntimeError):
+        write_queue.submit(lambda cursor: None)
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_writes_queued_when_the_writer_dies_fail(database):
+    started, release = threading.Event(), threading.Event()
+
+    class CrashingQueue(WriteBehindQueue):
+        def _commit(self, batch):
+            started.set()
+            release.wait(TIMEOUT)
+            raise RuntimeError("writer crashed")
+
+    write_queue = CrashingQueue()
+    write_queue.submit(lambda cursor: None)
+    assert started.wait(TIMEOUT)
+    queued = write_queue.submit(lambda cursor: None)
+    release.set()
+
+    assert queued.wait(TIMEOUT) is False and queued.done()
+    assert 'stopped before the write was committed' in str(queued.error)
+    # Let the writer finish dying inside this test, where its exception is expected
+    write_queue._thread.join(TIMEOUT)
+    with pytest.raises(RuntimeError):
+        write_queue.submit(lambda cursor: None)
@@ -1,43 +1,75 @@
 import os
 import json
-import requests
+import hashlib
+import math
 import random
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from utils.analysis_engine import FinanceMetrics, ROLLING_WINDOW
+from utils.cache import LRUCache
+from utils.instrumentation import instrumented
+
+# Analysis cache bounds
+ANALYSIS_CACHE_SIZE = 128
+ANALYSIS_CACHE_TTL = 3600  # seconds
+
+# Length of the recent period the category changes section compares
+CATEGORY_CHANGE_DAYS = 30
+
 class SmartFinanceAI:
     """Smart financial AI advisor that analyzes your spending patterns"""
     
-    def __init__(self):
-        self.analysis_cache = {}
+    def __init__(self, cache_size: int = ANALYSIS_CACHE_SIZE, cache_ttl: float = ANALYSIS_CACHE_TTL):
+        self.analysis_cache = LRUCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+    
+    @staticmethod
+    def _cache_key(metrics: FinanceMetrics, goals: List, analysis_type: str) -> str:
+        """Deterministic digest of every analysis input"""
+        payload = json.dumps(
+            [metrics.fingerprint(), goals, analysis_type],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
         
     def analyze_finances(self, expense_data: Dict, total_expenses: float, 
-                        savings: float, goals: List, analysis_type: str) -> str:
+                        savings: float, goals: List, analysis_type: str,
+                        metrics: Optional[FinanceMetrics] = None) -> str:
         """
         Analyze finances and provide smart recommendations
+        
+        Pass metrics from analysis_engine.compute_metrics to include monthly
+        trends and tags; otherwise they are derived from the category totals.
         """
-        # Create a unique cache key
-        cache_key = f"{hash(str(expense_data))}_{total_expenses}_{savings}_{analysis_type}"
+        if metrics is None:
+            metrics = FinanceMetrics.from_summary(expense_data, total_expenses, savings)
+        
+        # Key on the content of all inputs, goals included
+        cache_key = self._cache_key(metrics, goals, analysis_type)
         
-        if cache_key in self.analysis_cache:
-            return self.analysis_cache[cache_key]
+        analysis = self.analysis_cache.get(cache_key)
+        if analysis is not None:
+            return analysis
         
         # Generate comprehensive analysis
-        analysis = self._generate_analysis(expense_data, total_expenses, savings, goals, analysis_type)
+        analysis = self._generate_analysis(metrics, goals, analysis_type)
         
         # Cache the analysis
-        self.analysis_cache[cache_key] = analysis
+        self.analysis_cache.set(cache_key, analysis)
         return analysis
     
-    def _generate_analysis(self, expense_data: Dict, total_expenses: float,
-                          savings: float, goals: List, analysis_type: str) -> str:
+    def cache_stats(self) -> Dict:
+        """Hit/miss/eviction statistics for the analysis cache"""
+        return self.analysis_cache.stats()
+    
+    def _generate_analysis(self, metrics: FinanceMetrics, goals: List, analysis_type: str) -> str:
         """Generate intelligent financial analysis"""
         
         # Start building the analysis
         analysis = "## 🧠 Smart Financial Analysis\n\n"
         
         # Calculate key metrics
-        savings_rate = (savings / total_expenses * 100) if total_expenses > 0 else 0
+        savings_rate = metrics.savings_rate
         
         # 1. Overall Financial Health
         analysis += "### 📊 Your Financial Health\n"
@@ -50,20 +82,15 @@ class SmartFinanceAI:
             analysis += "📈 **Room for improvement.** Try to save at least 10% of your expenses each month.\n\n"
         
         # 2. Expense Analysis
-        if expense_data:
+        if metrics.has_expenses:
             analysis += "### 💸 Spending Analysis\n"
             
             # Find top categories
-            sorted_expenses = sorted(expense_data.items(), key=lambda x: x[1], reverse=True)
+            top3 = metrics.top(3)
             
-            if len(sorted_expenses) >= 3:
-                top1_cat, top1_amt = sorted_expenses[0]
-                top2_cat, top2_amt = sorted_expenses[1]
-                top3_cat, top3_amt = sorted_expenses[2]
-                
-                top1_pct = (top1_amt / total_expenses * 100) if total_expenses > 0 else 0
-                top3_total = sum([amt for _, amt in sorted_expenses[:3]])
-                top3_pct = (top3_total / total_expenses * 100) if total_expenses > 0 else 0
+            if len(top3) >= 3:
+                top1_cat, _, top1_pct = top3[0]
+                top3_pct = sum(pct for _, _, pct in top3)
                 
                 analysis += f"• **Top 3 categories** account for {top3_pct:.1f}% of spending\n"
                 analysis += f"• **{top1_cat}** is your largest expense at {top1_pct:.1f}%\n\n"
@@ -72,23 +99,56 @@ class SmartFinanceAI:
                     analysis += f"💡 **Insight:** Consider ways to reduce {top1_cat} expenses by 15% next month.\n\n"
             
             # Identify potential savings
-            if total_expenses > 0:
-                average_expense = total_expenses / len(expense_data) if expense_data else 0
-                
-                # Find high-value opportunities
-                high_value_cats = []
-                for category, amount in expense_data.items():
-                    pct = (amount / total_expenses * 100)
-                    if pct > 25:  # Categories over 25% of total
-                        potential_saving = amount * 0.15  # 15% reduction
-                        high_value_cats.append((category, potential_saving))
+            if metrics.total_expenses > 0:
+                # Categories over 25% of total, 15% reduction each
+                high_value_cats = metrics.categories_over(25)
                 
                 if high_value_cats:
                     analysis += "### 💰 Quick Win Opportunities\n"
-                    for category, potential in high_value_cats[:2]:  # Show top 2
-                        analysis += f"• Reduce **{category}** by 15% to save **₹{potential:,.0f}** monthly\n"
+                    for category, amount, _ in high_value_cats[:2]:  # Show top 2
+                        analysis += f"• Reduce **{category}** by 15% to save **₹{amount * 0.15:,.0f}** monthly\n"
                     analysis += "\n"
         
+        # Month-over-month trend, when the time dimension is available
+        if len(metrics.months) >= 2:
+            analysis += "### 📅 Monthly Trend\n"
+            latest_month = metrics.months[-1]
+            latest_total = float(metrics.monthly_totals[-1])
+            change = float(metrics.mom_change[-1])
+            window = min(ROLLING_WINDOW, len(metrics.months))
+            
+            analysis += f"• **{latest_month}** spending: ₹{latest_total:,.0f}"
+            if not math.isnan(change):
+                direction = "up" if change > 0 else "down"
+                # The current month is compared at its daily pace, not its total so far
+                pace = "on pace to be " if metrics.last_month_elapsed < 1 else ""
+                analysis += f" ({pace}{direction} {abs(change):.1f}% from last month)"
+            analysis += "\n"
+            analysis += f"• **{window}-month average:** ₹{float(metrics.rolling_average[-1]):,.0f}\n"
+            if metrics.total_savings > 0:
+                analysis += f"• **Savings rate this month:** {float(metrics.savings_rate_by_month[-1]):.1f}%\n"
+            analysis += "\n"
+        
+        # Biggest category movers against the previous period
+        movers = [row for row in metrics.category_changes if row['change'] != 0]
+        if movers:
+            analysis += f"### 🔀 Category Changes ({CATEGORY_CHANGE_DAYS} days vs previous {CATEGORY_CHANGE_DAYS})\n"
+            for row in sorted(movers, key=lambda row: abs(row['change']), reverse=True)[:3]:
+                direction = "up" if row['change'] > 0 else "down"
+                analysis += f"• **{row['category']}:** ₹{row['current']:,.0f} ({direction} ₹{abs(row['change']):,.0f}"
+                if row['change_pct'] is not None:
+                    analysis += f", {abs(row['change_pct']):.1f}%"
+                analysis += ")\n"
+            analysis += "\n"
+        
+        # Tag breakdown
+        if metrics.tag_totals:
+            analysis += "### 🏷️ Spending by Tag\n"
+            for tag, amount in list(metrics.tag_totals.items())[:3]:
+                share = (amount / metrics.total_expenses * 100) if metrics.total_expenses > 0 else 0
+                analysis += f"• **{tag}:** ₹{amount:,.0f} ({share:.1f}%)\n"
+            analysis += "\n"
+        
         # 3. Goals Progress
         active_goals = [g for g in goals if g.get('status') == 'active']
         if active_goals:
@@ -119,7 +179,7 @@ class SmartFinanceAI:
         analysis += "### 🚀 Personalized Action Plan\n"
         
         # Generate smart recommendations based on data
-        recommendations = self._generate_recommendations(expense_data, total_expenses, savings, goals, analysis_type)
+        recommendations = self._generate_recommendations(metrics, goals, analysis_type)
         
         for i, rec in enumerate(recommendations[:4], 1):  # Show top 4
             analysis += f"{i}. {rec}\n"
@@ -154,14 +214,14 @@ class SmartFinanceAI:
         
         return analysis
     
-    def _generate_recommendations(self, expense_data: Dict, total_expenses: float,
-                                 savings: float, goals: List, analysis_type: str) -> List[str]:
+    def _generate_recommendations(self, metrics: FinanceMetrics, goals: List,
+                                 analysis_type: str) -> List[str]:
         """Generate personalized recommendations"""
         
         recommendations = []
         
         # Based on savings rate
-        savings_rate = (savings / total_expenses * 100) if total_expenses > 0 else 0
+        savings_rate = metrics.savings_rate
         
         if savings_rate < 10:
             recommendations.extend([
@@ -186,10 +246,8 @@ class SmartFinanceAI:
             ])
         
         # Based on expense patterns
-        if expense_data:
-            largest_cat = max(expense_data.items(), key=lambda x: x[1])[0] if expense_data else ""
-            largest_amt = max(expense_data.values()) if expense_data else 0
-            largest_pct = (largest_amt / total_expenses * 100) if total_expenses > 0 else 0
+        if metrics.has_expenses:
+            largest_cat, _, largest_pct = metrics.top(1)[0]
             
             if largest_pct > 30:
                 recommendations.append(f"Reduce {largest_cat} spending by 15% through better planning")
@@ -223,6 +281,7 @@ class SmartFinanceAI:
         
         return recommendations
     
+    @instrumented(kind='analysis')
     def get_quick_insight(self, expense_data: Dict) -> str:
         """Generate a quick insight about spending patterns"""
         if not expense_data:
@@ -244,12 +303,14 @@ class SmartFinanceAI:
 # Global instance
 smart_ai = SmartFinanceAI()
 
+@instrumented(kind='analysis')
 def get_financial_analysis(expense_summary: Dict, total_expenses: float,
                           total_savings: float, goals: List,
-                          analysis_type: str = "Comprehensive Analysis") -> str:
+                          analysis_type: str = "Comprehensive Analysis",
+                          metrics: Optional[FinanceMetrics] = None) -> str:
     """
     Get smart financial analysis
     """
     return smart_ai.analyze_finances(
-        expense_summary, total_expenses, total_savings, goals, analysis_type
+        expense_summary, total_expenses, total_savings, goals, analysis_type, metrics
     )
\ No newline at end of file
@@ -0,0 +1,251 @@
+import calendar
+import numpy as np
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Months averaged by the rolling spend metric
+ROLLING_WINDOW = 3
+
+@dataclass
+class FinanceMetrics:
+    """Every number the analysis text is rendered from
+
+    Category arrays are ordered by total, largest first; month arrays are
+    ordered oldest first and cover every month between the first and last
+    transaction.
+    """
+    total_expenses: float
+    total_savings: float
+    category_names: List[str]
+    category_totals: np.ndarray
+    category_shares: np.ndarray
+    months: List[str] = field(default_factory=list)
+    monthly_totals: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    monthly_savings: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    mom_change: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    # Fraction of the last month that has elapsed; below 1 when it is the current month
+    last_month_elapsed: float = 1.0
+    rolling_average: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    savings_rate_by_month: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    tag_totals: Dict[str, float] = field(default_factory=dict)
+    # data_handler.compare_category_periods rows for a recent period
+    category_changes: List[Dict] = field(default_factory=list)
+
+    @property
+    def savings_rate(self) -> float:
+        """Savings as a percentage of expenses"""
+        return (self.total_savings / self.total_expenses * 100) if self.total_expenses > 0 else 0.0
+
+    @property
+    def has_expenses(self) -> bool:
+        return len(self.category_names) > 0
+
+    def top(self, k: int) -> List[Tuple[str, float, float]]:
+        """Largest k categories as (name, total, share %)"""
+        return [
+            (self.category_names[i], float(self.category_totals[i]), float(self.category_shares[i]))
+            for i in range(min(k, len(self.category_names)))
+        ]
+
+    def categories_over(self, share_pct: float) -> List[Tuple[str, float, float]]:
+        """Categories whose share of spending exceeds share_pct"""
+        count = int(np.count_nonzero(self.category_shares > share_pct))
+        return self.top(count)
+
+    def as_summary(self) -> Dict[str, float]:
+        """Category totals as the {category: amount} dict used elsewhere in the app"""
+        return dict(zip(self.category_names, self.category_totals.tolist()))
+
+    def fingerprint(self) -> list:
+        """JSON-friendly view of the metrics, used for cache keys"""
+        return [
+            self.total_expenses, self.total_savings, self.as_summary(),
+            self.months, self.monthly_totals.tolist(), self.monthly_savings.tolist(),
+            self.last_month_elapsed, self.tag_totals, self.category_changes,
+        ]
+
+    @classmethod
+    def from_summary(cls, expense_summary: Dict[str, float], total_expenses: float,
+                     total_savings: float) -> "FinanceMetrics":
+        """Build metrics from pre-summed category totals (no time dimension)"""
+        names = np.array(list(expense_summary.keys()), dtype=object)
+        totals = np.fromiter(expense_summary.values(), dtype=np.float64, count=len(expense_summary))
+        return cls._with_categories(names, totals, float(total_expenses), float(total_savings))
+
+    @classmethod
+    def _with_categories(cls, names: np.ndarray, totals: np.ndarray, total_expenses: float,
+                         total_savings: float, **extra) -> "FinanceMetrics":
+        order = np.argsort(-totals, kind='stable')
+        totals = totals[order]
+        shares = totals / total_expenses * 100 if total_expenses > 0 else np.zeros_like(totals)
+        return cls(
+            total_expenses=total_expenses,
+            total_savings=total_savings,
+            category_names=[str(name) for name in names[order]],
+            category_totals=totals,
+            category_shares=shares,
+            **extra
+        )
+
+def _encode(values) -> Tuple[np.ndarray, np.ndarray]:
+    """Dictionary-encode a column into (codes, names)"""
+    # pandas Categorical / Series.cat are already encoded
+    if hasattr(values, 'cat'):
+        values = values.cat
+    if hasattr(values, 'codes') and hasattr(values, 'categories'):
+        return np.asarray(values.codes), np.asarray(values.categories, dtype=object)
+    # Imported here so pages that never analyse raw columns don't load pandas
+    import pandas as pd
+    # Hash-based factorize is O(n); np.unique would sort every string
+    codes, names = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+    return codes, np.asarray(names, dtype=object)
+
+def _month_index(dates) -> np.ndarray:
+    """Convert ISO date strings or datetime64 values to datetime64[M]"""
+    return np.asarray(dates, dtype='datetime64[D]').astype('datetime64[M]')
+
+def _elapsed_fraction(month: np.datetime64, today: date) -> float:
+    """Fraction of month that has passed by the end of today (1.0 for past months)"""
+    if str(month) != today.strftime('%Y-%m'):
+        return 1.0
+    return today.day / calendar.monthrange(today.year, today.month)[1]
+
+def compute_metrics(amounts, categories, dates=None, tags=None,
+                    savings_amounts=None, savings_dates=None,
+                    rolling_window: int = ROLLING_WINDOW,
+                    today: Optional[date] = None) -> FinanceMetrics:
+    """Compute all analysis metrics from raw expense columns in one vectorized pass
+
+    amounts, categories, dates and tags are parallel columns (NumPy arrays,
+    pandas Series or plain sequences). Dates may be ISO strings or datetime64;
+    tags are comma-joined strings. Savings columns are optional.
+
+    When the last month is today's month it is still partial, so its
+    month-over-month change compares the spending pace (the total prorated
+    by elapsed days) rather than the total so far.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    total_expenses = float(amounts.sum())
+    savings_amounts = np.asarray(savings_amounts if savings_amounts is not None else [], dtype=np.float64)
+    total_savings = float(savings_amounts.sum())
+
+    codes, names = _encode(categories) if len(amounts) else (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=object))
+    category_totals = np.bincount(codes, weights=amounts, minlength=len(names))
+    present = category_totals > 0
+    extra = {}
+
+    if dates is not None and len(amounts):
+        months = _month_index(dates)
+        has_savings = savings_dates is not None and len(savings_amounts) > 0
+        saving_months = _month_index(savings_dates) if has_savings else months[:0]
+
+        first = min(months.min(), saving_months.min()) if has_savings else months.min()
+        last = max(months.max(), saving_months.max()) if has_savings else months.max()
+        span = int((last - first).astype(int)) + 1
+
+        monthly_totals = np.bincount((months - first).astype(np.intp), weights=amounts, minlength=span)
+        monthly_savings = np.bincount((saving_months - first).astype(np.intp), weights=savings_amounts,
+                                      minlength=span) if has_savings else np.zeros(span)
+
+        elapsed = _elapsed_fraction(last, today or date.today())
+        paced_totals = monthly_totals.copy()
+        paced_totals[-1] /= elapsed
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mom_change = np.full(span, np.nan)
+            mom_change[1:] = (paced_totals[1:] - monthly_totals[:-1]) / monthly_totals[:-1] * 100
+            mom_change[~np.isfinite(mom_change)] = np.nan
+            savings_rate = np.where(monthly_totals > 0, monthly_savings / monthly_totals * 100, 0.0)
+
+        window = max(1, min(rolling_window, span))
+        cumulative = np.concatenate(([0.0], np.cumsum(monthly_totals)))
+        rolling = np.empty(span)
+        rolling[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+        rolling[:window - 1] = cumulative[1:window] / np.arange(1, window)
+
+        extra.update(
+            months=[str(m) for m in np.arange(first, last + 1)],
+            monthly_totals=monthly_totals,
+            monthly_savings=monthly_savings,
+            mom_change=mom_change,
+            last_month_elapsed=elapsed,
+            rolling_average=rolling,
+            savings_rate_by_month=savings_rate,
+        )
+
+    if tags is not None and len(amounts):
+        # Few distinct tag strings exist, so split those rather than every row
+        tag_codes, tag_strings = _encode(tags)
+        per_string = np.bincount(tag_codes, weights=amounts, minlength=len(tag_strings))
+        tag_totals: Dict[str, float] = {}
+        for tag_string, amount in zip(tag_strings, per_string):
+            if not isinstance(tag_string, str):
+                continue
+            for tag in tag_string.split(','):
+                tag = tag.strip()
+                if tag:
+                    tag_totals[tag] = tag_totals.get(tag, 0.0) + float(amount)
+        extra['tag_totals'] = dict(sorted(tag_totals.items(), key=lambda item: item[1], reverse=True))
+
+    return FinanceMetrics._with_categories(
+        names[present], category_totals[present], total_expenses, total_savings, **extra
+    )
+
+def metrics_from_rollup(rollup: Sequence[Dict], savings_by_month: Sequence[Tuple[str, float]] = (),
+                        tag_totals: Optional[Dict[str, float]] = None,
+                        category_changes: Optional[List[Dict]] = None,
+                        today: Optional[date] = None) -> FinanceMetrics:
+    """Build metrics from monthly_category_rollup rows and monthly savings totals
+
+    Works on O(months x categories) rows; pass tag_totals (e.g. from
+    data_handler.totals_by_tag) to include the tag breakdown and
+    category_changes (from data_handler.compare_category_periods) to include
+    period-over-period category changes.
+    """
+    metrics = compute_metrics(
+        [row['total'] for row in rollup],
+        [row['category'] for row in rollup],
+        dates=[f"{row['month']}-01" for row in rollup],
+        savings_amounts=[total for _, total in savings_by_month],
+        savings_dates=[f"{month}-01" for month, _ in savings_by_month],
+        today=today,
+    )
+    if tag_totals:
+        metrics.tag_totals = dict(tag_totals)
+    if category_changes:
+        metrics.category_changes = list(category_changes)
+    return metrics
+
+def lttb_indices(x, y, max_points: int) -> np.ndarray:
+    """Indices of at most max_points points that keep a series' shape (Largest-Triangle-Three-Buckets)
+
+    The first and last points are always kept. The points in between are
+    split into max_points - 2 equal buckets and each bucket keeps the point
+    forming the largest triangle with the previously kept point and the
+    next bucket's average, so peaks and troughs survive. x must be numeric
+    and ascending.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # max_points - 2 buckets over points 1..n-2; the last "next bucket" is the final point
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    kept = np.empty(max_points, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[hi:next_hi].mean()
+        next_y = y[hi:next_hi].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (next_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Upper bound on distinct cached reads between two writes
+MAX_CACHED_READS = 256
+# Upper bound on the rows held by all cached reads; larger results aren't cached
+MAX_CACHED_ROWS = 50_000
+
+_lock = threading.Lock()
+_data_version = 0
+# key -> (result, rows)
+_entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cached_rows = 0
+_stats = {'hits': 0, 'misses': 0, 'uncacheable': 0}
+
+def data_version() -> int:
+    """Current data version; changes every time a write is recorded"""
+    return _data_version
+
+def bump_data_version() -> int:
+    """Record a write, invalidating every cached read"""
+    global _data_version, _cached_rows
+    with _lock:
+        _data_version += 1
+        _entries.clear()
+        _cached_rows = 0
+        return _data_version
+
+def clear_read_cache():
+    """Drop all cached reads and reset the counters"""
+    global _cached_rows
+    with _lock:
+        _entries.clear()
+        _cached_rows = 0
+        for name in _stats:
+            _stats[name] = 0
+
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the read cache"""
+    with _lock:
+        return {**_stats, 'size': len(_entries), 'rows': _cached_rows, 'version': _data_version}
+
+def _freeze(value):
+    """Turn dict/list arguments into hashable equivalents for cache keys"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _result_rows(value) -> int:
+    """Rough size of a read's result: its rows, or the length of its longest column"""
+    if isinstance(value, tuple):
+        return sum(_result_rows(item) for item in value)
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, dict):
+        columns = [len(item) for item in value.values() if hasattr(item, '__len__') and not isinstance(item, str)]
+        return max(columns, default=len(value))
+    return 1
+
+def _copy_result(value):
+    """Copy a cached result, so callers can't change what later callers get"""
+    if type(value) is tuple:
+        return tuple(_copy_result(item) for item in value)
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    # Records, NumPy arrays and Categoricals; strings and numbers are immutable
+    if hasattr(value, 'copy'):
+        return value.copy()
+    return value
+
+def _store(key: tuple, result) -> bool:
+    """Cache a result, evicting the least recently used ones past either bound (call with _lock held)"""
+    global _cached_rows
+    rows = _result_rows(result)
+    if rows > MAX_CACHED_ROWS:
+        return False
+    if key in _entries:
+        _cached_rows -= _entries.pop(key)[1]
+    _entries[key] = (result, rows)
+    _cached_rows += rows
+    while len(_entries) > MAX_CACHED_READS or _cached_rows > MAX_CACHED_ROWS:
+        _cached_rows -= _entries.popitem(last=False)[1][1]
+    return True
+
+def cached_read(func: Callable = None, *, daily: bool = False):
+    """Cache a read function's result until the next write
+
+    Every caller gets its own copy of the result. Results over
+    MAX_CACHED_ROWS (e.g. a large full-table read) aren't cached.
+    Use daily=True for reads relative to today's date so they roll over at
+    midnight. Writes made by another process are not seen.
+    """
+    def decorator(read: Callable):
+        @wraps(read)
+        def wrapper(*args, **kwargs):
+            key = (read.__name__, _freeze(args), _freeze(kwargs))
+            if daily:
+                key += (date.today().toordinal(),)
+            try:
+                hash(key)
+            except TypeError:
+                # e.g. list arguments; just run the query
+                with _lock:
+                    _stats['uncacheable'] += 1
+                return read(*args, **kwargs)
+
+            with _lock:
+                cached = _entries.get(key)
+                if cached is not None:
+                    _stats['hits'] += 1
+                    _entries.move_to_end(key)
+                else:
+                    _stats['misses'] += 1
+                    version = _data_version
+            if cached is not None:
+                return _copy_result(cached[0])
+
+            result = read(*args, **kwargs)
+
+            with _lock:
+                # Skip storing if a write landed while the query was running
+                stored = version == _data_version and _store(key, result)
+            return _copy_result(result) if stored else result
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+class LRUCache:
+    """Thread-safe LRU cache with a size bound and per-entry time-to-live"""
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live cached value, or default"""
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries past max_entries"""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            return entry is not self._MISSING and (entry[0] is None or entry[0] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+            }
@@ -1,218 +1,959 @@
 import sqlite3
+import csv
+import gzip
+import io
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import queue
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from datetime import datetime, date, timedelta
+from typing import List, Dict, BinaryIO, Iterable, Optional, Tuple
+
+from utils import instrumentation
+from utils.cache import cached_read, bump_data_version
+from utils.instrumentation import instrumented
+from utils.models import (
+    EXPENSE_FIELDS, GOAL_FIELDS, SAVING_FIELDS, Expense, Goal, Saving, empty_columns, fetch_columns
+)
 
 DATABASE_NAME = "expense_tracker.db"
 
-def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
+# Owner of rows created before per-user partitioning, and of single-user installs
+DEFAULT_USER_ID = 1
+
+# Connection pool settings
+POOL_SIZE = 5
+POOL_TIMEOUT = 10.0
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",      # ~8 MB page cache per connection
+    "PRAGMA mmap_size=268435456",   # 256 MB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+)
+
+def month_bounds(month: str) -> Tuple[str, str]:
+    """Return the [start, end) ISO date range covering a YYYY-MM month"""
+    first = datetime.strptime(month, '%Y-%m').date()
+    if first.month == 12:
+        following = date(first.year + 1, 1, 1)
+    else:
+        following = date(first.year, first.month + 1, 1)
+    return first.isoformat(), following.isoformat()
+
+def _shift_month(first: date, months: int) -> date:
+    """Move the first day of a month forward/backward by whole calendar months"""
+    index = first.year * 12 + (first.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _date_range_clause(start: Optional[str], end: Optional[str],
+                       column: str = 'date') -> Tuple[str, List]:
+    """Build a sargable [start, end) predicate on the date column"""
+    # Compare the raw column (no strftime) so the date indexes can be used
+    conditions = []
+    params = []
+    if start:
+        conditions.append(f'{column} >= ?')
+        params.append(start)
+    if end:
+        conditions.append(f'{column} < ?')
+        params.append(end)
+    return ' AND '.join(conditions), params
+
+def _user_where(user_id: int, clause: str, params: List, column: str = 'user_id') -> Tuple[str, List]:
+    """Build a WHERE clause restricted to one user's rows plus an optional extra predicate"""
+    # user_id leads every index, so this keeps queries O(that user's rows)
+    conditions = [f'{column} = ?'] + ([clause] if clause else [])
+    return f"WHERE {' AND '.join(conditions)}", [user_id] + params
+
+def get_db_connection(database: Optional[str] = None):
+    """Create a new configured database connection"""
+    # check_same_thread is off so pooled connections can move between
+    # Streamlit script threads; the pool hands each one to a single user at a time
+    conn = sqlite3.connect(database or DATABASE_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
-def init_db():
-    """Initialize database tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+class ConnectionPool:
+    """Small bounded pool of reusable SQLite connections"""
     
-    # Expenses table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS expenses (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        amount REAL NOT NULL,
-        category TEXT NOT NULL,
-        date TEXT NOT NULL,
-        description TEXT,
-        tags TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    def __init__(self, database: Optional[str] = None, size: int = POOL_SIZE,
+                 timeout: float = POOL_TIMEOUT):
+        self.database = database or DATABASE_NAME
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
     
-    # Goals table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS goals (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        target_amount REAL NOT NULL,
-        current_amount REAL DEFAULT 0,
-        deadline TEXT NOT NULL,
-        priority TEXT DEFAULT 'Medium',
-        description TEXT,
-        status TEXT DEFAULT 'active',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Savings table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS savings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        amount REAL NOT NULL,
-        date TEXT NOT NULL,
-        source TEXT,
-        purpose TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, returning it to the pool afterwards"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+        
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = get_db_connection(self.database)
+            
+            healthy = True
+            counting = instrumentation.attach(conn)
+            try:
+                yield conn
+            finally:
+                if counting:
+                    instrumentation.detach(conn)
+                # Never hand out a connection with a half-finished transaction
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except sqlite3.Error:
+                    healthy = False
+                
+                if healthy and not self._closed:
+                    self._idle.put_nowait(conn)
+                else:
+                    conn.close()
+        finally:
+            self._slots.release()
     
-    conn.commit()
-    conn.close()
+    def close(self):
+        """Close all idle connections and refuse new borrows"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
 
-def add_expense(expense_data: Dict) -> bool:
-    """Add a new expense"""
-    try:
-        conn = get_db_connection()
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def configure_pool(database: Optional[str] = None, size: int = POOL_SIZE) -> ConnectionPool:
+    """Replace the shared connection pool (e.g. from st.cache_resource)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(database, size)
+        return _pool
+
+def get_pool() -> ConnectionPool:
+    """Get the shared connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        # Recreate the pool if DATABASE_NAME was pointed somewhere else
+        if _pool is None or _pool._closed or _pool.database != DATABASE_NAME:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_NAME)
+        return _pool
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled database connection"""
+    with get_pool().connection() as conn:
+        yield conn
+
+ROLLUP_REBUILD_SQL = '''
+INSERT INTO monthly_category_rollup (user_id, month, category, total, count, min_amount, max_amount)
+SELECT user_id, substr(date, 1, 7), category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+FROM expenses
+GROUP BY user_id, substr(date, 1, 7), category
+'''
+
+@instrumented
+def init_db() -> int:
+    """Bring the database schema up to date, returning its schema version"""
+    # Imported here because utils.migrations builds on this module
+    from utils.migrations import migrate
+    return migrate()
+
+@instrumented
+def rebuild_rollup() -> int:
+    """Recompute monthly_category_rollup from the expenses table, returning its row count"""
+    with db_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute('''
-        INSERT INTO expenses (amount, category, date, description, tags)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (
-            expense_data['amount'],
-            expense_data['category'],
-            expense_data['date'],
-            expense_data.get('description', ''),
-            expense_data.get('tags', '')
-        ))
+        cursor.execute('DELETE FROM monthly_category_rollup')
+        cursor.execute(ROLLUP_REBUILD_SQL)
+        cursor.execute('SELECT COUNT(*) AS n FROM monthly_category_rollup')
+        count = cursor.fetchone()['n']
         
         conn.commit()
-        conn.close()
+    bump_data_version()
+    return count
+
+@instrumented
+def verify_rollup(tolerance: float = 0.005) -> List[Dict]:
+    """Compare monthly_category_rollup with the expenses table, returning mismatched rows"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            WITH actual AS (
+                SELECT user_id, substr(date, 1, 7) AS month, category, SUM(amount) AS total,
+                       COUNT(*) AS count, MIN(amount) AS min_amount, MAX(amount) AS max_amount
+                FROM expenses
+                GROUP BY user_id, substr(date, 1, 7), category
+            )
+            SELECT a.user_id, a.month, a.category, a.total AS expected_total, r.total AS rollup_total,
+                   a.count AS expected_count, r.count AS rollup_count
+            FROM actual a
+            LEFT JOIN monthly_category_rollup r
+                ON r.user_id = a.user_id AND r.month = a.month AND r.category = a.category
+            WHERE r.month IS NULL OR abs(a.total - r.total) > ? OR a.count != r.count
+               OR a.min_amount != r.min_amount OR a.max_amount != r.max_amount
+            UNION ALL
+            SELECT r.user_id, r.month, r.category, NULL, r.total, NULL, r.count
+            FROM monthly_category_rollup r
+            WHERE NOT EXISTS (SELECT 1 FROM actual a WHERE a.user_id = r.user_id
+                              AND a.month = r.month AND a.category = r.category)
+        ''', (tolerance,))
+        mismatches = [dict(row) for row in cursor.fetchall()]
+    return mismatches
+
+def _is_month_start(value: Optional[str]) -> bool:
+    """True for open bounds and YYYY-MM-01 dates, which the rollup can answer"""
+    return value is None or (len(value) == 10 and value.endswith('-01'))
+
+def _month_range_clause(start: Optional[str], end: Optional[str]) -> Tuple[str, List]:
+    """Build a [start, end) predicate on the rollup's month column"""
+    conditions = []
+    params = []
+    if start:
+        conditions.append('month >= ?')
+        params.append(start[:7])
+    if end:
+        conditions.append('month < ?')
+        params.append(end[:7])
+    return ' AND '.join(conditions), params
+
+EXPENSE_INSERT_SQL = '''
+INSERT INTO expenses (amount, category, date, description, tags, user_id)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def _expense_params(expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> Tuple:
+    """Map an expense dict onto EXPENSE_INSERT_SQL parameters"""
+    return (
+        expense_data['amount'],
+        expense_data['category'],
+        expense_data['date'],
+        expense_data.get('description', ''),
+        expense_data.get('tags', ''),
+        user_id
+    )
+
+@instrumented
+def add_expense(expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+    """Add a new expense"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(EXPENSE_INSERT_SQL, _expense_params(expense_data, user_id))
+            
+            conn.commit()
+            bump_data_version()
         return True
     except Exception as e:
         print(f"Error adding expense: {e}")
         return False
 
-def get_expenses(month: Optional[str] = None) -> List[Dict]:
-    """Get all expenses or filter by month (YYYY-MM)"""
-    try:
-        conn = get_db_connection()
+@instrumented
+def insert_expenses(expenses: Iterable[Dict], batch_size: int = 1000,
+                    user_id: int = DEFAULT_USER_ID) -> int:
+    """add_expenses_bulk, but raising whatever stops it (nothing is inserted then)
+
+    For callers that report the error themselves, e.g. the statement
+    importer when the file turns out to be malformed halfway through.
+    """
+    inserted = 0
+    rows = iter(expenses)
+    with db_connection() as conn:
         cursor = conn.cursor()
         
-        if month:
-            cursor.execute('''
-                SELECT * FROM expenses 
-                WHERE strftime('%Y-%m', date) = ?
-                ORDER BY date DESC
-            ''', (month,))
-        else:
-            cursor.execute('SELECT * FROM expenses ORDER BY date DESC')
+        while True:
+            batch = [_expense_params(expense, user_id) for expense in islice(rows, batch_size)]
+            if not batch:
+                break
+            cursor.executemany(EXPENSE_INSERT_SQL, batch)
+            inserted += len(batch)
         
-        rows = cursor.fetchall()
-        expenses = [dict(row) for row in rows]
-        
-        conn.close()
+        conn.commit()
+        bump_data_version()
+    return inserted
+
+@instrumented
+def add_expenses_bulk(expenses: Iterable[Dict], batch_size: int = 1000,
+                      user_id: int = DEFAULT_USER_ID) -> int:
+    """Add many expenses in a single transaction, returning how many were inserted
+    
+    The iterable is consumed batch_size rows at a time, so generators
+    (e.g. a streaming file import) are never fully materialized.
+    Nothing is inserted if any row fails.
+    """
+    try:
+        return insert_expenses(expenses, batch_size, user_id)
+    except Exception as e:
+        print(f"Error adding expenses in bulk: {e}")
+        return 0
+
+@instrumented
+@cached_read
+def get_expenses(month: Optional[str] = None, start: Optional[str] = None,
+                 end: Optional[str] = None, user_id: int = DEFAULT_USER_ID) -> List[Expense]:
+    """Get expenses, optionally filtered by month (YYYY-MM) or a [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            if month:
+                start, end = month_bounds(month)
+            
+            where, params = _user_where(user_id, *_date_range_clause(start, end))
+            
+            cursor.execute(f'SELECT {", ".join(EXPENSE_FIELDS)} FROM expenses {where} ORDER BY date DESC', params)
+            
+            rows = cursor.fetchall()
+            expenses = [Expense.from_row(row) for row in rows]
         return expenses
     except Exception as e:
         print(f"Error fetching expenses: {e}")
         return []
 
-def add_goal(goal_data: Dict) -> bool:
-    """Add a new financial goal"""
+EXPORT_COLUMNS = ('id', 'amount', 'category', 'date', 'description', 'tags', 'created_at')
+
+@instrumented
+@cached_read
+def expense_columns(start: Optional[str] = None, end: Optional[str] = None,
+                    columns: Tuple[str, ...] = ('amount', 'date', 'category'),
+                    user_id: int = DEFAULT_USER_ID) -> Dict:
+    """Get expense columns within an optional [start, end) date range as arrays, oldest first
+    
+    Much smaller than get_expenses() when only a few columns are needed:
+    amounts are float64, dates datetime64[D], and category/tags
+    dictionary-encoded Categoricals (see models.fetch_columns).
+    """
+    unknown = set(columns) - set(EXPENSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown expense columns: {', '.join(sorted(unknown))}")
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT INTO goals (name, target_amount, current_amount, deadline, priority, description, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            goal_data['name'],
-            goal_data['target_amount'],
-            goal_data.get('current_amount', 0),
-            goal_data['deadline'],
-            goal_data.get('priority', 'Medium'),
-            goal_data.get('description', ''),
-            goal_data.get('status', 'active')
-        ))
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = _user_where(user_id, *_date_range_clause(start, end))
+            
+            cursor.execute(f'SELECT {", ".join(columns)} FROM expenses {where} ORDER BY date, id', params)
+            result = fetch_columns(cursor, columns)
+        return result
+    except Exception as e:
+        print(f"Error fetching expense columns: {e}")
+        return empty_columns(columns)
+
+def _encode_cursor(row) -> str:
+    """Opaque keyset cursor for the (date, id) position of a row"""
+    return f"{row['date']}|{row['id']}"
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Split a keyset cursor back into (date, id)"""
+    row_date, row_id = cursor.rsplit('|', 1)
+    return row_date, int(row_id)
+
+@instrumented
+@cached_read
+def list_expenses(limit: int = 20, after_cursor: Optional[str] = None, filters: Optional[Dict] = None,
+                  user_id: int = DEFAULT_USER_ID) -> Tuple[List[Expense], Optional[str]]:
+    """Get one page of expenses, newest first, plus the cursor for the next page
+    
+    Uses keyset pagination on (date, id), so every page is an indexed
+    LIMIT query no matter how deep. filters may contain 'category',
+    'tag', 'start' and 'end'. The returned cursor is None on the last page.
+    """
+    try:
+        filters = filters or {}
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            clause, params = _date_range_clause(filters.get('start'), filters.get('end'))
+            conditions = ['user_id = ?'] + ([clause] if clause else [])
+            params.insert(0, user_id)
+            if filters.get('category'):
+                conditions.append('category = ?')
+                params.append(filters['category'])
+            if filters.get('tag'):
+                conditions.append('id IN (SELECT expense_id FROM expense_tags WHERE user_id = ? AND tag = ?)')
+                params.extend((user_id, filters['tag']))
+            if after_cursor:
+                conditions.append('(date, id) < (?, ?)')
+                params.extend(_decode_cursor(after_cursor))
+            where = f"WHERE {' AND '.join(conditions)}"
+            
+            # Fetch one extra row to know whether another page exists
+            cursor.execute(f'''
+                SELECT {", ".join(EXPENSE_FIELDS)} FROM expenses {where}
+                ORDER BY date DESC, id DESC
+                LIMIT ?
+            ''', params + [limit + 1])
+            rows = cursor.fetchall()
         
-        conn.commit()
-        conn.close()
+        page = [Expense.from_row(row) for row in rows[:limit]]
+        next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return page, next_cursor
+    except Exception as e:
+        print(f"Error listing expenses: {e}")
+        return [], None
+
+def write_export_csv(output: BinaryIO, batches: Iterable[Iterable[Tuple]], compress: bool = False) -> int:
+    """Write EXPORT_COLUMNS rows, one batch at a time, as CSV into a binary file object
+    
+    Returns the row count and raises whatever stops it. output is left open
+    either way; compress=True writes gzip.
+    """
+    sink = gzip.GzipFile(fileobj=output, mode='wb') if compress else output
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='')
+    try:
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        written = 0
+        for rows in batches:
+            writer.writerows(tuple(row) for row in rows)
+            written += len(rows)
+        return written
+    finally:
+        # Flush and let go of the caller's file object; a dropped wrapper would close it
+        text.detach()
+        if compress:
+            sink.close()
+
+@instrumented
+def export_expenses_csv(output: BinaryIO, start: Optional[str] = None, end: Optional[str] = None,
+                        categories: Optional[List[str]] = None, compress: bool = False,
+                        chunk_size: int = 1000, user_id: int = DEFAULT_USER_ID) -> Optional[int]:
+    """Stream expenses as CSV into a binary file object, returning the row count (None on error)
+    
+    Rows are fetched chunk_size at a time and written straight out, so memory
+    use does not depend on the table size. compress=True writes gzip.
+    output is left open either way.
+    """
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            clause, params = _date_range_clause(start, end)
+            if categories:
+                category_clause = f"category IN ({', '.join('?' for _ in categories)})"
+                clause = f"{clause} AND {category_clause}" if clause else category_clause
+                params.extend(categories)
+            where, params = _user_where(user_id, clause, params)
+            
+            cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM expenses {where} ORDER BY date DESC, id DESC", params)
+            batches = iter(lambda: cursor.fetchmany(chunk_size), [])
+            return write_export_csv(output, batches, compress)
+    except Exception as e:
+        print(f"Error exporting expenses: {e}")
+        return None
+
+@instrumented
+@cached_read
+def sum_by_category(start: Optional[str] = None, end: Optional[str] = None,
+                    user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+    """Get total spend per category within an optional [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Whole months are answered from the rollup instead of raw rows
+            if _is_month_start(start) and _is_month_start(end):
+                clause, params = _month_range_clause(start, end)
+                source, amount = 'monthly_category_rollup', 'total'
+            else:
+                clause, params = _date_range_clause(start, end)
+                source, amount = 'expenses', 'amount'
+            where, params = _user_where(user_id, clause, params)
+            
+            cursor.execute(f'''
+                SELECT category, SUM({amount}) AS total FROM {source}
+                {where}
+                GROUP BY category
+                ORDER BY total DESC
+            ''', params)
+            summary = {row['category']: row['total'] for row in cursor.fetchall()}
+        return summary
+    except Exception as e:
+        print(f"Error summing expenses by category: {e}")
+        return {}
+
+@instrumented
+@cached_read
+def total_expenses(start: Optional[str] = None, end: Optional[str] = None,
+                   user_id: int = DEFAULT_USER_ID) -> float:
+    """Get total spend within an optional [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            if _is_month_start(start) and _is_month_start(end):
+                clause, params = _month_range_clause(start, end)
+                source, amount = 'monthly_category_rollup', 'total'
+            else:
+                clause, params = _date_range_clause(start, end)
+                source, amount = 'expenses', 'amount'
+            where, params = _user_where(user_id, clause, params)
+            
+            cursor.execute(f'SELECT COALESCE(SUM({amount}), 0) AS total FROM {source} {where}', params)
+            total = cursor.fetchone()['total']
+        return total
+    except Exception as e:
+        print(f"Error totalling expenses: {e}")
+        return 0.0
+
+@instrumented
+@cached_read
+def expense_stats(start: Optional[str] = None, end: Optional[str] = None,
+                  user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+    """Get total spend, transaction count, days with spend and first date within an optional [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = _user_where(user_id, *_date_range_clause(start, end))
+            
+            cursor.execute(f'''
+                SELECT COALESCE(SUM(amount), 0) AS total, COUNT(*) AS count,
+                       COUNT(DISTINCT date) AS days, MIN(date) AS first
+                FROM expenses {where}
+            ''', params)
+            stats = dict(cursor.fetchone())
+        return stats
+    except Exception as e:
+        print(f"Error computing expense stats: {e}")
+        return {'total': 0.0, 'count': 0, 'days': 0, 'first': None}
+
+@instrumented
+@cached_read(daily=True)
+def totals_by_month(n_months: int = 6, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+    """Get (YYYY-MM, total) pairs for the last n calendar months, oldest first
+    
+    Every month in the window is present; months without expenses total 0.
+    """
+    current = date.today().replace(day=1)
+    months = [_shift_month(current, -i).strftime('%Y-%m') for i in range(n_months - 1, -1, -1)]
+    
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT month, SUM(total) AS total FROM monthly_category_rollup
+                WHERE user_id = ? AND month >= ? AND month <= ?
+                GROUP BY month
+            ''', (user_id, months[0], months[-1]))
+            found = {row['month']: row['total'] for row in cursor.fetchall()}
+        return [(month, found.get(month, 0.0)) for month in months]
+    except Exception as e:
+        print(f"Error totalling expenses by month: {e}")
+        return [(month, 0.0) for month in months]
+
+@instrumented
+@cached_read
+def totals_by_day(start: Optional[str] = None, end: Optional[str] = None,
+                  user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+    """Get (YYYY-MM-DD, total) pairs for days with spend in a [start, end) range, oldest first"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = _user_where(user_id, *_date_range_clause(start, end))
+            
+            cursor.execute(f'''
+                SELECT date AS day, SUM(amount) AS total FROM expenses
+                {where}
+                GROUP BY day
+                ORDER BY day
+            ''', params)
+            totals = [(row['day'], row['total']) for row in cursor.fetchall()]
+        return totals
+    except Exception as e:
+        print(f"Error totalling expenses by day: {e}")
+        return []
+
+def comparison_period(start: str, end: Optional[str] = None) -> Tuple[str, str, str]:
+    """(previous_start, start, end) for [start, end) and the equal-length period just before it
+
+    end defaults to tomorrow, so the period runs through today.
+    """
+    end = end or (date.today() + timedelta(days=1)).isoformat()
+    length = date.fromisoformat(end) - date.fromisoformat(start)
+    return (date.fromisoformat(start) - length).isoformat(), start, end
+
+def _category_changes(rows: Iterable[Tuple[str, float, float]]) -> List[Dict]:
+    """Add absolute and percent change to (category, current, previous) rows"""
+    changes = []
+    for category, current, previous in rows:
+        changes.append({
+            'category': category,
+            'current': current,
+            'previous': previous,
+            'change': current - previous,
+            # No percentage for categories with nothing to compare against
+            'change_pct': (current - previous) / previous * 100 if previous else None,
+        })
+    return changes
+
+@instrumented
+@cached_read(daily=True)
+def compare_category_periods(start: str, end: Optional[str] = None,
+                             user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+    """Compare per-category spend in [start, end) with the equal-length period before it
+    
+    Both periods are summed in one pass over the index range using
+    conditional aggregation. Returns {'category', 'current', 'previous',
+    'change', 'change_pct'} dicts, largest current spend first.
+    """
+    previous_start, start, end = comparison_period(start, end)
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT category,
+                       SUM(CASE WHEN date >= ? THEN amount ELSE 0 END) AS current,
+                       SUM(CASE WHEN date < ? THEN amount ELSE 0 END) AS previous
+                FROM expenses
+                WHERE user_id = ? AND date >= ? AND date < ?
+                GROUP BY category
+                ORDER BY current DESC, previous DESC
+            ''', (start, start, user_id, previous_start, end))
+            changes = _category_changes(tuple(row) for row in cursor.fetchall())
+        return changes
+    except Exception as e:
+        print(f"Error comparing category periods: {e}")
+        return []
+
+# First day of the day/week (Monday)/month bucket an expense date falls in
+BUCKET_STARTS = {
+    'day': 'date',
+    'week': "date(date, 'weekday 0', '-6 days')",
+    'month': "substr(date, 1, 7) || '-01'",
+}
+
+@instrumented
+@cached_read
+def totals_by_bucket(bucket: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                     user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+    """Get (first day of bucket, total) pairs for day, week or month buckets with spend in a [start, end) range, oldest first"""
+    if bucket not in BUCKET_STARTS:
+        raise ValueError(f"Unknown bucket {bucket!r}; expected one of {', '.join(BUCKET_STARTS)}")
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Whole months are answered from the rollup instead of raw rows
+            if bucket == 'month' and _is_month_start(start) and _is_month_start(end):
+                clause, params = _month_range_clause(start, end)
+                where, params = _user_where(user_id, clause, params)
+                sql = f"SELECT month || '-01' AS bucket, SUM(total) AS total FROM monthly_category_rollup {where} GROUP BY month"
+            else:
+                where, params = _user_where(user_id, *_date_range_clause(start, end))
+                sql = f'SELECT {BUCKET_STARTS[bucket]} AS bucket, SUM(amount) AS total FROM expenses {where} GROUP BY bucket'
+            
+            cursor.execute(f'{sql} ORDER BY bucket', params)
+            totals = [(row['bucket'], row['total']) for row in cursor.fetchall()]
+        return totals
+    except Exception as e:
+        print(f"Error totalling expenses by {bucket}: {e}")
+        return []
+
+@instrumented
+@cached_read
+def totals_by_tag(start: Optional[str] = None, end: Optional[str] = None,
+                  user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+    """Get total spend per tag within an optional [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            clause, params = _date_range_clause(start, end, column='e.date')
+            where, params = _user_where(user_id, clause, params, column='t.user_id')
+            
+            cursor.execute(f'''
+                SELECT t.tag, SUM(e.amount) AS total
+                FROM expense_tags t
+                JOIN expenses e ON e.id = t.expense_id
+                {where}
+                GROUP BY t.tag
+                ORDER BY total DESC
+            ''', params)
+            totals = {row['tag']: row['total'] for row in cursor.fetchall()}
+        return totals
+    except Exception as e:
+        print(f"Error totalling expenses by tag: {e}")
+        return {}
+
+@instrumented
+@cached_read
+def get_tags(user_id: int = DEFAULT_USER_ID) -> List[str]:
+    """Get every tag in use, alphabetically"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT DISTINCT tag FROM expense_tags WHERE user_id = ? ORDER BY tag', (user_id,))
+            tags = [row['tag'] for row in cursor.fetchall()]
+        return tags
+    except Exception as e:
+        print(f"Error fetching tags: {e}")
+        return []
+
+@instrumented
+@cached_read
+def get_rollup(start: Optional[str] = None, end: Optional[str] = None,
+               user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+    """Get monthly_category_rollup rows for months in a [start, end) range, oldest first"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = _user_where(user_id, *_month_range_clause(start, end))
+            
+            cursor.execute(f'SELECT * FROM monthly_category_rollup {where} ORDER BY month, category', params)
+            rollup = [dict(row) for row in cursor.fetchall()]
+        return rollup
+    except Exception as e:
+        print(f"Error fetching rollup: {e}")
+        return []
+
+@instrumented
+def add_goal(goal_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+    """Add a new financial goal"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+            INSERT INTO goals (name, target_amount, current_amount, deadline, priority, description, status, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                goal_data['name'],
+                goal_data['target_amount'],
+                goal_data.get('current_amount', 0),
+                goal_data['deadline'],
+                goal_data.get('priority', 'Medium'),
+                goal_data.get('description', ''),
+                goal_data.get('status', 'active'),
+                user_id
+            ))
+            
+            conn.commit()
+            bump_data_version()
         return True
     except Exception as e:
         print(f"Error adding goal: {e}")
         return False
 
-def get_goals() -> List[Dict]:
+@instrumented
+@cached_read
+def get_goals(user_id: int = DEFAULT_USER_ID) -> List[Goal]:
     """Get all goals"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM goals ORDER BY priority DESC, deadline ASC')
-        rows = cursor.fetchall()
-        goals = [dict(row) for row in rows]
-        
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {", ".join(GOAL_FIELDS)} FROM goals
+                WHERE user_id = ?
+                ORDER BY priority DESC, deadline ASC
+            ''', (user_id,))
+            rows = cursor.fetchall()
+            goals = [Goal.from_row(row) for row in rows]
         return goals
     except Exception as e:
         print(f"Error fetching goals: {e}")
         return []
 
-def update_goal(goal_id: int, new_amount: float) -> bool:
+def _write_goal_amount(cursor: sqlite3.Cursor, goal_id: int, new_amount: float,
+                       user_id: int = DEFAULT_USER_ID):
+    """Set a goal's current amount and mark it achieved, without committing"""
+    cursor.execute('''
+    UPDATE goals 
+    SET current_amount = ?,
+        status = CASE WHEN ? >= target_amount THEN 'achieved' ELSE status END
+    WHERE id = ? AND user_id = ?
+    ''', (new_amount, new_amount, goal_id, user_id))
+
+GOAL_CONTRIBUTION_SQL = '''
+UPDATE goals
+SET current_amount = current_amount + ?,
+    status = CASE WHEN current_amount + ? >= target_amount THEN 'achieved' ELSE status END
+WHERE id = ? AND user_id = ?
+RETURNING id, name, current_amount, target_amount, status
+'''
+
+def _write_goal_contribution(cursor: sqlite3.Cursor, goal_id: int, delta: float,
+                             user_id: int = DEFAULT_USER_ID) -> Optional[Dict]:
+    """Add delta to a goal and return its new state, without committing"""
+    # The increment happens inside the UPDATE, so concurrent contributions
+    # each apply to the latest committed amount instead of a stale read
+    cursor.execute(GOAL_CONTRIBUTION_SQL, (delta, delta, goal_id, user_id))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+@instrumented
+def add_to_goal(goal_id: int, delta: float, user_id: int = DEFAULT_USER_ID) -> Optional[Dict]:
+    """Add a contribution to a goal in one statement, returning its new state (None if not found)"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            goal = _write_goal_contribution(cursor, goal_id, delta, user_id)
+            
+            conn.commit()
+            if goal is not None:
+                bump_data_version()
+        return goal
+    except Exception as e:
+        print(f"Error adding to goal: {e}")
+        return None
+
+@instrumented
+def update_goal(goal_id: int, new_amount: float, user_id: int = DEFAULT_USER_ID) -> bool:
     """Update goal current amount"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        UPDATE goals 
-        SET current_amount = ?
-        WHERE id = ?
-        ''', (new_amount, goal_id))
-        
-        conn.commit()
-        
-        # Check if goal is achieved
-        cursor.execute('SELECT target_amount FROM goals WHERE id = ?', (goal_id,))
-        row = cursor.fetchone()
-        if row:
-            target = row['target_amount']
-            if new_amount >= target:
-                cursor.execute('UPDATE goals SET status = "achieved" WHERE id = ?', (goal_id,))
-                conn.commit()
-        
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            _write_goal_amount(cursor, goal_id, new_amount, user_id)
+            
+            conn.commit()
+            bump_data_version()
         return True
     except Exception as e:
         print(f"Error updating goal: {e}")
         return False
 
-def add_saving(saving_data: Dict) -> bool:
+SAVING_INSERT_SQL = '''
+INSERT INTO savings (amount, date, source, purpose, user_id)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+def _saving_params(saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> Tuple:
+    """Map a savings dict onto SAVING_INSERT_SQL parameters"""
+    return (
+        saving_data['amount'],
+        saving_data['date'],
+        saving_data.get('source', ''),
+        saving_data.get('purpose', ''),
+        user_id
+    )
+
+@instrumented
+def add_saving(saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
     """Add new savings record"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT INTO savings (amount, date, source, purpose)
-        VALUES (?, ?, ?, ?)
-        ''', (
-            saving_data['amount'],
-            saving_data['date'],
-            saving_data.get('source', ''),
-            saving_data.get('purpose', '')
-        ))
-        
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(SAVING_INSERT_SQL, _saving_params(saving_data, user_id))
+            
+            conn.commit()
+            bump_data_version()
         return True
     except Exception as e:
         print(f"Error adding saving: {e}")
         return False
 
-def get_savings() -> List[Dict]:
+@instrumented
+@cached_read
+def get_savings(user_id: int = DEFAULT_USER_ID) -> List[Saving]:
     """Get all savings"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM savings ORDER BY date DESC')
-        rows = cursor.fetchall()
-        savings = [dict(row) for row in rows]
-        
-        conn.close()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'SELECT {", ".join(SAVING_FIELDS)} FROM savings WHERE user_id = ? ORDER BY date DESC', (user_id,))
+            rows = cursor.fetchall()
+            savings = [Saving.from_row(row) for row in rows]
         return savings
     except Exception as e:
         print(f"Error fetching savings: {e}")
-        return []
\ No newline at end of file
+        return []
+
+@instrumented
+@cached_read
+def total_savings(start: Optional[str] = None, end: Optional[str] = None,
+                  user_id: int = DEFAULT_USER_ID) -> float:
+    """Get total savings within an optional [start, end) date range"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            where, params = _user_where(user_id, *_date_range_clause(start, end))
+            
+            cursor.execute(f'SELECT COALESCE(SUM(amount), 0) AS total FROM savings {where}', params)
+            total = cursor.fetchone()['total']
+        return total
+    except Exception as e:
+        print(f"Error totalling savings: {e}")
+        return 0.0
+
+@instrumented
+@cached_read
+def savings_by_month(user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+    """Get (YYYY-MM, total) savings pairs for every month with savings, oldest first"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT substr(date, 1, 7) AS month, SUM(amount) AS total FROM savings
+                WHERE user_id = ?
+                GROUP BY month
+                ORDER BY month
+            ''', (user_id,))
+            totals = [(row['month'], row['total']) for row in cursor.fetchall()]
+        return totals
+    except Exception as e:
+        print(f"Error totalling savings by month: {e}")
+        return []
+
+
+@instrumented
+def add_user(name: str) -> Optional[int]:
+    """Add a user, returning the new id (None if the name is taken or on error)"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('INSERT INTO users (name) VALUES (?)', (name.strip(),))
+            user_id = cursor.lastrowid
+            
+            conn.commit()
+            bump_data_version()
+        return user_id
+    except Exception as e:
+        print(f"Error adding user: {e}")
+        return None
+
+@instrumented
+@cached_read
+def get_users() -> List[Dict]:
+    """Get all users, oldest first"""
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, name FROM users ORDER BY id')
+            users = [dict(row) for row in cursor.fetchall()]
+        return users
+    except Exception as e:
+        print(f"Error fetching users: {e}")
+        return []
@@ -0,0 +1,219 @@
+import csv
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
+
+from utils.data_handler import DEFAULT_USER_ID, insert_expenses
+from utils.storage import StorageBackend
+
+# Header names (lower-cased) recognised for each expense field
+DEFAULT_COLUMN_MAP = {
+    'amount': ['amount', 'debit', 'debit amount', 'withdrawal', 'withdrawal amount', 'value'],
+    'category': ['category'],
+    'date': ['date', 'transaction date', 'txn date', 'value date', 'posted date'],
+    'description': ['description', 'narration', 'details', 'memo', 'particulars', 'name'],
+    'tags': ['tags', 'labels'],
+}
+
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%m/%d/%Y', '%d %b %Y', '%d-%b-%Y', '%Y%m%d']
+
+# Only the first few rejected rows are kept so huge bad files stay cheap
+MAX_REPORTED_REJECTS = 100
+
+@dataclass
+class ImportReport:
+    """Outcome of a statement import
+
+    error is set when the whole file was refused or the import stopped
+    part way (nothing is imported then); errors holds rejected rows.
+    """
+    imported: int = 0
+    rejected: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def reject(self, line: int, reason: str):
+        """Count a rejected row, keeping the reason for the first few"""
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_REJECTS:
+            self.errors.append((line, reason))
+
+def _parse_amount(value: str) -> float:
+    """Parse an amount like '₹1,250.00' or '-450'; expenses are stored as positive values"""
+    cleaned = re.sub(r'[^0-9.\-]', '', value or '')
+    if not cleaned:
+        raise ValueError("missing amount")
+    amount = abs(float(cleaned))
+    if amount == 0:
+        raise ValueError("amount must be greater than 0")
+    return amount
+
+def _is_credit(value: str, debits_negative: bool = True) -> bool:
+    """True for a CSV amount that is money in rather than spending
+
+    A 'Cr'/'Dr' suffix decides on its own. Otherwise the sign does:
+    with debits_negative (the OFX convention) '-450' and '(450.00)' are
+    spending and '450' is a credit; without it the other way round.
+    """
+    value = (value or '').strip().lower()
+    if value.endswith('cr'):
+        return True
+    if value.endswith('dr'):
+        return False
+    cleaned = re.sub(r'[^0-9.\-]', '', value)
+    if not re.search(r'[0-9]', cleaned):
+        # Left for _parse_amount to reject as missing
+        return False
+    negative = value.startswith('(') or cleaned.startswith('-')
+    return negative != debits_negative
+
+def _parse_date(value: str) -> str:
+    """Normalise a statement date to YYYY-MM-DD"""
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date '{value}'")
+
+def _resolve_columns(header: List[str], column_map: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Pick the CSV column used for each expense field"""
+    lookup = {name.strip().lower(): name for name in header}
+    resolved = {}
+    for target, candidates in DEFAULT_COLUMN_MAP.items():
+        if column_map and target in column_map:
+            candidates = [column_map[target].strip().lower()]
+        for candidate in candidates:
+            if candidate in lookup:
+                resolved[target] = lookup[candidate]
+                break
+
+    missing = [name for name in ('amount', 'date') if name not in resolved]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return resolved
+
+def _open(source: Union[str, TextIO]) -> Tuple[TextIO, bool]:
+    """Open a path for streaming, or pass through an already open text file"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, newline='', encoding='utf-8-sig'), True
+    return source, False
+
+def _iter_csv(reader: csv.DictReader, columns: Dict[str, str], default_category: str,
+              report: ImportReport, debits_negative: bool = True) -> Iterator[Dict]:
+    """Yield validated expenses from CSV rows, recording rejects on the report
+
+    Credits (refunds, deposits) are rejected, as the OFX parser skips
+    credit transactions; see _is_credit for how they are recognised.
+    """
+    for row in reader:
+        line = reader.line_num
+        try:
+            raw_amount = row.get(columns['amount'])
+            if _is_credit(raw_amount, debits_negative):
+                raise ValueError("credit transaction, not an expense")
+            tags = row.get(columns['tags'], '') if 'tags' in columns else ''
+            yield {
+                'amount': _parse_amount(raw_amount),
+                'date': _parse_date(row.get(columns['date'])),
+                'category': (row.get(columns['category']) if 'category' in columns else '') or default_category,
+                'description': (row.get(columns['description']) if 'description' in columns else '') or '',
+                'tags': ','.join(tag.strip() for tag in re.split(r'[;,|]', tags or '') if tag.strip()),
+            }
+        except (ValueError, TypeError) as e:
+            report.reject(line, str(e))
+
+def _iter_ofx(handle: TextIO, default_category: str, report: ImportReport) -> Iterator[Dict]:
+    """Yield debit transactions from an OFX (SGML or XML) statement one block at a time"""
+    block: Dict[str, str] = {}
+    in_transaction = False
+    start_line = 0
+
+    for line_number, line in enumerate(handle, 1):
+        # OFX 1.x allows several tags per line and omits closing tags
+        for tag, value in re.findall(r'<(/?[A-Za-z0-9.]+)>([^<\r\n]*)', line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                in_transaction = True
+                block = {}
+                start_line = line_number
+            elif tag == '/STMTTRN':
+                in_transaction = False
+                try:
+                    # Debits carry a negative TRNAMT; credits are income, not expenses
+                    raw_amount = block.get('TRNAMT', '').strip()
+                    if raw_amount and not raw_amount.startswith('-'):
+                        raise ValueError("credit transaction, not an expense")
+                    yield {
+                        'amount': _parse_amount(raw_amount),
+                        'date': _parse_date(block.get('DTPOSTED', '')[:8]),
+                        'category': default_category,
+                        'description': block.get('NAME') or block.get('MEMO', ''),
+                        'tags': '',
+                    }
+                except ValueError as e:
+                    report.reject(start_line, str(e))
+            elif in_transaction and not tag.startswith('/'):
+                block[tag] = value.strip()
+
+def _insert(storage: Optional[StorageBackend], rows: Iterator[Dict], batch_size: int, user_id: int) -> int:
+    """Insert through the storage backend, or into the local database without one"""
+    if storage is None:
+        return insert_expenses(rows, batch_size=batch_size, user_id=user_id)
+    return storage.insert_expenses(rows, batch_size=batch_size, user_id=user_id)
+
+def import_csv(source: Union[str, TextIO], column_map: Optional[Dict[str, str]] = None,
+               default_category: str = 'Other', batch_size: int = 1000,
+               user_id: int = DEFAULT_USER_ID, debits_negative: bool = True,
+               storage: Optional[StorageBackend] = None) -> ImportReport:
+    """Stream a CSV bank statement into a user's expenses
+
+    column_map overrides header detection, e.g. {'amount': 'Debit', 'date': 'Txn Date'}.
+    debits_negative says how a signed amount column is read: True (as in
+    OFX) when spending is negative and credits positive, False when
+    spending is positive and credits negative. Rows are written through
+    storage (the local SQLite database when it is None).
+    """
+    report = ImportReport()
+    handle, owned = _open(source)
+    try:
+        reader = csv.DictReader(handle)
+        columns = _resolve_columns(reader.fieldnames or [], column_map)
+        rows = _iter_csv(reader, columns, default_category, report, debits_negative)
+        report.imported = _insert(storage, rows, batch_size, user_id)
+    except csv.Error as e:
+        report.error = f"after line {reader.line_num}: {e}"
+    except Exception as e:
+        report.error = str(e)
+    finally:
+        if owned:
+            handle.close()
+    return report
+
+def import_ofx(source: Union[str, TextIO], default_category: str = 'Other',
+               batch_size: int = 1000, user_id: int = DEFAULT_USER_ID,
+               storage: Optional[StorageBackend] = None) -> ImportReport:
+    """Stream the debit transactions of an OFX statement into a user's expenses (see import_csv for storage)"""
+    report = ImportReport()
+    handle, owned = _open(source)
+    try:
+        rows = _iter_ofx(handle, default_category, report)
+        report.imported = _insert(storage, rows, batch_size, user_id)
+    except Exception as e:
+        report.error = str(e)
+    finally:
+        if owned:
+            handle.close()
+    return report
+
+def import_statement(source: Union[str, TextIO], filename: Optional[str] = None, **kwargs) -> ImportReport:
+    """Import a CSV or OFX statement, choosing the parser from the file extension"""
+    name = (filename or (source if isinstance(source, str) else '')).lower()
+    if name.endswith(('.ofx', '.qfx')):
+        # OFX amounts are always signed the same way
+        kwargs.pop('debits_negative', None)
+        return import_ofx(source, **kwargs)
+    return import_csv(source, **kwargs)
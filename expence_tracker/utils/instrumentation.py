@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Set to 1/true/yes to record every rerun without ticking the debug panel
+DEBUG_ENV = 'SMARTSPEND_DEBUG'
+
+# Finished runs kept for export
+MAX_RECORDED_RUNS = 50
+
+logger = logging.getLogger('smartspend.timing')
+
+@dataclass
+class Span:
+    """One timed call or section within a run"""
+    name: str
+    kind: str
+    seconds: float
+    queries: int = 0
+    rows: int = 0
+    depth: int = 0
+    error: Optional[str] = None
+
+@dataclass
+class RunRecord:
+    """Everything timed during one script run"""
+    label: str = ''
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    queries: int = 0
+    rows: int = 0
+    spans: List[Span] = field(default_factory=list)
+
+    def by_kind(self) -> Dict[str, float]:
+        """Seconds spent per span kind, counting only outermost spans"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.depth == 0:
+                totals[span.kind] = totals.get(span.kind, 0.0) + span.seconds
+        return totals
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), 'by_kind': self.by_kind()}
+
+class _Recorder:
+    """Per-thread state for the run being recorded"""
+
+    def __init__(self, label: str):
+        self.record = RunRecord(label=label)
+        self.started = time.perf_counter()
+        self.depth = 0
+
+_local = threading.local()
+_runs: "deque[RunRecord]" = deque(maxlen=MAX_RECORDED_RUNS)
+_runs_lock = threading.Lock()
+
+def env_enabled() -> bool:
+    """Whether SMARTSPEND_DEBUG asks for timings on every run"""
+    return os.getenv(DEBUG_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _recorder() -> Optional[_Recorder]:
+    return getattr(_local, 'recorder', None)
+
+def is_recording() -> bool:
+    """True while a run is being recorded on this thread"""
+    return _recorder() is not None
+
+def start_run(label: str = '', enabled: bool = True):
+    """Begin recording this thread's run; with enabled=False recording is switched off"""
+    _local.recorder = _Recorder(label) if enabled else None
+
+def finish_run(label: Optional[str] = None) -> Optional[RunRecord]:
+    """Stop recording, log the run as one JSON line and keep it for export"""
+    recorder = _recorder()
+    if recorder is None:
+        return None
+    _local.recorder = None
+
+    record = recorder.record
+    record.seconds = time.perf_counter() - recorder.started
+    if label is not None:
+        record.label = label
+    with _runs_lock:
+        _runs.append(record)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record.as_dict()))
+    return record
+
+def recent_runs() -> List[RunRecord]:
+    """Finished runs, oldest first"""
+    with _runs_lock:
+        return list(_runs)
+
+def export_runs() -> str:
+    """Recent runs as JSON lines, one run per line"""
+    return '\n'.join(json.dumps(run.as_dict()) for run in recent_runs())
+
+@contextmanager
+def section(name: str, kind: str = 'section'):
+    """Time a block as a span of the current run (no-op when not recording)"""
+    recorder = _recorder()
+    if recorder is None:
+        yield
+        return
+
+    record = recorder.record
+    queries, rows = record.queries, record.rows
+    span = Span(name=name, kind=kind, seconds=0.0, depth=recorder.depth)
+    record.spans.append(span)
+    recorder.depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.seconds = time.perf_counter() - started
+        span.queries = record.queries - queries
+        span.rows = record.rows - rows
+        recorder.depth -= 1
+
+def instrumented(func: Callable = None, *, kind: str = 'query'):
+    """Record every call of a function as a span while a run is being recorded"""
+    def decorator(target: Callable):
+        name = target.__name__
+
+        @wraps(target)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, 'recorder', None) is None:
+                return target(*args, **kwargs)
+            with section(name, kind):
+                return target(*args, **kwargs)
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+def _count_statement(statement: str):
+    recorder = _recorder()
+    # Statements run by triggers are reported as "-- TRIGGER ..." comments
+    if recorder is not None and not statement.startswith('--'):
+        recorder.record.queries += 1
+
+def _counting_row_factory(cursor: sqlite3.Cursor, row: tuple) -> sqlite3.Row:
+    recorder = _recorder()
+    if recorder is not None:
+        recorder.record.rows += 1
+    return sqlite3.Row(cursor, row)
+
+def attach(conn: sqlite3.Connection) -> bool:
+    """Count queries and fetched rows on a borrowed connection while recording"""
+    if getattr(_local, 'recorder', None) is None:
+        return False
+    conn.set_trace_callback(_count_statement)
+    conn.row_factory = _counting_row_factory
+    return True
+
+def detach(conn: sqlite3.Connection):
+    """Undo attach() before the connection goes back to the pool"""
+    conn.set_trace_callback(None)
+    conn.row_factory = sqlite3.Row
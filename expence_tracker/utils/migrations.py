@@ -0,0 +1,506 @@
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from utils import data_handler
+from utils.data_handler import DEFAULT_USER_ID
+from utils.cache import bump_data_version
+
+# Rows per backfill transaction; small enough that writers are never blocked for long
+BACKFILL_BATCH_SIZE = 5000
+
+BASE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount REAL NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        description TEXT,
+        tags TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS goals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        target_amount REAL NOT NULL,
+        current_amount REAL DEFAULT 0,
+        deadline TEXT NOT NULL,
+        priority TEXT DEFAULT 'Medium',
+        description TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS savings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount REAL NOT NULL,
+        date TEXT NOT NULL,
+        source TEXT,
+        purpose TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+DATE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses(category, date)',
+    'CREATE INDEX IF NOT EXISTS idx_savings_date ON savings(date)',
+]
+
+# How far a running backfill has got: ids in (done_through, high_water] are
+# still to be read, so triggers leave those rows to the backfill
+BACKFILL_PROGRESS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS backfill_progress (
+    name TEXT PRIMARY KEY,
+    done_through INTEGER NOT NULL,
+    high_water INTEGER NOT NULL
+)
+'''
+ROLLUP_BACKFILL = 'monthly_category_rollup'
+
+# Trigger condition: the row is not waiting for the rollup backfill
+_ROLLUP_REACHED = f'''NOT EXISTS (SELECT 1 FROM backfill_progress WHERE name = '{ROLLUP_BACKFILL}'
+                     AND {{row}}.id > done_through AND {{row}}.id <= high_water)'''
+
+# Monthly per-category rollup of expenses, kept current by triggers so every
+# insert/update/delete (single, bulk or direct SQL) updates it in the same transaction
+ROLLUP_SCHEMA = [
+    BACKFILL_PROGRESS_SCHEMA,
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_category_rollup (
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        min_amount REAL,
+        max_amount REAL,
+        PRIMARY KEY (month, category)
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert AFTER INSERT ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='NEW')}
+    BEGIN
+        INSERT INTO monthly_category_rollup (month, category, total, count, min_amount, max_amount)
+        VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1, NEW.amount, NEW.amount)
+        ON CONFLICT(month, category) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            min_amount = min(min_amount, excluded.min_amount),
+            max_amount = max(max_amount, excluded.max_amount);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete AFTER DELETE ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='OLD')}
+    BEGIN
+        UPDATE monthly_category_rollup SET
+            total = total - OLD.amount,
+            count = count - 1,
+            min_amount = (SELECT MIN(amount) FROM expenses WHERE category = OLD.category
+                          AND date >= substr(OLD.date, 1, 7) || '-01'
+                          AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')),
+            max_amount = (SELECT MAX(amount) FROM expenses WHERE category = OLD.category
+                          AND date >= substr(OLD.date, 1, 7) || '-01'
+                          AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month'))
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+        DELETE FROM monthly_category_rollup
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update AFTER UPDATE OF amount, category, date ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='OLD')}
+    BEGIN
+        UPDATE monthly_category_rollup SET
+            total = total - OLD.amount,
+            count = count - 1,
+            min_amount = (SELECT MIN(amount) FROM expenses WHERE category = OLD.category
+                          AND date >= substr(OLD.date, 1, 7) || '-01'
+                          AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')),
+            max_amount = (SELECT MAX(amount) FROM expenses WHERE category = OLD.category
+                          AND date >= substr(OLD.date, 1, 7) || '-01'
+                          AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month'))
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+        DELETE FROM monthly_category_rollup
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+        INSERT INTO monthly_category_rollup (month, category, total, count, min_amount, max_amount)
+        VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1, NEW.amount, NEW.amount)
+        ON CONFLICT(month, category) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            min_amount = min(min_amount, excluded.min_amount),
+            max_amount = max(max_amount, excluded.max_amount);
+    END
+    ''',
+]
+ROLLUP_BACKFILL_SQL = '''
+INSERT INTO monthly_category_rollup (month, category, total, count, min_amount, max_amount)
+SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+FROM expenses
+WHERE id > ? AND id <= ?
+GROUP BY substr(date, 1, 7), category
+ON CONFLICT(month, category) DO UPDATE SET
+    total = total + excluded.total,
+    count = count + excluded.count,
+    min_amount = min(min_amount, excluded.min_amount),
+    max_amount = max(max_amount, excluded.max_amount)
+'''
+
+# Comma-joined expenses.tags as a JSON array. json_quote escapes quotes,
+# backslashes and control characters, and its output never contains a comma
+# other than the tags' own, so the array is always valid
+_TAGS_JSON = """'[' || replace(json_quote({col}), ',', '","') || ']'"""
+# A tag stripped of surrounding whitespace, as the importer and the analysis strip it
+_TAG_VALUE = "trim(value, ' ' || char(9, 10, 13))"
+
+# One row per (expense, tag), kept in sync with expenses.tags by triggers
+TAGS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS expense_tags (
+        expense_id INTEGER NOT NULL,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (expense_id, tag)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_expense_tags_tag ON expense_tags(tag, expense_id)',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_insert AFTER INSERT ON expenses
+    WHEN NEW.tags IS NOT NULL AND NEW.tags != ''
+    BEGIN
+        INSERT OR IGNORE INTO expense_tags (expense_id, tag)
+        SELECT NEW.id, {_TAG_VALUE} FROM json_each({_TAGS_JSON.format(col='NEW.tags')})
+        WHERE {_TAG_VALUE} != '';
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_update AFTER UPDATE OF tags ON expenses
+    BEGIN
+        DELETE FROM expense_tags WHERE expense_id = OLD.id;
+        INSERT OR IGNORE INTO expense_tags (expense_id, tag)
+        SELECT NEW.id, {_TAG_VALUE} FROM json_each({_TAGS_JSON.format(col="COALESCE(NEW.tags, '')")})
+        WHERE {_TAG_VALUE} != '';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_delete AFTER DELETE ON expenses
+    BEGIN
+        DELETE FROM expense_tags WHERE expense_id = OLD.id;
+    END
+    ''',
+]
+
+TAGS_BACKFILL_SQL = f'''
+INSERT OR IGNORE INTO expense_tags (expense_id, tag)
+SELECT e.id, {_TAG_VALUE} FROM expenses e, json_each({_TAGS_JSON.format(col='e.tags')})
+WHERE e.id > ? AND e.id <= ? AND e.tags IS NOT NULL AND e.tags != '' AND {_TAG_VALUE} != ''
+'''
+
+USERS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    f"INSERT OR IGNORE INTO users (id, name) VALUES ({DEFAULT_USER_ID}, 'Default')",
+]
+
+# Every hot query filters on user_id first, so each index leads with it
+USER_INDEXES = [
+    'DROP INDEX IF EXISTS idx_expenses_date',
+    'DROP INDEX IF EXISTS idx_expenses_category_date',
+    'DROP INDEX IF EXISTS idx_savings_date',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses(user_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses(user_id, category, date)',
+    'CREATE INDEX IF NOT EXISTS idx_savings_user_date ON savings(user_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_goals_user ON goals(user_id)',
+]
+
+DROP_DERIVED_TABLES = [
+    'DROP TRIGGER IF EXISTS trg_expenses_rollup_insert',
+    'DROP TRIGGER IF EXISTS trg_expenses_rollup_delete',
+    'DROP TRIGGER IF EXISTS trg_expenses_rollup_update',
+    'DROP TRIGGER IF EXISTS trg_expenses_tags_insert',
+    'DROP TRIGGER IF EXISTS trg_expenses_tags_update',
+    'DROP TRIGGER IF EXISTS trg_expenses_tags_delete',
+    'DROP TABLE IF EXISTS monthly_category_rollup',
+    'DROP TABLE IF EXISTS expense_tags',
+]
+
+# Same min/max recomputation as ROLLUP_SCHEMA, limited to the old row's user
+_OLD_MONTH_EXTREME = '''(SELECT {fn}(amount) FROM expenses WHERE user_id = OLD.user_id AND category = OLD.category
+                          AND date >= substr(OLD.date, 1, 7) || '-01'
+                          AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month'))'''
+
+_ROLLUP_REMOVE_OLD = f'''
+        UPDATE monthly_category_rollup SET
+            total = total - OLD.amount,
+            count = count - 1,
+            min_amount = {_OLD_MONTH_EXTREME.format(fn='MIN')},
+            max_amount = {_OLD_MONTH_EXTREME.format(fn='MAX')}
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category;
+        DELETE FROM monthly_category_rollup
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category
+          AND count <= 0;'''
+
+_ROLLUP_ADD_NEW = '''
+        INSERT INTO monthly_category_rollup (user_id, month, category, total, count, min_amount, max_amount)
+        VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1, NEW.amount, NEW.amount)
+        ON CONFLICT(user_id, month, category) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            min_amount = min(min_amount, excluded.min_amount),
+            max_amount = max(max_amount, excluded.max_amount);'''
+
+USER_ROLLUP_SCHEMA = [
+    BACKFILL_PROGRESS_SCHEMA,
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_category_rollup (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        min_amount REAL,
+        max_amount REAL,
+        PRIMARY KEY (user_id, month, category)
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert AFTER INSERT ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='NEW')}
+    BEGIN{_ROLLUP_ADD_NEW}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete AFTER DELETE ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='OLD')}
+    BEGIN{_ROLLUP_REMOVE_OLD}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+    AFTER UPDATE OF amount, category, date, user_id ON expenses
+    WHEN {_ROLLUP_REACHED.format(row='OLD')}
+    BEGIN{_ROLLUP_REMOVE_OLD}{_ROLLUP_ADD_NEW}
+    END
+    ''',
+]
+
+USER_ROLLUP_BACKFILL_SQL = '''
+INSERT INTO monthly_category_rollup (user_id, month, category, total, count, min_amount, max_amount)
+SELECT user_id, substr(date, 1, 7), category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+FROM expenses
+WHERE id > ? AND id <= ?
+GROUP BY user_id, substr(date, 1, 7), category
+ON CONFLICT(user_id, month, category) DO UPDATE SET
+    total = total + excluded.total,
+    count = count + excluded.count,
+    min_amount = min(min_amount, excluded.min_amount),
+    max_amount = max(max_amount, excluded.max_amount)
+'''
+
+USER_TAGS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS expense_tags (
+        expense_id INTEGER NOT NULL,
+        tag TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (expense_id, tag)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_expense_tags_user_tag ON expense_tags(user_id, tag, expense_id)',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_insert AFTER INSERT ON expenses
+    WHEN NEW.tags IS NOT NULL AND NEW.tags != ''
+    BEGIN
+        INSERT OR IGNORE INTO expense_tags (expense_id, tag, user_id)
+        SELECT NEW.id, {_TAG_VALUE}, NEW.user_id FROM json_each({_TAGS_JSON.format(col='NEW.tags')})
+        WHERE {_TAG_VALUE} != '';
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_update AFTER UPDATE OF tags, user_id ON expenses
+    BEGIN
+        DELETE FROM expense_tags WHERE expense_id = OLD.id;
+        INSERT OR IGNORE INTO expense_tags (expense_id, tag, user_id)
+        SELECT NEW.id, {_TAG_VALUE}, NEW.user_id FROM json_each({_TAGS_JSON.format(col="COALESCE(NEW.tags, '')")})
+        WHERE {_TAG_VALUE} != '';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_tags_delete AFTER DELETE ON expenses
+    BEGIN
+        DELETE FROM expense_tags WHERE expense_id = OLD.id;
+    END
+    ''',
+]
+
+USER_TAGS_BACKFILL_SQL = f'''
+INSERT OR IGNORE INTO expense_tags (expense_id, tag, user_id)
+SELECT e.id, {_TAG_VALUE}, e.user_id FROM expenses e, json_each({_TAGS_JSON.format(col='e.tags')})
+WHERE e.id > ? AND e.id <= ? AND e.tags IS NOT NULL AND e.tags != '' AND {_TAG_VALUE} != ''
+'''
+
+@dataclass
+class Migration:
+    """One schema version step
+
+    schema runs inside the step's transaction and may return a high-water
+    mark (e.g. the largest expense id when a trigger was installed).
+    backfill then runs in small committed batches up to that mark; rows
+    written afterwards are already handled by the new triggers. Triggers
+    whose effect the backfill would repeat skip rows it has not reached
+    yet (see backfill_progress). Both must be safe to re-run if the
+    process stops halfway.
+    """
+    version: int
+    name: str
+    schema: Callable[[sqlite3.Connection], Optional[int]]
+    backfill: Optional[Callable[[sqlite3.Connection, int, int], None]] = None
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """BEGIN IMMEDIATE ... COMMIT, rolling back on error"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+def _execute_all(conn: sqlite3.Connection, statements: List[str]):
+    for statement in statements:
+        conn.execute(statement)
+
+def _max_expense_id(conn: sqlite3.Connection) -> int:
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM expenses').fetchone()[0]
+
+def _start_backfill(conn: sqlite3.Connection, name: str) -> int:
+    """Record a backfill starting from the first expense, returning its high-water mark"""
+    high_water = _max_expense_id(conn)
+    conn.execute('INSERT OR REPLACE INTO backfill_progress (name, done_through, high_water) VALUES (?, 0, ?)',
+                 (name, high_water))
+    return high_water
+
+def _backfill_by_id(sql: str, progress: Optional[str] = None) -> Callable[[sqlite3.Connection, int, int], None]:
+    """Run an (id > ? AND id <= ?) backfill statement over expenses in batches
+
+    With progress, the backfill_progress row of that name is advanced with
+    each batch and removed at the end.
+    """
+    def backfill(conn: sqlite3.Connection, high_water: int, batch_size: int):
+        low = 0
+        while low < high_water:
+            high = min(low + batch_size, high_water)
+            with _transaction(conn):
+                conn.execute(sql, (low, high))
+                if progress:
+                    conn.execute('UPDATE backfill_progress SET done_through = ? WHERE name = ?', (high, progress))
+            low = high
+        if progress:
+            with _transaction(conn):
+                conn.execute('DELETE FROM backfill_progress WHERE name = ?', (progress,))
+    return backfill
+
+def _rollup_schema(conn: sqlite3.Connection) -> int:
+    _execute_all(conn, ROLLUP_SCHEMA)
+    # Start from empty so an interrupted backfill can simply run again
+    conn.execute('DELETE FROM monthly_category_rollup')
+    return _start_backfill(conn, ROLLUP_BACKFILL)
+
+def _tags_schema(conn: sqlite3.Connection) -> int:
+    _execute_all(conn, TAGS_SCHEMA)
+    return _max_expense_id(conn)
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """ALTER TABLE ... ADD COLUMN unless an interrupted run already added it"""
+    existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    if column not in existing:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _users_schema(conn: sqlite3.Connection) -> int:
+    _execute_all(conn, USERS_SCHEMA)
+    for table in ('expenses', 'goals', 'savings'):
+        _add_column(conn, table, 'user_id', f'INTEGER NOT NULL DEFAULT {DEFAULT_USER_ID}')
+    _execute_all(conn, USER_INDEXES)
+    # The rollup and tag tables gain user_id in their keys, so rebuild them
+    _execute_all(conn, DROP_DERIVED_TABLES)
+    _execute_all(conn, USER_ROLLUP_SCHEMA)
+    _execute_all(conn, USER_TAGS_SCHEMA)
+    return _start_backfill(conn, ROLLUP_BACKFILL)
+
+def _users_backfill(conn: sqlite3.Connection, high_water: int, batch_size: int):
+    _backfill_by_id(USER_ROLLUP_BACKFILL_SQL, ROLLUP_BACKFILL)(conn, high_water, batch_size)
+    _backfill_by_id(USER_TAGS_BACKFILL_SQL)(conn, high_water, batch_size)
+
+def _tag_split_schema(conn: sqlite3.Connection) -> int:
+    # Earlier tag triggers dropped every tag of a row whose tags broke the JSON round trip
+    conn.execute('DROP TRIGGER IF EXISTS trg_expenses_tags_insert')
+    conn.execute('DROP TRIGGER IF EXISTS trg_expenses_tags_update')
+    _execute_all(conn, USER_TAGS_SCHEMA)
+    conn.execute('DELETE FROM expense_tags')
+    return _max_expense_id(conn)
+
+MIGRATIONS = [
+    Migration(1, "base tables", lambda conn: _execute_all(conn, BASE_SCHEMA)),
+    Migration(2, "date indexes", lambda conn: _execute_all(conn, DATE_INDEXES)),
+    Migration(3, "monthly category rollup", _rollup_schema, _backfill_by_id(ROLLUP_BACKFILL_SQL, ROLLUP_BACKFILL)),
+    Migration(4, "expense tags", _tags_schema, _backfill_by_id(TAGS_BACKFILL_SQL)),
+    Migration(5, "per-user partitioning", _users_schema, _users_backfill),
+    Migration(6, "tag splitting for any tag text", _tag_split_schema, _backfill_by_id(USER_TAGS_BACKFILL_SQL)),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Schema version recorded in the database header"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def pending_migrations(database: Optional[str] = None) -> List[Migration]:
+    """Migrations not yet applied to the database"""
+    conn = data_handler.get_db_connection(database)
+    try:
+        version = schema_version(conn)
+    finally:
+        conn.close()
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+def migrate(database: Optional[str] = None, target: Optional[int] = None,
+            batch_size: int = BACKFILL_BATCH_SIZE, verbose: bool = False) -> int:
+    """Apply pending migrations in order, returning the resulting schema version"""
+    # Autocommit mode so every step controls its own transactions
+    conn = data_handler.get_db_connection(database)
+    conn.isolation_level = None
+    try:
+        version = schema_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version or (target is not None and migration.version > target):
+                continue
+            if verbose:
+                print(f"Applying migration {migration.version}: {migration.name}")
+
+            with _transaction(conn):
+                high_water = migration.schema(conn)
+                if migration.backfill is None:
+                    conn.execute(f'PRAGMA user_version = {migration.version:d}')
+
+            if migration.backfill is not None:
+                migration.backfill(conn, high_water or 0, batch_size)
+                with _transaction(conn):
+                    conn.execute(f'PRAGMA user_version = {migration.version:d}')
+
+            version = migration.version
+        return version
+    finally:
+        conn.close()
+        bump_data_version()
@@ -0,0 +1,147 @@
+from dataclasses import dataclass, fields
+from sys import intern
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Rows fetched per cursor.fetchmany() call by fetch_columns
+COLUMN_BATCH_SIZE = 50_000
+
+# How fetch_columns stores each column; other columns become object arrays
+COLUMN_DTYPES = {
+    'id': np.int64,
+    'user_id': np.int64,
+    'amount': np.float64,
+    'target_amount': np.float64,
+    'current_amount': np.float64,
+    'date': 'datetime64[D]',
+    'deadline': 'datetime64[D]',
+}
+# Low-cardinality text columns, returned as dictionary-encoded pandas Categoricals
+DICTIONARY_COLUMNS = {'category', 'tags', 'source', 'priority', 'status'}
+
+class _Record:
+    """Mapping-style access, so records work wherever row dicts were used"""
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def keys(self) -> List[str]:
+        return [field.name for field in fields(self)]
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def copy(self):
+        """A separate record with the same values"""
+        return type(self)(*(getattr(self, name) for name in self.__slots__))
+
+@dataclass(slots=True)
+class Expense(_Record):
+    """One expenses row"""
+    id: int
+    amount: float
+    category: str
+    date: str
+    description: Optional[str] = None
+    tags: Optional[str] = None
+    created_at: Optional[str] = None
+    user_id: int = 1
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "Expense":
+        """Build from a row selected as EXPENSE_FIELDS, sharing repeated strings"""
+        id, amount, category, date, description, tags, created_at, user_id = row
+        # Categories, dates and tags repeat across rows; keep one copy of each
+        return cls(id, amount, intern(category), intern(date), description,
+                   intern(tags) if tags else tags, created_at, user_id)
+
+@dataclass(slots=True)
+class Goal(_Record):
+    """One goals row"""
+    id: int
+    name: str
+    target_amount: float
+    current_amount: float = 0.0
+    deadline: Optional[str] = None
+    priority: str = 'Medium'
+    description: Optional[str] = None
+    status: str = 'active'
+    created_at: Optional[str] = None
+    user_id: int = 1
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "Goal":
+        """Build from a row selected as GOAL_FIELDS"""
+        return cls(*row)
+
+@dataclass(slots=True)
+class Saving(_Record):
+    """One savings row"""
+    id: int
+    amount: float
+    date: str
+    source: Optional[str] = None
+    purpose: Optional[str] = None
+    created_at: Optional[str] = None
+    user_id: int = 1
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "Saving":
+        """Build from a row selected as SAVING_FIELDS"""
+        id, amount, date, source, purpose, created_at, user_id = row
+        return cls(id, amount, intern(date), intern(source) if source else source, purpose, created_at, user_id)
+
+# Column lists to SELECT for each record type, in constructor order
+EXPENSE_FIELDS = tuple(field.name for field in fields(Expense))
+GOAL_FIELDS = tuple(field.name for field in fields(Goal))
+SAVING_FIELDS = tuple(field.name for field in fields(Saving))
+
+def to_columns(records: Sequence[_Record], names: Optional[Sequence[str]] = None) -> Dict[str, list]:
+    """Column lists from records, e.g. for pd.DataFrame, without a dict per row"""
+    if names is None:
+        names = records[0].keys() if records else []
+    return {name: [getattr(record, name) for record in records] for name in names}
+
+def _column(name: str, chunks: List[np.ndarray], dictionary: Optional[Dict]):
+    if dictionary is not None:
+        # Imported on first use; record reads alone don't need pandas
+        import pandas as pd
+        codes = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+        return pd.Categorical.from_codes(codes, categories=list(dictionary))
+    dtype = COLUMN_DTYPES.get(name, object)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+
+def fetch_columns(cursor, names: Sequence[str], batch_size: int = COLUMN_BATCH_SIZE) -> Dict:
+    """Read an executed cursor into one array per column
+
+    names are the selected columns, in order. Numeric and date columns
+    become typed NumPy arrays (see COLUMN_DTYPES), DICTIONARY_COLUMNS become
+    pandas Categoricals (NULL is a missing value) and anything else an object
+    array. Rows are converted batch_size at a time and then dropped.
+    """
+    chunks: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+    dictionaries = {name: {} for name in names if name in DICTIONARY_COLUMNS}
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for name, values in zip(names, zip(*rows)):
+            dictionary = dictionaries.get(name)
+            if dictionary is not None:
+                codes = (-1 if value is None else dictionary.setdefault(value, len(dictionary)) for value in values)
+                chunks[name].append(np.fromiter(codes, dtype=np.int32, count=len(values)))
+            else:
+                chunks[name].append(np.array(values, dtype=COLUMN_DTYPES.get(name, object)))
+    return {name: _column(name, chunks[name], dictionaries.get(name)) for name in names}
+
+def empty_columns(names: Iterable[str]) -> Dict:
+    """The fetch_columns result for no rows"""
+    return {name: _column(name, [], {} if name in DICTIONARY_COLUMNS else None) for name in names}
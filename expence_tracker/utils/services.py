@@ -0,0 +1,262 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.ai_helper import CATEGORY_CHANGE_DAYS, smart_ai
+from utils.analysis_engine import FinanceMetrics, compute_metrics, lttb_indices, metrics_from_rollup
+from utils.cache import LRUCache, data_version
+from utils.data_handler import DEFAULT_USER_ID, month_bounds
+from utils.instrumentation import instrumented
+from utils.snapshot import get_snapshot, metrics_inputs, snapshot_enabled
+from utils.storage import SQLiteBackend, StorageBackend
+
+# Insights periods and how many days back each one starts (None = all time)
+PERIOD_DAYS = {
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 3 months": 90,
+    "Last 6 months": 180,
+    "All time": None,
+}
+PERIODS = list(PERIOD_DAYS)
+CHART_TYPES = ["Category Breakdown", "Monthly Trend", "Daily Spending", "Category Comparison"]
+
+# Longest span (days) charted per day and per week; longer spans are charted per month
+MAX_DAILY_SPAN = 366
+MAX_WEEKLY_SPAN = 7 * 366
+RESOLUTION_LABELS = {'day': "Daily", 'week': "Weekly", 'month': "Monthly"}
+
+# Points per chart trace after downsampling
+MAX_CHART_POINTS = 300
+
+# Distinct service results kept; entries for old data versions age out
+MAX_MEMOIZED_RESULTS = 64
+
+_results = LRUCache(max_entries=MAX_MEMOIZED_RESULTS, ttl_seconds=None)
+_MISSING = object()
+
+def memoized(func: Callable):
+    """Reuse a service result until the next write (or midnight)
+
+    Only backends that record every write in the data version are memoized;
+    results are shared between callers and must be treated as read-only.
+    """
+    @wraps(func)
+    def wrapper(storage: StorageBackend, *args, **kwargs):
+        if not storage.caches_reads:
+            return func(storage, *args, **kwargs)
+        key = (func.__name__, storage, args, tuple(sorted(kwargs.items())),
+               data_version(), date.today().toordinal())
+        result = _results.get(key, _MISSING)
+        if result is _MISSING:
+            result = func(storage, *args, **kwargs)
+            _results.set(key, result)
+        return result
+    return wrapper
+
+def clear_results():
+    """Forget every memoized service result"""
+    _results.clear()
+
+@dataclass(frozen=True)
+class SidebarStats:
+    """Numbers shown in the sidebar on every page"""
+    monthly_total: float
+    daily_average: float
+    expense_summary: Dict[str, float]
+    quick_insight: Optional[str] = None
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    """Everything the Dashboard page renders"""
+    total_expenses: float
+    total_savings: float
+    active_goals: int
+    completed_goals: int
+    recent_expenses: List[Dict]
+    categories: List[str]
+    month_categories: Dict[str, float]
+    monthly_trend: List[Tuple[str, float]]
+
+@dataclass(frozen=True)
+class InsightsResult:
+    """Metrics and chart series for one Insights period and chart type
+
+    Only the series the chart type needs is filled in. spending_trend holds
+    totals per resolution bucket (day, week or month), downsampled to at
+    most MAX_CHART_POINTS points. category_comparison compares the period
+    with the one before it and is empty for "All time".
+    """
+    period: str
+    chart_type: str
+    start: Optional[str]
+    total: float
+    transaction_count: int
+    active_days: int
+    category_totals: List[Tuple[str, float]] = field(default_factory=list)
+    monthly_totals: List[Tuple[str, float]] = field(default_factory=list)
+    resolution: str = 'day'
+    spending_trend: List[Tuple[str, float]] = field(default_factory=list)
+    category_comparison: List[Dict] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.transaction_count == 0
+
+    @property
+    def average_daily(self) -> float:
+        """Spend per day that had any spend"""
+        return self.total / max(self.active_days, 1)
+
+    @property
+    def average_transaction(self) -> float:
+        return self.total / self.transaction_count if self.transaction_count else 0.0
+
+@dataclass(frozen=True)
+class AnalysisInputs:
+    """Totals the Smart Analysis page and the analysis text are built from"""
+    expense_summary: Dict[str, float]
+    total_expenses: float
+    total_savings: float
+    goals: List[Dict]
+
+    @property
+    def savings_rate(self) -> float:
+        """Savings as a percentage of expenses"""
+        return (self.total_savings / self.total_expenses * 100) if self.total_expenses > 0 else 0.0
+
+def period_start(period: str, today: Optional[date] = None) -> Optional[str]:
+    """First day (YYYY-MM-DD) of an Insights period, or None for all time"""
+    days = PERIOD_DAYS.get(period)
+    if days is None:
+        return None
+    return ((today or date.today()) - timedelta(days=days)).isoformat()
+
+def chart_resolution(first_day: Optional[str], today: Optional[date] = None) -> str:
+    """'day', 'week' or 'month' buckets for a chart starting on first_day, by how long the span is"""
+    if not first_day:
+        return 'day'
+    span = ((today or date.today()) - date.fromisoformat(first_day)).days + 1
+    if span <= MAX_DAILY_SPAN:
+        return 'day'
+    if span <= MAX_WEEKLY_SPAN:
+        return 'week'
+    return 'month'
+
+def downsample(points: List[Tuple[str, float]], max_points: int = MAX_CHART_POINTS) -> List[Tuple[str, float]]:
+    """Keep at most max_points of a (YYYY-MM-DD, value) series, preserving its peaks"""
+    if len(points) <= max_points:
+        return points
+    days = np.array([day for day, _ in points], dtype='datetime64[D]').astype(np.int64)
+    values = np.fromiter((value for _, value in points), dtype=np.float64, count=len(points))
+    return [points[i] for i in lttb_indices(days, values, max_points)]
+
+@instrumented(kind='service')
+@memoized
+def sidebar_stats(storage: StorageBackend, user_id: int = DEFAULT_USER_ID) -> SidebarStats:
+    """This month's spend, the daily average so far and a quick insight"""
+    now = datetime.now()
+    month_start, month_end = month_bounds(now.strftime('%Y-%m'))
+    monthly_total = storage.total_expenses(month_start, month_end, user_id=user_id)
+    expense_summary = storage.sum_by_category(user_id=user_id)
+
+    quick_insight = smart_ai.get_quick_insight(expense_summary) if expense_summary else None
+    return SidebarStats(
+        monthly_total=monthly_total,
+        daily_average=monthly_total / now.day,
+        expense_summary=expense_summary,
+        quick_insight=quick_insight
+    )
+
+@instrumented(kind='service')
+@memoized
+def dashboard_snapshot(storage: StorageBackend, user_id: int = DEFAULT_USER_ID) -> DashboardSnapshot:
+    """Totals, goal counts, recent transactions and this month's breakdown"""
+    month_start, month_end = month_bounds(datetime.now().strftime('%Y-%m'))
+    goals = storage.get_goals(user_id=user_id)
+    recent_expenses, _ = storage.list_expenses(limit=5, user_id=user_id)
+    return DashboardSnapshot(
+        total_expenses=storage.total_expenses(user_id=user_id),
+        total_savings=storage.total_savings(user_id=user_id),
+        active_goals=sum(1 for goal in goals if goal['status'] == 'active'),
+        completed_goals=sum(1 for goal in goals if goal['status'] == 'achieved'),
+        recent_expenses=recent_expenses,
+        categories=sorted(storage.sum_by_category(user_id=user_id)),
+        month_categories=storage.sum_by_category(month_start, month_end, user_id=user_id),
+        monthly_trend=storage.totals_by_month(6, user_id=user_id)
+    )
+
+@instrumented(kind='service')
+@memoized
+def insights(storage: StorageBackend, period: str, chart_type: str,
+             user_id: int = DEFAULT_USER_ID) -> InsightsResult:
+    """Period metrics plus the series for chart_type, aggregated by the database"""
+    start = period_start(period)
+    stats = storage.expense_stats(start, user_id=user_id)
+    series = {}
+    if stats['count']:
+        if chart_type == "Category Breakdown":
+            series['category_totals'] = list(storage.sum_by_category(start, user_id=user_id).items())
+        elif chart_type == "Monthly Trend":
+            series['monthly_totals'] = storage.totals_by_bucket('month', start, user_id=user_id)
+        elif chart_type == "Daily Spending":
+            # Coarser buckets for longer spans, then cap the points sent to the browser
+            resolution = chart_resolution(start or stats['first'])
+            series['resolution'] = resolution
+            series['spending_trend'] = downsample(storage.totals_by_bucket(resolution, start, user_id=user_id))
+        elif chart_type == "Category Comparison" and start is not None:
+            series['category_comparison'] = storage.compare_category_periods(start, user_id=user_id)
+    return InsightsResult(
+        period=period,
+        chart_type=chart_type,
+        start=start,
+        total=stats['total'],
+        transaction_count=stats['count'],
+        active_days=stats['days'],
+        **series
+    )
+
+@instrumented(kind='service')
+@memoized
+def analysis_inputs(storage: StorageBackend, user_id: int = DEFAULT_USER_ID) -> AnalysisInputs:
+    """Category totals, overall totals and goals for the Smart Analysis page"""
+    return AnalysisInputs(
+        expense_summary=storage.sum_by_category(user_id=user_id),
+        total_expenses=storage.total_expenses(user_id=user_id),
+        total_savings=storage.total_savings(user_id=user_id),
+        goals=storage.get_goals(user_id=user_id)
+    )
+
+@instrumented(kind='service')
+@memoized
+def analysis_metrics(storage: StorageBackend, user_id: int = DEFAULT_USER_ID) -> FinanceMetrics:
+    """Monthly trends, tag totals and recent category changes for the full analysis
+
+    With SMARTSPEND_SNAPSHOT set and the SQLite backend, metrics are computed
+    from the columnar snapshot (refreshed first); otherwise from the
+    backend's monthly rollup.
+    """
+    recent_start = (date.today() - timedelta(days=CATEGORY_CHANGE_DAYS)).isoformat()
+    savings = storage.savings_by_month(user_id=user_id)
+    category_changes = storage.compare_category_periods(recent_start, user_id=user_id)
+
+    # The snapshot is a copy of the local SQLite database only
+    use_snapshot = isinstance(storage, SQLiteBackend) and snapshot_enabled()
+    table = get_snapshot().fresh(user_id) if use_snapshot else None
+    if table is not None:
+        metrics = compute_metrics(
+            **metrics_inputs(table),
+            savings_amounts=[total for _, total in savings],
+            savings_dates=[f"{month}-01" for month, _ in savings]
+        )
+        metrics.category_changes = category_changes
+        return metrics
+    return metrics_from_rollup(
+        storage.rollup(user_id=user_id),
+        savings,
+        storage.totals_by_tag(user_id=user_id),
+        category_changes
+    )
@@ -0,0 +1,331 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from utils import data_handler
+from utils.models import fetch_columns
+
+# pyarrow modules, imported by load_pyarrow() the first time a snapshot is used
+pa = None
+pc = None
+
+# Set to 1/true/yes to run the full analysis on the snapshot instead of SQL aggregates
+SNAPSHOT_ENV = 'SMARTSPEND_SNAPSHOT'
+# Directory for segments and the manifest (default: <database>.snapshot)
+SNAPSHOT_DIR_ENV = 'SMARTSPEND_SNAPSHOT_DIR'
+
+MANIFEST_NAME = 'manifest.json'
+# Held while a refresh reads the manifest, writes a segment and replaces the manifest
+LOCK_NAME = 'refresh.lock'
+# Bump when the segment layout changes; older snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+# Rows fetched per batch, and per record batch in segment files
+REFRESH_BATCH_SIZE = 100_000
+# refresh(compact=True) merges the segments into one once there are more than this
+MAX_SEGMENTS = 16
+
+SNAPSHOT_COLUMNS = ('id', 'user_id', 'date', 'category', 'amount', 'tags')
+SNAPSHOT_SQL = '''
+    SELECT id, user_id, date, category, amount, COALESCE(tags, '') AS tags
+    FROM expenses WHERE id > ? ORDER BY id
+'''
+
+def _schema() -> "pa.Schema":
+    return pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int32()),
+        ('date', pa.date32()),
+        ('category', pa.dictionary(pa.int32(), pa.string())),
+        ('amount', pa.float64()),
+        ('tags', pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+def _empty_manifest() -> Dict:
+    return {'format': SNAPSHOT_FORMAT, 'generation': 0, 'max_id': 0, 'rows': 0, 'segments': []}
+
+def load_pyarrow() -> bool:
+    """Import pyarrow if it is installed; False if it is not"""
+    global pa, pc
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+        except ImportError:
+            return False
+        pa, pc = pyarrow, pyarrow.compute
+    return True
+
+# Whether snapshot_enabled() has already said pyarrow is missing
+_reported_missing = False
+
+def snapshot_enabled() -> bool:
+    """Whether SMARTSPEND_SNAPSHOT is set and pyarrow is installed"""
+    global _reported_missing
+    if os.getenv(SNAPSHOT_ENV, '').strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return False
+    if load_pyarrow():
+        return True
+    if not _reported_missing:
+        print(f"{SNAPSHOT_ENV} is set but pyarrow is not installed (pip install pyarrow); using SQL aggregates")
+        _reported_missing = True
+    return False
+
+def _dictionary_array(values) -> "pa.DictionaryArray":
+    """Arrow dictionary array sharing a Categorical's codes and categories"""
+    return pa.DictionaryArray.from_arrays(
+        pa.array(values.codes.astype(np.int32)),
+        pa.array(values.categories.to_numpy(dtype=object), pa.string())
+    )
+
+def _snapshot_table(columns: Dict) -> "pa.Table":
+    """Turn models.fetch_columns output for SNAPSHOT_COLUMNS into a typed table"""
+    return pa.table([
+        pa.array(columns['id']),
+        pa.array(columns['user_id']).cast(pa.int32()),
+        pa.array(columns['date']).cast(pa.date32()),
+        _dictionary_array(columns['category']),
+        pa.array(columns['amount']),
+        _dictionary_array(columns['tags']),
+    ], schema=_schema())
+
+def _lock_file(handle):
+    """Block until this process holds an exclusive lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+def _unlock_file(handle):
+    if fcntl is not None:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def metrics_inputs(table: "pa.Table") -> Dict:
+    """Snapshot columns as the keyword arguments analysis_engine.compute_metrics takes
+
+    Categories and tags stay dictionary-encoded (pandas Categoricals), and
+    dates come out as datetime64[D] without parsing.
+    """
+    return {
+        'amounts': table['amount'].to_numpy(),
+        'categories': table['category'].to_pandas(),
+        'dates': table['date'].to_numpy(),
+        'tags': table['tags'].to_pandas(),
+    }
+
+class SnapshotStore:
+    """Append-only Arrow IPC copy of the expenses table for analytics reads
+
+    Each refresh writes the rows with ids above the manifest's max_id as a
+    new segment file, and load() memory-maps the segments so columns are
+    read straight from the page cache. Segments are sorted by user_id and
+    the manifest records each user's row range in them, so load(user_id)
+    slices that user's rows instead of filtering everyone's. The app only ever inserts expenses;
+    if a refresh finds a different number of rows at or below max_id (e.g.
+    after deletes) it rebuilds the snapshot. Edits to existing rows are
+    only picked up by rebuild().
+
+    Refreshes hold a lock file in the directory, so the app and the
+    manage.py command can refresh the same store from separate processes.
+    Merging segments is left to refresh(compact=True) and compact(), which
+    manage.py runs, so page renders never rewrite the whole snapshot.
+    """
+
+    def __init__(self, database: Optional[str] = None, directory: Optional[str] = None):
+        if not load_pyarrow():
+            raise RuntimeError("The analytics snapshot requires pyarrow (pip install pyarrow)")
+        self.database = database or data_handler.DATABASE_NAME
+        self.directory = directory or os.getenv(SNAPSHOT_DIR_ENV) or f"{self.database}.snapshot"
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def manifest(self) -> Dict:
+        """The current manifest (an empty one if there is no usable snapshot)"""
+        try:
+            with open(self._path(MANIFEST_NAME)) as handle:
+                manifest = json.load(handle)
+        except (FileNotFoundError, ValueError):
+            return _empty_manifest()
+        return manifest if manifest.get('format') == SNAPSHOT_FORMAT else _empty_manifest()
+
+    def _write_manifest(self, manifest: Dict):
+        manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        temp = self._path(MANIFEST_NAME + '.tmp')
+        with open(temp, 'w') as handle:
+            json.dump(manifest, handle, indent=2)
+        os.replace(temp, self._path(MANIFEST_NAME))
+
+    def _write_segment(self, table: "pa.Table", manifest: Dict) -> Dict:
+        """Write table, sorted by user, as the next segment file, returning its manifest entry"""
+        manifest['generation'] += 1
+        name = f"segment-{manifest['generation']:06d}.arrow"
+        temp = self._path(name + '.tmp')
+        # An IPC file needs one dictionary per column across all its batches
+        table = table.sort_by([('user_id', 'ascending'), ('id', 'ascending')]).unify_dictionaries()
+        user_ids, starts, counts = np.unique(
+            table['user_id'].to_numpy(), return_index=True, return_counts=True
+        )
+        ids = pc.min_max(table['id'])
+        with pa.OSFile(temp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=REFRESH_BATCH_SIZE)
+        os.replace(temp, self._path(name))
+        return {
+            'file': name,
+            'min_id': ids['min'].as_py(),
+            'max_id': ids['max'].as_py(),
+            'rows': table.num_rows,
+            # JSON object keys are strings; [first row, row count] per user
+            'users': {
+                str(user): [int(start), int(count)]
+                for user, start, count in zip(user_ids, starts, counts)
+            },
+        }
+
+    @contextmanager
+    def _refresh_lock(self):
+        """Hold the refresh lock, across threads and processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path(LOCK_NAME), 'a+b') as handle:
+            _lock_file(handle)
+            try:
+                yield
+            finally:
+                _unlock_file(handle)
+
+    def _remove_unused(self, manifest: Dict):
+        """Delete segment files the manifest no longer lists"""
+        keep = {segment['file'] for segment in manifest['segments']}
+        for name in os.listdir(self.directory):
+            if name.endswith('.arrow') and name not in keep:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    # Still mapped by a reader (Windows); removed by a later refresh
+                    pass
+
+    def refresh(self, full: bool = False, batch_size: int = REFRESH_BATCH_SIZE,
+                compact: bool = False) -> Optional[Dict]:
+        """Append expenses added since the last refresh (everything with full=True)
+
+        With compact=True, also merge the segments into one once there are
+        more than MAX_SEGMENTS. Returns counts of what changed, or None on error.
+        """
+        try:
+            with self._refresh_lock():
+                manifest = self.manifest()
+                conn = data_handler.get_db_connection(self.database)
+                try:
+                    rebuilt = full
+                    if not full and manifest['rows']:
+                        count = conn.execute(
+                            'SELECT COUNT(*) FROM expenses WHERE id <= ?', (manifest['max_id'],)
+                        ).fetchone()[0]
+                        rebuilt = count != manifest['rows']
+                    if rebuilt:
+                        manifest = {**_empty_manifest(), 'generation': manifest['generation']}
+
+                    cursor = conn.execute(SNAPSHOT_SQL, (manifest['max_id'],))
+                    table = _snapshot_table(fetch_columns(cursor, SNAPSHOT_COLUMNS, batch_size))
+                finally:
+                    conn.close()
+
+                appended = table.num_rows
+                if appended:
+                    segment = self._write_segment(table, manifest)
+                    manifest['segments'].append(segment)
+                    manifest['max_id'] = segment['max_id']
+                    manifest['rows'] += appended
+
+                compacted = compact and len(manifest['segments']) > MAX_SEGMENTS
+                if compacted:
+                    manifest['segments'] = [self._write_segment(self._read(manifest), manifest)]
+
+                if appended or rebuilt or compacted:
+                    self._write_manifest(manifest)
+                    self._remove_unused(manifest)
+                return {
+                    'appended': appended,
+                    'rebuilt': rebuilt,
+                    'compacted': compacted,
+                    'rows': manifest['rows'],
+                    'max_id': manifest['max_id'],
+                    'segments': len(manifest['segments']),
+                }
+        except Exception as e:
+            print(f"Error refreshing snapshot: {e}")
+            return None
+
+    def rebuild(self) -> Optional[Dict]:
+        """Rewrite the snapshot from the whole expenses table"""
+        return self.refresh(full=True)
+
+    def compact(self) -> Optional[Dict]:
+        """Merge every segment into one, returning the new manifest (None on error)"""
+        try:
+            with self._refresh_lock():
+                manifest = self.manifest()
+                if len(manifest['segments']) > 1:
+                    manifest['segments'] = [self._write_segment(self._read(manifest), manifest)]
+                    self._write_manifest(manifest)
+                    self._remove_unused(manifest)
+                return manifest
+        except Exception as e:
+            print(f"Error compacting snapshot: {e}")
+            return None
+
+    def _read(self, manifest: Dict, user_id: Optional[int] = None) -> "pa.Table":
+        """Memory-map the segments as one table, only user_id's row range of each if given"""
+        tables = []
+        for segment in manifest['segments']:
+            if user_id is not None and str(user_id) not in segment['users']:
+                continue
+            source = pa.memory_map(self._path(segment['file']), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            if user_id is not None:
+                # Zero-copy, so other users' pages are never read
+                table = table.slice(*segment['users'][str(user_id)])
+            tables.append(table)
+        return pa.concat_tables(tables) if tables else _schema().empty_table()
+
+    def load(self, user_id: Optional[int] = None) -> "pa.Table":
+        """Memory-map every segment as one table, optionally only one user's rows"""
+        try:
+            return self._read(self.manifest(), user_id)
+        except FileNotFoundError:
+            # A refresh replaced the segments between reading the manifest and mapping them
+            return self._read(self.manifest(), user_id)
+
+    def fresh(self, user_id: Optional[int] = None) -> Optional["pa.Table"]:
+        """Refresh, then load; None if the refresh failed"""
+        if self.refresh() is None:
+            return None
+        return self.load(user_id)
+
+_store: Optional[SnapshotStore] = None
+_store_lock = threading.Lock()
+
+def get_snapshot() -> SnapshotStore:
+    """Get the snapshot of data_handler's database, creating the store on first use"""
+    global _store
+    with _store_lock:
+        # Follow DATABASE_NAME if it was pointed somewhere else
+        if _store is None or _store.database != data_handler.DATABASE_NAME:
+            _store = SnapshotStore()
+        return _store
@@ -0,0 +1,847 @@
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from utils import data_handler
+from utils.data_handler import (
+    DEFAULT_USER_ID, EXPORT_COLUMNS, POOL_SIZE, comparison_period, month_bounds, write_export_csv,
+    _category_changes, _decode_cursor, _encode_cursor, _expense_params, _shift_month
+)
+from utils.models import EXPENSE_FIELDS, GOAL_FIELDS, SAVING_FIELDS, Expense, Goal, Saving
+from utils.write_queue import WriteBehindQueue, WriteHandle, get_write_queue, write_behind_enabled
+
+# Environment variables used to pick the storage backend
+STORAGE_ENV = 'SMARTSPEND_STORAGE'
+DATABASE_URL_ENV = 'DATABASE_URL'
+
+class StorageBackend(ABC):
+    """Where expenses, goals and savings are stored
+
+    Dates are exchanged as ISO 'YYYY-MM-DD' strings and date ranges are
+    half-open [start, end), the same as utils.data_handler. Every call is
+    scoped to one user's rows.
+    """
+
+    # True when every write goes through this process and bumps the data
+    # version, so results derived from reads can be reused until then
+    caches_reads = False
+
+    @abstractmethod
+    def init_schema(self):
+        """Create or upgrade the tables this backend needs"""
+
+    @abstractmethod
+    def add_expense(self, expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        """Add a new expense"""
+
+    @abstractmethod
+    def insert_expenses(self, expenses: Iterable[Dict], batch_size: int = 1000,
+                        user_id: int = DEFAULT_USER_ID) -> int:
+        """Add many expenses in one transaction, raising whatever stops it (nothing is inserted then)"""
+
+    def add_expenses_bulk(self, expenses: Iterable[Dict], batch_size: int = 1000,
+                          user_id: int = DEFAULT_USER_ID) -> int:
+        """Add many expenses in one transaction, returning how many were inserted (0 on error)"""
+        try:
+            return self.insert_expenses(expenses, batch_size, user_id)
+        except Exception as e:
+            print(f"Error adding expenses in bulk: {e}")
+            return 0
+
+    @abstractmethod
+    def get_expenses(self, month: Optional[str] = None, start: Optional[str] = None,
+                     end: Optional[str] = None, user_id: int = DEFAULT_USER_ID) -> List[Expense]:
+        """Get expenses, optionally filtered by month (YYYY-MM) or a [start, end) date range"""
+
+    @abstractmethod
+    def export_expenses_csv(self, output: BinaryIO, start: Optional[str] = None, end: Optional[str] = None,
+                            categories: Optional[List[str]] = None, compress: bool = False,
+                            chunk_size: int = 1000, user_id: int = DEFAULT_USER_ID) -> Optional[int]:
+        """Stream expenses as CSV into a binary file object, returning the row count (None on error)
+
+        Rows are read chunk_size at a time, so memory use does not depend
+        on the table size. output is left open either way.
+        """
+
+    @abstractmethod
+    def list_expenses(self, limit: int = 20, after_cursor: Optional[str] = None, filters: Optional[Dict] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Tuple[List[Expense], Optional[str]]:
+        """Get one page of expenses, newest first, plus the cursor for the next page
+
+        filters may contain 'category', 'tag', 'start' and 'end'. The
+        returned cursor is None on the last page.
+        """
+
+    @abstractmethod
+    def add_goal(self, goal_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        """Add a new financial goal"""
+
+    @abstractmethod
+    def get_goals(self, user_id: int = DEFAULT_USER_ID) -> List[Goal]:
+        """Get all goals"""
+
+    @abstractmethod
+    def update_goal(self, goal_id: int, new_amount: float, user_id: int = DEFAULT_USER_ID) -> bool:
+        """Update goal current amount, marking it achieved once the target is reached"""
+
+    @abstractmethod
+    def add_to_goal(self, goal_id: int, delta: float, user_id: int = DEFAULT_USER_ID) -> Optional[Dict]:
+        """Atomically add to a goal, returning its new state (None if not found or on error)"""
+
+    @abstractmethod
+    def add_saving(self, saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        """Add new savings record"""
+
+    @abstractmethod
+    def get_savings(self, user_id: int = DEFAULT_USER_ID) -> List[Saving]:
+        """Get all savings"""
+
+    @abstractmethod
+    def savings_by_month(self, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        """Get (YYYY-MM, total) savings pairs for every month with savings, oldest first"""
+
+    @abstractmethod
+    def sum_by_category(self, start: Optional[str] = None, end: Optional[str] = None,
+                        user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        """Get total spend per category within an optional [start, end) date range"""
+
+    @abstractmethod
+    def total_expenses(self, start: Optional[str] = None, end: Optional[str] = None,
+                       user_id: int = DEFAULT_USER_ID) -> float:
+        """Get total spend within an optional [start, end) date range"""
+
+    @abstractmethod
+    def total_savings(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> float:
+        """Get total savings within an optional [start, end) date range"""
+
+    @abstractmethod
+    def totals_by_month(self, n_months: int = 6, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        """Get (YYYY-MM, total) pairs for the last n calendar months, oldest first"""
+
+    @abstractmethod
+    def totals_by_bucket(self, bucket: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                         user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        """Get (bucket start, total) pairs for 'day', 'week' or 'month' buckets in a [start, end) range, oldest first
+
+        Bucket starts are YYYY-MM-DD strings; weeks start on Monday.
+        """
+
+    @abstractmethod
+    def compare_category_periods(self, start: str, end: Optional[str] = None,
+                                 user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        """Compare per-category spend in [start, end) with the equal-length period before it
+
+        end defaults to tomorrow. Returns {'category', 'current', 'previous',
+        'change', 'change_pct'} dicts, largest current spend first.
+        """
+
+    @abstractmethod
+    def expense_stats(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        """Get {'total', 'count', 'days', 'first'} for expenses within an optional [start, end) date range"""
+
+    @abstractmethod
+    def rollup(self, start: Optional[str] = None, end: Optional[str] = None,
+               user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        """Get per-month, per-category {'month', 'category', 'total', 'count', 'min_amount', 'max_amount'}
+        rows for months in a [start, end) range, oldest first"""
+
+    @abstractmethod
+    def totals_by_tag(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        """Get total spend per tag within an optional [start, end) date range"""
+
+    @abstractmethod
+    def get_tags(self, user_id: int = DEFAULT_USER_ID) -> List[str]:
+        """Get every tag in use, alphabetically"""
+
+    @abstractmethod
+    def add_user(self, name: str) -> Optional[int]:
+        """Add a user, returning the new id (None if the name is taken or on error)"""
+
+    @abstractmethod
+    def get_users(self) -> List[Dict]:
+        """Get all users as {'id', 'name'} dicts, oldest first"""
+
+    def close(self):
+        """Release pooled connections"""
+
+class SQLiteBackend(StorageBackend):
+    """The local SQLite database managed by utils.data_handler
+
+    With a write_queue, expense, saving and goal writes are committed in
+    groups by its writer thread; each call still waits for its own commit.
+    """
+
+    caches_reads = True
+
+    def __init__(self, pool_size: int = POOL_SIZE, write_queue: Optional[WriteBehindQueue] = None):
+        self.pool = data_handler.configure_pool(size=pool_size)
+        self.write_queue = write_queue
+
+    @staticmethod
+    def _committed(handle: WriteHandle, action: str) -> bool:
+        if handle.wait():
+            return True
+        print(f"Error {action}: {handle.error or 'timed out waiting for commit'}")
+        return False
+
+    def init_schema(self):
+        return data_handler.init_db()
+
+    def add_expense(self, expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        if self.write_queue is not None:
+            return self._committed(self.write_queue.add_expense(expense_data, user_id), "adding expense")
+        return data_handler.add_expense(expense_data, user_id)
+
+    def insert_expenses(self, expenses: Iterable[Dict], batch_size: int = 1000,
+                        user_id: int = DEFAULT_USER_ID) -> int:
+        # One transaction already groups the rows, so the write queue isn't needed
+        return data_handler.insert_expenses(expenses, batch_size, user_id)
+
+    def get_expenses(self, month: Optional[str] = None, start: Optional[str] = None,
+                     end: Optional[str] = None, user_id: int = DEFAULT_USER_ID) -> List[Expense]:
+        return data_handler.get_expenses(month, start, end, user_id)
+
+    def export_expenses_csv(self, output: BinaryIO, start: Optional[str] = None, end: Optional[str] = None,
+                            categories: Optional[List[str]] = None, compress: bool = False,
+                            chunk_size: int = 1000, user_id: int = DEFAULT_USER_ID) -> Optional[int]:
+        return data_handler.export_expenses_csv(output, start, end, categories, compress, chunk_size, user_id)
+
+    def list_expenses(self, limit: int = 20, after_cursor: Optional[str] = None, filters: Optional[Dict] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Tuple[List[Expense], Optional[str]]:
+        return data_handler.list_expenses(limit, after_cursor, filters, user_id)
+
+    def add_goal(self, goal_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        return data_handler.add_goal(goal_data, user_id)
+
+    def get_goals(self, user_id: int = DEFAULT_USER_ID) -> List[Goal]:
+        return data_handler.get_goals(user_id)
+
+    def update_goal(self, goal_id: int, new_amount: float, user_id: int = DEFAULT_USER_ID) -> bool:
+        if self.write_queue is not None:
+            return self._committed(self.write_queue.update_goal(goal_id, new_amount, user_id), "updating goal")
+        return data_handler.update_goal(goal_id, new_amount, user_id)
+
+    def add_to_goal(self, goal_id: int, delta: float, user_id: int = DEFAULT_USER_ID) -> Optional[Dict]:
+        if self.write_queue is not None:
+            handle = self.write_queue.add_to_goal(goal_id, delta, user_id)
+            return handle.result if self._committed(handle, "adding to goal") else None
+        return data_handler.add_to_goal(goal_id, delta, user_id)
+
+    def add_saving(self, saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        if self.write_queue is not None:
+            return self._committed(self.write_queue.add_saving(saving_data, user_id), "adding saving")
+        return data_handler.add_saving(saving_data, user_id)
+
+    def get_savings(self, user_id: int = DEFAULT_USER_ID) -> List[Saving]:
+        return data_handler.get_savings(user_id)
+
+    def savings_by_month(self, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        return data_handler.savings_by_month(user_id)
+
+    def sum_by_category(self, start: Optional[str] = None, end: Optional[str] = None,
+                        user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        return data_handler.sum_by_category(start, end, user_id)
+
+    def total_expenses(self, start: Optional[str] = None, end: Optional[str] = None,
+                       user_id: int = DEFAULT_USER_ID) -> float:
+        return data_handler.total_expenses(start, end, user_id)
+
+    def total_savings(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> float:
+        return data_handler.total_savings(start, end, user_id)
+
+    def totals_by_month(self, n_months: int = 6, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        return data_handler.totals_by_month(n_months, user_id)
+
+    def totals_by_bucket(self, bucket: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                         user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        return data_handler.totals_by_bucket(bucket, start, end, user_id)
+
+    def compare_category_periods(self, start: str, end: Optional[str] = None,
+                                 user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        return data_handler.compare_category_periods(start, end, user_id)
+
+    def expense_stats(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        return data_handler.expense_stats(start, end, user_id)
+
+    def rollup(self, start: Optional[str] = None, end: Optional[str] = None,
+               user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        return data_handler.get_rollup(start, end, user_id)
+
+    def totals_by_tag(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        return data_handler.totals_by_tag(start, end, user_id)
+
+    def get_tags(self, user_id: int = DEFAULT_USER_ID) -> List[str]:
+        return data_handler.get_tags(user_id)
+
+    def add_user(self, name: str) -> Optional[int]:
+        return data_handler.add_user(name)
+
+    def get_users(self) -> List[Dict]:
+        return data_handler.get_users()
+
+    def close(self):
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.pool.close()
+
+POSTGRES_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    f"INSERT INTO users (id, name) VALUES ({DEFAULT_USER_ID}, 'Default') ON CONFLICT DO NOTHING",
+    "SELECT setval(pg_get_serial_sequence('users', 'id'), GREATEST(MAX(id), 1)) FROM users",
+    '''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id BIGSERIAL PRIMARY KEY,
+        amount DOUBLE PRECISION NOT NULL,
+        category TEXT NOT NULL,
+        date DATE NOT NULL,
+        description TEXT,
+        tags TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS goals (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        target_amount DOUBLE PRECISION NOT NULL,
+        current_amount DOUBLE PRECISION DEFAULT 0,
+        deadline DATE NOT NULL,
+        priority TEXT DEFAULT 'Medium',
+        description TEXT,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS savings (
+        id BIGSERIAL PRIMARY KEY,
+        amount DOUBLE PRECISION NOT NULL,
+        date DATE NOT NULL,
+        source TEXT,
+        purpose TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    *[f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS user_id BIGINT NOT NULL DEFAULT {DEFAULT_USER_ID}'
+      for table in ('expenses', 'goals', 'savings')],
+    'DROP INDEX IF EXISTS idx_expenses_date',
+    'DROP INDEX IF EXISTS idx_expenses_category_date',
+    'DROP INDEX IF EXISTS idx_savings_date',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses(user_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses(user_id, category, date)',
+    'CREATE INDEX IF NOT EXISTS idx_savings_user_date ON savings(user_id, date)',
+    'CREATE INDEX IF NOT EXISTS idx_goals_user ON goals(user_id)',
+]
+
+def _pg_user_where(user_id: int, start: Optional[str] = None, end: Optional[str] = None) -> Tuple[str, List]:
+    """Build a WHERE clause for one user's rows in a half-open date range, with psycopg2 placeholders"""
+    conditions, params = ['user_id = %s'], [user_id]
+    if start:
+        conditions.append('date >= %s')
+        params.append(start)
+    if end:
+        conditions.append('date < %s')
+        params.append(end)
+    return f"WHERE {' AND '.join(conditions)}", params
+
+PG_EXPENSE_INSERT_SQL = '''
+INSERT INTO expenses (amount, category, date, description, tags, user_id)
+VALUES (%s, %s, %s, %s, %s, %s)
+'''
+
+# An expense's distinct, trimmed tags, as the SQLite expense_tags table holds them
+_PG_TAGS = "(SELECT DISTINCT btrim(value, E' \\t\\n\\r') FROM unnest(string_to_array(COALESCE(tags, ''), ',')) AS value)"
+
+def _to_text(value):
+    """Render DATE/TIMESTAMP values the way SQLite stores them"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _fetch_records(cursor, model) -> List:
+    """Build model records from rows selected in the model's field order"""
+    return [model.from_row([_to_text(value) for value in row]) for row in cursor.fetchall()]
+
+def _fetch_dicts(cursor) -> List[Dict]:
+    columns = [column[0] for column in cursor.description]
+    return [{name: _to_text(value) for name, value in zip(columns, row)} for row in cursor.fetchall()]
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL storage behind a psycopg2 ThreadedConnectionPool
+
+    Aggregates are computed by the server. Pass pool to supply any object
+    with getconn()/putconn(conn, close=False)/closeall(), e.g. a fake in
+    tests; otherwise a pool is opened on dsn. Reads are not cached, since
+    other processes may write to the same database.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, pool=None, minconn: int = 1, maxconn: int = POOL_SIZE):
+        if pool is None:
+            try:
+                from psycopg2.pool import ThreadedConnectionPool
+            except ImportError as e:
+                raise RuntimeError("The PostgreSQL backend requires psycopg2 (pip install psycopg2-binary)") from e
+            pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        self.pool = pool
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, rolling back anything left uncommitted"""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            broken = bool(getattr(conn, 'closed', False))
+            if not broken:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.pool.putconn(conn, close=broken)
+
+    def init_schema(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in POSTGRES_SCHEMA:
+                cursor.execute(statement)
+            conn.commit()
+
+    def add_expense(self, expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(PG_EXPENSE_INSERT_SQL, _expense_params(expense_data, user_id))
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error adding expense: {e}")
+            return False
+
+    def insert_expenses(self, expenses: Iterable[Dict], batch_size: int = 1000,
+                        user_id: int = DEFAULT_USER_ID) -> int:
+        inserted = 0
+        rows = iter(expenses)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            while True:
+                batch = [_expense_params(expense, user_id) for expense in islice(rows, batch_size)]
+                if not batch:
+                    break
+                cursor.executemany(PG_EXPENSE_INSERT_SQL, batch)
+                inserted += len(batch)
+            conn.commit()
+        return inserted
+
+    def get_expenses(self, month: Optional[str] = None, start: Optional[str] = None,
+                     end: Optional[str] = None, user_id: int = DEFAULT_USER_ID) -> List[Expense]:
+        try:
+            if month:
+                start, end = month_bounds(month)
+            where, params = _pg_user_where(user_id, start, end)
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'SELECT {", ".join(EXPENSE_FIELDS)} FROM expenses {where} ORDER BY date DESC', params)
+                return _fetch_records(cursor, Expense)
+        except Exception as e:
+            print(f"Error fetching expenses: {e}")
+            return []
+
+    def list_expenses(self, limit: int = 20, after_cursor: Optional[str] = None, filters: Optional[Dict] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Tuple[List[Expense], Optional[str]]:
+        try:
+            filters = filters or {}
+            where, params = _pg_user_where(user_id, filters.get('start'), filters.get('end'))
+            if filters.get('category'):
+                where += ' AND category = %s'
+                params.append(filters['category'])
+            if filters.get('tag'):
+                where += f' AND %s IN {_PG_TAGS}'
+                params.append(filters['tag'])
+            if after_cursor:
+                where += ' AND (date, id) < (%s, %s)'
+                params.extend(_decode_cursor(after_cursor))
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Fetch one extra row to know whether another page exists
+                cursor.execute(f'''
+                    SELECT {", ".join(EXPENSE_FIELDS)} FROM expenses {where}
+                    ORDER BY date DESC, id DESC
+                    LIMIT %s
+                ''', params + [limit + 1])
+                records = _fetch_records(cursor, Expense)
+            next_cursor = _encode_cursor(records[limit - 1]) if len(records) > limit else None
+            return records[:limit], next_cursor
+        except Exception as e:
+            print(f"Error listing expenses: {e}")
+            return [], None
+
+    def export_expenses_csv(self, output: BinaryIO, start: Optional[str] = None, end: Optional[str] = None,
+                            categories: Optional[List[str]] = None, compress: bool = False,
+                            chunk_size: int = 1000, user_id: int = DEFAULT_USER_ID) -> Optional[int]:
+        try:
+            where, params = _pg_user_where(user_id, start, end)
+            if categories:
+                where += ' AND category = ANY(%s)'
+                params.append(list(categories))
+
+            with self.connection() as conn:
+                # A named (server-side) cursor streams the rows instead of loading them all
+                cursor = conn.cursor(name='export_expenses')
+                cursor.itersize = chunk_size
+                cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM expenses {where} ORDER BY date DESC, id DESC",
+                               params)
+                batches = iter(lambda: [[_to_text(value) for value in row] for row in cursor.fetchmany(chunk_size)], [])
+                return write_export_csv(output, batches, compress)
+        except Exception as e:
+            print(f"Error exporting expenses: {e}")
+            return None
+
+    def add_goal(self, goal_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                INSERT INTO goals (name, target_amount, current_amount, deadline, priority, description, status, user_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ''', (
+                    goal_data['name'],
+                    goal_data['target_amount'],
+                    goal_data.get('current_amount', 0),
+                    goal_data['deadline'],
+                    goal_data.get('priority', 'Medium'),
+                    goal_data.get('description', ''),
+                    goal_data.get('status', 'active'),
+                    user_id
+                ))
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error adding goal: {e}")
+            return False
+
+    def get_goals(self, user_id: int = DEFAULT_USER_ID) -> List[Goal]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {", ".join(GOAL_FIELDS)} FROM goals
+                    WHERE user_id = %s
+                    ORDER BY priority DESC, deadline ASC
+                ''', (user_id,))
+                return _fetch_records(cursor, Goal)
+        except Exception as e:
+            print(f"Error fetching goals: {e}")
+            return []
+
+    def update_goal(self, goal_id: int, new_amount: float, user_id: int = DEFAULT_USER_ID) -> bool:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                UPDATE goals
+                SET current_amount = %s,
+                    status = CASE WHEN %s >= target_amount THEN 'achieved' ELSE status END
+                WHERE id = %s AND user_id = %s
+                ''', (new_amount, new_amount, goal_id, user_id))
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error updating goal: {e}")
+            return False
+
+    def add_to_goal(self, goal_id: int, delta: float, user_id: int = DEFAULT_USER_ID) -> Optional[Dict]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                UPDATE goals
+                SET current_amount = current_amount + %s,
+                    status = CASE WHEN current_amount + %s >= target_amount THEN 'achieved' ELSE status END
+                WHERE id = %s AND user_id = %s
+                RETURNING id, name, current_amount, target_amount, status
+                ''', (delta, delta, goal_id, user_id))
+                rows = _fetch_dicts(cursor)
+                conn.commit()
+            return rows[0] if rows else None
+        except Exception as e:
+            print(f"Error adding to goal: {e}")
+            return None
+
+    def add_saving(self, saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> bool:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                INSERT INTO savings (amount, date, source, purpose, user_id)
+                VALUES (%s, %s, %s, %s, %s)
+                ''', (
+                    saving_data['amount'],
+                    saving_data['date'],
+                    saving_data.get('source', ''),
+                    saving_data.get('purpose', ''),
+                    user_id
+                ))
+                conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error adding saving: {e}")
+            return False
+
+    def get_savings(self, user_id: int = DEFAULT_USER_ID) -> List[Saving]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'SELECT {", ".join(SAVING_FIELDS)} FROM savings WHERE user_id = %s ORDER BY date DESC', (user_id,))
+                return _fetch_records(cursor, Saving)
+        except Exception as e:
+            print(f"Error fetching savings: {e}")
+            return []
+
+    def savings_by_month(self, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT to_char(date, 'YYYY-MM') AS month, SUM(amount) AS total FROM savings
+                    WHERE user_id = %s
+                    GROUP BY 1
+                    ORDER BY 1
+                ''', (user_id,))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error totalling savings by month: {e}")
+            return []
+
+    def sum_by_category(self, start: Optional[str] = None, end: Optional[str] = None,
+                        user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        try:
+            where, params = _pg_user_where(user_id, start, end)
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT category, SUM(amount) AS total FROM expenses
+                    {where}
+                    GROUP BY category
+                    ORDER BY total DESC
+                ''', params)
+                return {category: total for category, total in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error summing expenses by category: {e}")
+            return {}
+
+    def _total(self, table: str, start: Optional[str], end: Optional[str], user_id: int) -> float:
+        where, params = _pg_user_where(user_id, start, end)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT COALESCE(SUM(amount), 0) FROM {table} {where}', params)
+            return cursor.fetchone()[0]
+
+    def total_expenses(self, start: Optional[str] = None, end: Optional[str] = None,
+                       user_id: int = DEFAULT_USER_ID) -> float:
+        try:
+            return self._total('expenses', start, end, user_id)
+        except Exception as e:
+            print(f"Error totalling expenses: {e}")
+            return 0.0
+
+    def total_savings(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> float:
+        try:
+            return self._total('savings', start, end, user_id)
+        except Exception as e:
+            print(f"Error totalling savings: {e}")
+            return 0.0
+
+    def totals_by_month(self, n_months: int = 6, user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        current = date.today().replace(day=1)
+        months = [_shift_month(current, -i).strftime('%Y-%m') for i in range(n_months - 1, -1, -1)]
+
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT to_char(date_trunc('month', date), 'YYYY-MM') AS month, SUM(amount) AS total
+                    FROM expenses
+                    WHERE user_id = %s AND date >= %s AND date < %s
+                    GROUP BY 1
+                ''', (user_id, f"{months[0]}-01", _shift_month(current, 1).isoformat()))
+                found = dict(cursor.fetchall())
+            return [(month, found.get(month, 0.0)) for month in months]
+        except Exception as e:
+            print(f"Error totalling expenses by month: {e}")
+            return [(month, 0.0) for month in months]
+
+    def totals_by_bucket(self, bucket: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                         user_id: int = DEFAULT_USER_ID) -> List[Tuple[str, float]]:
+        if bucket not in data_handler.BUCKET_STARTS:
+            raise ValueError(f"Unknown bucket {bucket!r}; expected one of {', '.join(data_handler.BUCKET_STARTS)}")
+        try:
+            where, params = _pg_user_where(user_id, start, end)
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT to_char(date_trunc(%s, date), 'YYYY-MM-DD') AS bucket, SUM(amount) AS total
+                    FROM expenses
+                    {where}
+                    GROUP BY 1
+                    ORDER BY 1
+                ''', [bucket] + params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Error totalling expenses by {bucket}: {e}")
+            return []
+
+    def compare_category_periods(self, start: str, end: Optional[str] = None,
+                                 user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        previous_start, start, end = comparison_period(start, end)
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT category,
+                           COALESCE(SUM(amount) FILTER (WHERE date >= %s), 0) AS current,
+                           COALESCE(SUM(amount) FILTER (WHERE date < %s), 0) AS previous
+                    FROM expenses
+                    WHERE user_id = %s AND date >= %s AND date < %s
+                    GROUP BY category
+                    ORDER BY current DESC, previous DESC
+                ''', (start, start, user_id, previous_start, end))
+                return _category_changes(cursor.fetchall())
+        except Exception as e:
+            print(f"Error comparing category periods: {e}")
+            return []
+
+    def expense_stats(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        try:
+            where, params = _pg_user_where(user_id, start, end)
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT COALESCE(SUM(amount), 0), COUNT(*), COUNT(DISTINCT date), MIN(date)
+                    FROM expenses {where}
+                ''', params)
+                total, count, days, first = cursor.fetchone()
+            return {'total': total, 'count': count, 'days': days, 'first': _to_text(first)}
+        except Exception as e:
+            print(f"Error computing expense stats: {e}")
+            return {'total': 0.0, 'count': 0, 'days': 0, 'first': None}
+
+    def rollup(self, start: Optional[str] = None, end: Optional[str] = None,
+               user_id: int = DEFAULT_USER_ID) -> List[Dict]:
+        try:
+            # Whole months, like the SQLite rollup table
+            where, params = _pg_user_where(user_id, start and f"{start[:7]}-01", end and f"{end[:7]}-01")
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT to_char(date, 'YYYY-MM') AS month, category, SUM(amount) AS total,
+                           COUNT(*) AS count, MIN(amount) AS min_amount, MAX(amount) AS max_amount
+                    FROM expenses
+                    {where}
+                    GROUP BY 1, 2
+                    ORDER BY 1, 2
+                ''', params)
+                return _fetch_dicts(cursor)
+        except Exception as e:
+            print(f"Error fetching rollup: {e}")
+            return []
+
+    def totals_by_tag(self, start: Optional[str] = None, end: Optional[str] = None,
+                      user_id: int = DEFAULT_USER_ID) -> Dict[str, float]:
+        try:
+            where, params = _pg_user_where(user_id, start, end)
+
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT t.tag, SUM(amount) AS total
+                    FROM expenses CROSS JOIN LATERAL {_PG_TAGS} AS t(tag)
+                    {where} AND t.tag <> ''
+                    GROUP BY t.tag
+                    ORDER BY total DESC
+                ''', params)
+                return {tag: total for tag, total in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error totalling expenses by tag: {e}")
+            return {}
+
+    def get_tags(self, user_id: int = DEFAULT_USER_ID) -> List[str]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT DISTINCT t.tag
+                    FROM expenses CROSS JOIN LATERAL {_PG_TAGS} AS t(tag)
+                    WHERE user_id = %s AND t.tag <> ''
+                    ORDER BY t.tag
+                ''', (user_id,))
+                return [tag for tag, in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error fetching tags: {e}")
+            return []
+
+    def add_user(self, name: str) -> Optional[int]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('INSERT INTO users (name) VALUES (%s) RETURNING id', (name.strip(),))
+                user_id = cursor.fetchone()[0]
+                conn.commit()
+            return user_id
+        except Exception as e:
+            print(f"Error adding user: {e}")
+            return None
+
+    def get_users(self) -> List[Dict]:
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, name FROM users ORDER BY id')
+                return _fetch_dicts(cursor)
+        except Exception as e:
+            print(f"Error fetching users: {e}")
+            return []
+
+    def close(self):
+        self.pool.closeall()
+
+def get_storage(backend: Optional[str] = None, database_url: Optional[str] = None) -> StorageBackend:
+    """Create the storage backend named by SMARTSPEND_STORAGE ('sqlite' or 'postgres')
+
+    The PostgreSQL connection string comes from database_url or DATABASE_URL.
+    SQLite writes go through the write-behind queue when SMARTSPEND_WRITE_BEHIND is set.
+    """
+    backend = (backend or os.getenv(STORAGE_ENV) or 'sqlite').strip().lower()
+    if backend == 'sqlite':
+        return SQLiteBackend(write_queue=get_write_queue() if write_behind_enabled() else None)
+    if backend in ('postgres', 'postgresql'):
+        database_url = database_url or os.getenv(DATABASE_URL_ENV)
+        if not database_url:
+            raise ValueError(f"{DATABASE_URL_ENV} must be set to use the PostgreSQL backend")
+        return PostgresBackend(database_url)
+    raise ValueError(f"Unknown storage backend '{backend}'")
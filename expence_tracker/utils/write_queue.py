@@ -0,0 +1,214 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.cache import bump_data_version
+from utils.data_handler import (
+    DEFAULT_USER_ID, EXPENSE_INSERT_SQL, SAVING_INSERT_SQL,
+    _expense_params, _saving_params, _write_goal_amount, _write_goal_contribution, db_connection
+)
+
+# Set to 1/true/yes to route expense, saving and goal writes through the queue
+WRITE_BEHIND_ENV = 'SMARTSPEND_WRITE_BEHIND'
+
+# Queue settings
+MAX_PENDING_WRITES = 10000
+MAX_BATCH_SIZE = 500
+# Extra seconds a batch may wait for more writes to join it. At 0 a batch is
+# committed as soon as the writer is free, which already groups every write
+# that arrived during the previous commit and keeps confirmation latency low
+FLUSH_INTERVAL = 0.0
+WRITE_TIMEOUT = 10.0       # seconds a caller waits for queue space or a commit
+
+class WriteHandle:
+    """Completion handle for one queued write"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.error: Optional[Exception] = None
+        self.result = None
+
+    def _resolve(self, error: Optional[Exception] = None, result=None):
+        self.error = error
+        self.result = result
+        self._done.set()
+
+    def done(self) -> bool:
+        """True once the write has been committed or has failed"""
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = WRITE_TIMEOUT) -> bool:
+        """Block until the write is committed; False if it failed or timed out"""
+        return self._done.wait(timeout) and self.error is None
+
+# A queued write: (apply(cursor), handle); apply=None marks a flush or stop request
+_Write = Tuple[Optional[Callable], WriteHandle]
+_STOP = object()
+
+class WriteBehindQueue:
+    """Single writer thread that commits queued writes in grouped transactions
+
+    Callers from any thread enqueue a write and get a WriteHandle back. The
+    writer takes everything queued (up to max_batch, lingering up to
+    flush_interval for more) and commits it together, so concurrent sessions
+    share one transaction and one fsync instead of queueing on SQLite's
+    write lock.
+    Each write runs under its own savepoint, so one bad row fails only its
+    own handle. Pending writes are committed by close(), which runs at exit;
+    any the writer never reaches are failed when it stops.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_WRITES, max_batch: int = MAX_BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        # Guards _closed and enqueueing, so nothing is queued behind the stop marker
+        self._lock = threading.Lock()
+        self.stats = {'writes': 0, 'failed': 0, 'batches': 0}
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, apply: Callable, timeout: Optional[float] = WRITE_TIMEOUT) -> WriteHandle:
+        """Queue apply(cursor) to run in the next batch; its return value becomes handle.result
+
+        Blocks for up to timeout while the queue is full; raises queue.Full
+        after that, or RuntimeError once the queue has been closed.
+        """
+        handle = WriteHandle()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            self._queue.put((apply, handle), timeout=timeout)
+        return handle
+
+    def add_expense(self, expense_data: Dict, user_id: int = DEFAULT_USER_ID) -> WriteHandle:
+        params = _expense_params(expense_data, user_id)
+        return self.submit(lambda cursor: cursor.execute(EXPENSE_INSERT_SQL, params))
+
+    def add_saving(self, saving_data: Dict, user_id: int = DEFAULT_USER_ID) -> WriteHandle:
+        params = _saving_params(saving_data, user_id)
+        return self.submit(lambda cursor: cursor.execute(SAVING_INSERT_SQL, params))
+
+    def update_goal(self, goal_id: int, new_amount: float, user_id: int = DEFAULT_USER_ID) -> WriteHandle:
+        return self.submit(lambda cursor: _write_goal_amount(cursor, goal_id, new_amount, user_id))
+
+    def add_to_goal(self, goal_id: int, delta: float, user_id: int = DEFAULT_USER_ID) -> WriteHandle:
+        """Queue a goal contribution; the handle's result is the goal's new state"""
+        return self.submit(lambda cursor: _write_goal_contribution(cursor, goal_id, delta, user_id))
+
+    def flush(self, timeout: Optional[float] = WRITE_TIMEOUT) -> bool:
+        """Wait until every write queued so far has been committed"""
+        handle = WriteHandle()
+        with self._lock:
+            if self._closed or not self._thread.is_alive():
+                return self._queue.empty()
+            self._queue.put((None, handle), timeout=timeout)
+        return handle.wait(timeout)
+
+    def close(self, timeout: Optional[float] = WRITE_TIMEOUT):
+        """Commit everything still queued and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._queue.put((_STOP, WriteHandle()), timeout=timeout)
+            except queue.Full:
+                # The writer also stops once it has emptied a closed queue
+                print("Error closing write queue: no room for the stop request")
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def _next_batch(self) -> Tuple[List[_Write], bool]:
+        """Collect writes until the batch is full, the interval passes or a flush/stop arrives"""
+        batch: List[_Write] = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while callable(batch[-1][0]) and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch, batch[-1][0] is _STOP
+
+    def _commit(self, batch: List[_Write]):
+        """Apply a batch in one transaction, then resolve its handles"""
+        writes = [(apply, handle) for apply, handle in batch if callable(apply)]
+        errors: Dict[int, Exception] = {}
+        results: Dict[int, object] = {}
+        try:
+            if writes:
+                with db_connection() as conn:
+                    cursor = conn.cursor()
+                    # Explicit BEGIN so the savepoints nest inside one transaction
+                    cursor.execute('BEGIN IMMEDIATE')
+                    for index, (apply, _) in enumerate(writes):
+                        cursor.execute('SAVEPOINT queued_write')
+                        try:
+                            results[index] = apply(cursor)
+                        except Exception as e:
+                            cursor.execute('ROLLBACK TO queued_write')
+                            errors[index] = e
+                        cursor.execute('RELEASE queued_write')
+                    conn.commit()
+                if len(errors) < len(writes):
+                    bump_data_version()
+        except Exception as e:
+            print(f"Error committing queued writes: {e}")
+            errors = {index: e for index in range(len(writes))}
+
+        for index, (_, handle) in enumerate(writes):
+            handle._resolve(errors.get(index), results.get(index))
+        self.stats['writes'] += len(writes) - len(errors)
+        self.stats['failed'] += len(errors)
+        self.stats['batches'] += 1 if writes else 0
+        # Flush/stop markers resolve only after everything queued before them
+        for apply, handle in batch:
+            if not callable(apply):
+                handle._resolve()
+
+    def _fail_pending(self, error: Exception):
+        """Fail every write still queued"""
+        while True:
+            try:
+                apply, handle = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            handle._resolve(error)
+            self.stats['failed'] += 1 if callable(apply) else 0
+
+    def _run(self):
+        try:
+            while not (self._closed and self._queue.empty()):
+                batch, stop = self._next_batch()
+                self._commit(batch)
+                if stop:
+                    return
+        finally:
+            error = RuntimeError("Write queue stopped before the write was committed")
+            # Drained before taking the lock too, in case a submit holding it waits for room
+            self._fail_pending(error)
+            with self._lock:
+                self._closed = True
+            self._fail_pending(error)
+
+_write_queue: Optional[WriteBehindQueue] = None
+_write_queue_lock = threading.Lock()
+
+def write_behind_enabled() -> bool:
+    """Whether SMARTSPEND_WRITE_BEHIND asks for queued writes"""
+    return os.getenv(WRITE_BEHIND_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def get_write_queue() -> WriteBehindQueue:
+    """Get the shared write queue, starting its writer thread on first use"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue._closed:
+            _write_queue = WriteBehindQueue()
+        return _write_queue